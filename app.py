@@ -3,6 +3,7 @@ import os
 # Disable ChromaDB telemetry BEFORE any imports to avoid "capture() takes 1 positional argument but 3 were given" warnings
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
+import atexit
 import uuid
 from pathlib import Path
 from datetime import datetime, timezone
@@ -10,19 +11,23 @@ from typing import List
 import re
 
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from utils.vectordb import VectorDB
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Other Fucntion Import 
-from utils.file_utils import load_all_publications, load_yaml_config
-from utils.prompt_builder import build_prompt_from_config
-from utils.paths import PROMPT_CONFIG_FPATH, OUTPUTS_DIR, APP_CONFIG_FPATH
-from utils.log_utils import get_logger, JsonlTrace, TimingContext
+from utils.file_utils import list_publication_files, load_yaml_config
+from utils.prompt_builder import get_rag_prompt_template
+from utils.paths import PROMPT_CONFIG_FPATH, OUTPUTS_DIR, APP_CONFIG_FPATH, EMBEDDING_SOCKET_PATH
+from utils.log_utils import get_logger, JsonlTrace
+from utils.llm_utils import get_llm
+from utils.metrics import REGISTRY, SlowRequestProfiler, start_metrics_server
 from utils.memory_utils import MemoryManager
+from utils.episodic_memory import EpisodicMemory
+from utils.pipeline import QueryPipeline, PipelineResult, build_default_stages
+from utils.corpus_watcher import CorpusWatcher
+from utils.query_rewriter import QueryRewriter
+from utils.intent_router import IntentRouter
+from utils.scheduler import QueryScheduler, DEFAULT_PRIORITIES
 
 # Configuration
 system_prompt = 'knowledge_assistant_prompt'
@@ -39,21 +44,53 @@ try:
     llm_config = app_config.get("llm", {})
     vectordb_config = app_config.get("vectordb", {})
     memory_config = app_config.get("memory_strategies", {})
+    metrics_config = app_config.get("metrics", {})
+    watcher_config = app_config.get("corpus_watcher", {})
+    embedding_service_config = app_config.get("embedding_service", {})
+    rewrite_config = app_config.get("query_rewriting", {})
+    routing_config = app_config.get("intent_routing", {})
+    scheduler_config = app_config.get("scheduler", {})
 except Exception as e:
     LOGGER.warning(f"Could not load app_config.yaml, using default settings: {e}")
     log_config = {}
     llm_config = {}
     vectordb_config = {}
     memory_config = {}
+    metrics_config = {}
+    watcher_config = {}
+    embedding_service_config = {}
+    rewrite_config = {}
+    routing_config = {}
+    scheduler_config = {}
 
 # Default values from config
 DEFAULT_N_RESULTS = vectordb_config.get("n_results", 3)
 DEFAULT_THRESHOLD = vectordb_config.get("threshold", 0.5)
-DEFAULT_SUMMARIZE_EVERY_N = memory_config.get("summarize_every_n", 6)
+DEFAULT_SUMMARIZE_AFTER_TOKENS = memory_config.get("summarize_after_tokens", 1500)
 DEFAULT_RECENT_WINDOW_N = memory_config.get("recent_window_n", 8)
+DEFAULT_MAX_TURNS = memory_config.get("max_turns", 64)
 
 TRACE = JsonlTrace(Path(OUTPUTS_DIR) / "rag_assistant_traces.jsonl", log_config=log_config)
 
+# Metrics surface: scrape http://127.0.0.1:<http_port>/metrics and/or dump to a text file on exit
+if metrics_config.get("http_port"):
+    start_metrics_server(int(metrics_config["http_port"]), host=metrics_config.get("http_host", "127.0.0.1"))
+if metrics_config.get("dump_path"):
+    atexit.register(REGISTRY.dump, Path(OUTPUTS_DIR) / metrics_config["dump_path"])
+
+PROFILER = SlowRequestProfiler(Path(OUTPUTS_DIR) / "profiles", **metrics_config.get("profiling", {}))
+
+# Admission control shared by every RAGAssistant in the process (Streamlit sessions, evaluator)
+SCHEDULER = None
+if scheduler_config.get("enabled"):
+    SCHEDULER = QueryScheduler(
+        max_concurrency=scheduler_config.get("max_concurrency", 4),
+        max_queue=scheduler_config.get("max_queue", 64),
+        default_deadline_seconds=scheduler_config.get("deadline_seconds"),
+        priorities=scheduler_config.get("priorities", DEFAULT_PRIORITIES),
+        service_time_seconds=scheduler_config.get("service_time_seconds", 2.0),
+    )
+
 class RAGAssistant:
     """
     A simple RAG-based AI assistant using ChromaDB and multiple LLM providers.
@@ -74,54 +111,116 @@ class RAGAssistant:
             )
 
         # Initialize vector database
+        adaptive_config = vectordb_config.get("adaptive_k", {})
+        hierarchical_config = vectordb_config.get("hierarchical", {})
+        cache_config = vectordb_config.get("result_cache", {})
         self.vector_db = VectorDB(
             collection_name="publications",
             embedding_model="sentence-transformers/all-MiniLM-L6-v2",
-            default_threshold=DEFAULT_THRESHOLD
+            default_threshold=DEFAULT_THRESHOLD,
+            merge_adjacent=vectordb_config.get("merge_adjacent", False),
+            mmr_lambda=vectordb_config.get("mmr_lambda"),
+            fetch_multiplier=vectordb_config.get("fetch_multiplier", 2),
+            backend=vectordb_config.get("backend", "chroma"),
+            export_dir=vectordb_config.get("export_dir"),
+            exact_max_chunks=vectordb_config.get("exact_max_chunks", 50000),
+            quantization=vectordb_config.get("quantization", "int8"),
+            rescore_multiplier=vectordb_config.get("rescore_multiplier", 4),
+            chunk_size=vectordb_config.get("chunk_size", 400),
+            chunk_overlap=vectordb_config.get("chunk_overlap", 100),
+            alias_check_seconds=vectordb_config.get("alias_check_seconds", 5.0),
+            adaptive_k=adaptive_config.get("enabled", False),
+            adaptive_method=adaptive_config.get("method", "gap"),
+            min_k=adaptive_config.get("min_k", 1),
+            max_k=adaptive_config.get("max_k", 8),
+            min_gap=adaptive_config.get("min_gap", 0.05),
+            min_relative_score=adaptive_config.get("min_relative_score", 0.85),
+            hierarchical=hierarchical_config.get("enabled", False),
+            hierarchical_docs=hierarchical_config.get("top_docs", 5),
+            embedding_service=(
+                embedding_service_config.get("socket_path") or EMBEDDING_SOCKET_PATH
+                if embedding_service_config.get("enabled", False) else None
+            ),
+            embedding_timeout=embedding_service_config.get("timeout_seconds", 30.0),
+            result_cache_size=cache_config.get("max_entries", 1024) if cache_config.get("enabled", False) else 0,
         )
 
-        # Create RAG prompt template
-        prompt_config = load_yaml_config(PROMPT_CONFIG_FPATH)[system_prompt]
-        system_instructions = build_prompt_from_config(prompt_config)
-
-        rag_template = """
-            {system_instructions}
-
-            You are a precise assistant. Use ONLY the provided Context and Memory when relevant.
-            If the answer is not in Context, and Memory doesn't contain the needed conversational detail, say "I don't know."
-
-            # Memory (running summary + recent turns; use only if relevant)
-            {memory}
-
-            # Context
-            {context}
-
-            # Question
-            {question}
-
-            # Answer (concise and specific):
-        """
-
+        # Keep the collection in sync with documents/ in the background (replaces the bulk load)
+        self.corpus_watcher = None
+        if watcher_config.get("enabled") and not self.vector_db.read_only:
+            self.corpus_watcher = CorpusWatcher(
+                self.vector_db,
+                debounce_seconds=watcher_config.get("debounce_seconds", 1.0),
+                poll_interval_seconds=watcher_config.get("poll_interval_seconds", 2.0),
+                use_inotify=watcher_config.get("use_inotify", True),
+            ).start()
+
+        # Create RAG prompt template (compiled once per process, cached by config hash)
         try:
-            self.prompt_template = ChatPromptTemplate.from_template(rag_template).partial(
-                system_instructions=system_instructions
-            )
-            # Create the chain
-            self.chain = self.prompt_template | self.llm | StrOutputParser()
+            self.prompt_template = get_rag_prompt_template(PROMPT_CONFIG_FPATH, system_prompt)
+            # Create the chain; llm_chain keeps the raw message so cache usage can be traced
+            self.output_parser = StrOutputParser()
+            self.llm_chain = self.prompt_template | self.llm
+            self.chain = self.llm_chain | self.output_parser
         except Exception as e:
             LOGGER.error(f"Failed to create prompt template or chain: {e}")
             import traceback
             traceback.print_exc()
             raise
 
-        # Memory manager (moved to memory_utils)
+        # Memory manager (moved to memory_utils); episodic recall reuses the retrieval embedding model
+        episodic_config = memory_config.get("episodic", {})
+        episodic = None
+        if episodic_config.get("enabled"):
+            episodic = EpisodicMemory(
+                self.vector_db.embedding_model,
+                top_k=episodic_config.get("top_k", 3),
+                max_distance=episodic_config.get("max_distance", 0.6),
+                max_episodes=episodic_config.get("max_episodes", 5000),
+                max_chars=episodic_config.get("max_chars", 500),
+            )
         self.memory = MemoryManager(
             llm=self.llm,
             memory_dir=Path(OUTPUTS_DIR) / "memory",
-            summarize_every_n=DEFAULT_SUMMARIZE_EVERY_N,
+            summarize_after_tokens=DEFAULT_SUMMARIZE_AFTER_TOKENS,
             recent_window_n=DEFAULT_RECENT_WINDOW_N,
+            max_turns=DEFAULT_MAX_TURNS,
+            episodic=episodic,
         )
         
+        # Shared query pipeline (CLI, Streamlit and evaluation all go through it)
+        self.pipeline = QueryPipeline(
+            build_default_stages(self.vector_db, self.memory, self.prompt_template, self.llm, self.output_parser),
+            logger=LOGGER,
+            profiler=PROFILER,
+            scheduler=SCHEDULER,
+        )
+
+        # Condense follow-ups ("what about the Roth one?") into standalone queries before retrieval
+        if rewrite_config.get("enabled"):
+            mode = rewrite_config.get("mode", "llm")
+            rewrite_model = rewrite_config.get("model")
+            rewriter = QueryRewriter(
+                llm=(self._initialize_llm(rewrite_model) if rewrite_model else self.llm) if mode == "llm" else None,
+                mode=mode,
+                max_history_turns=rewrite_config.get("max_history_turns", 4),
+                cache_size=rewrite_config.get("cache_size", 1024),
+            )
+            self.pipeline.add_stage(rewriter.stage(self.memory), before="retrieval")
+
+        # Skip retrieval for conversational/out-of-scope questions and the LLM when a factual one finds nothing
+        if routing_config.get("enabled"):
+            router = IntentRouter(
+                self.vector_db.embedding_model,
+                prototypes=routing_config.get("prototypes"),
+                min_similarity=routing_config.get("min_similarity", 0.45),
+                margin=routing_config.get("margin", 0.05),
+                no_context_answer=routing_config.get("no_context_answer", "I don't know."),
+                out_of_scope_answer=routing_config.get("out_of_scope_answer"),
+            )
+            self.pipeline.add_stage(router.route_stage(), after="add_user_turn")
+            self.pipeline.add_stage(router.no_context_stage(), after="retrieval")
+
         # Store default config values for use in invoke
         self.default_n_results = DEFAULT_N_RESULTS
         self.default_threshold = DEFAULT_THRESHOLD
@@ -130,60 +229,20 @@ class RAGAssistant:
 
         print("RAG Assistant initialized successfully")
 
-    def _initialize_llm(self):
+    def _initialize_llm(self, model_override: str = None):
         """
-        Initialize the LLM by checking for available API keys.
-        Uses provider preference from config, or tries OpenAI, Groq, and Google Gemini in that order.
+        Get the LLM client for the first provider with an API key (preference from config).
+
+        Clients come from the process-wide registry in utils/llm_utils.py, so every
+        RAGAssistant in this process (Streamlit sessions, evaluator runs) reuses the
+        same client and its pooled, already warmed-up connections.
+
+        Args:
+            model_override: Model name to use instead of the configured one (e.g. a cheaper model for rewrites)
         """
-        provider_preference = llm_config.get("provider_preference", "openai").lower()
-        temperature = llm_config.get("temperature", 0.0)
-        
-        # Determine provider order based on preference
-        providers = []
-        if provider_preference == "openai":
-            providers = ["openai", "groq", "google"]
-        elif provider_preference == "groq":
-            providers = ["groq", "openai", "google"]
-        elif provider_preference == "google":
-            providers = ["google", "openai", "groq"]
-        else:
-            providers = ["openai", "groq", "google"]  # default fallback
-        
-        # Try providers in preference order
-        for provider in providers:
-            if provider == "openai" and os.getenv("OPENAI_API_KEY"):
-                model_name = os.getenv("OPENAI_MODEL") or llm_config.get("openai_model", "gpt-4o-mini")
-                LOGGER.info(f"Using OpenAI model: {model_name}")
-                print(f"Using OpenAI model: {model_name}")
-                return ChatOpenAI(
-                    api_key=os.getenv("OPENAI_API_KEY"), 
-                    model=model_name, 
-                    temperature=temperature
-                )
-            
-            elif provider == "groq" and os.getenv("GROQ_API_KEY"):
-                model_name = os.getenv("GROQ_MODEL") or llm_config.get("groq_model", "llama-3.1-8b-instant")
-                LOGGER.info(f"Using Groq model: {model_name}")
-                print(f"Using Groq model: {model_name}")
-                return ChatGroq(
-                    api_key=os.getenv("GROQ_API_KEY"), 
-                    model=model_name, 
-                    temperature=temperature
-                )
-            
-            elif provider == "google" and os.getenv("GOOGLE_API_KEY"):
-                model_name = os.getenv("GOOGLE_MODEL") or llm_config.get("google_model", "gemini-2.0-flash")
-                LOGGER.info(f"Using Google Gemini model: {model_name}")
-                print(f"Using Google Gemini model: {model_name}")
-                return ChatGoogleGenerativeAI(
-                    google_api_key=os.getenv("GOOGLE_API_KEY"),
-                    model=model_name,
-                    temperature=temperature,
-                )
-        
-        raise ValueError(
-            "No valid API key found. Please set one of: OPENAI_API_KEY, GROQ_API_KEY, or GOOGLE_API_KEY in your .env file"
-        )
+        llm = get_llm(llm_config, model_override=model_override)
+        LOGGER.info(f"Using LLM: {type(llm).__name__} ({getattr(llm, 'model_name', None) or getattr(llm, 'model', '')})")
+        return llm
 
 
     def add_documents(self, documents: List) -> None:
@@ -193,6 +252,10 @@ class RAGAssistant:
         Args:
             documents: List of documents
         """
+        if self.vector_db.read_only:
+            LOGGER.info(f"Vector DB backend '{self.vector_db.backend}' is read-only; skipping add_documents")
+            return
+
         self.vector_db.add_documents(documents)
 
         # Logging and Tracing 
@@ -204,81 +267,61 @@ class RAGAssistant:
             "count": len(documents),
         })
 
-    def invoke(self, input: str, n_results: int = None, threshold: float = None) -> str:
+    def run(
+        self,
+        input: str,
+        n_results: int = None,
+        threshold: float = None,
+        trace: JsonlTrace = None,
+        session_id: str = None,
+        priority: str = None,
+        deadline_seconds: float = None,
+    ) -> PipelineResult:
         """
-        Query the RAG assistant.
+        Query the RAG assistant and return the full pipeline result.
 
         Args:
             input: User's input
             n_results: Number of relevant chunks to retrieve (defaults to config value)
             threshold: Similarity threshold for retrieval (defaults to config value)
+            trace: Trace file to write the request to (defaults to the CLI trace)
+            session_id: Session for tracing and scheduler fairness (defaults to this assistant's session)
+            priority: Scheduler priority class, e.g. "interactive" or "batch" (default: the highest)
+            deadline_seconds: Longest to wait for a scheduler slot (defaults to scheduler.deadline_seconds)
 
         Returns:
-            The assistant's answer as a string
+            PipelineResult with answer, retrieved contexts, distances and per-stage timings
+
+        Raises:
+            Overloaded: If the scheduler is enabled and rejects the request
         """
         # Use provided values or fall back to defaults
         n_results = n_results if n_results is not None else self.default_n_results
         threshold = threshold if threshold is not None else self.default_threshold
-        
-        request_id = uuid.uuid4().hex
-        total_timer = TimingContext()
-        
-        with total_timer:
-            self.memory.add_user_turn(input.strip())
-
-            # Retrieval with timing
-            retrieval_timer = TimingContext()
-            with retrieval_timer:
-                retrieved = self.vector_db.search(query=input, n_results=n_results, threshold=threshold)
-            retrieval_latency = retrieval_timer.get_elapsed()
-            
-            docs = retrieved.get("documents", []) if isinstance(retrieved, dict) else []
-            doc_ids = retrieved.get("ids", []) if isinstance(retrieved, dict) else []
-            distances = retrieved.get("distances", []) if isinstance(retrieved, dict) else []
-            
-            if not docs:
-                context = ""  # let the prompt trigger "I don't know."
-            else:
-                context = "\n\n".join(f"[{i+1}] {d}" for i, d in enumerate(docs))
-
-            # Memory block
-            memory_block = self.memory.get_memory_context()
-
-            # Invoke LLM with timing
-            llm_timer = TimingContext()
-            with llm_timer:
-                llm_answer = self.chain.invoke({
-                    "memory": memory_block,
-                    "context": context,
-                    "question": input
-                })
-            llm_latency = llm_timer.get_elapsed()
-
-            # Record assistant turn and maybe summarize/compact
-            self.memory.add_assistant_turn(llm_answer)
-        
-        total_latency = total_timer.get_elapsed()
 
-        # Enhanced logging with latency info
-        latency_info = f" | retrieval={retrieval_latency*1000:.1f}ms | llm={llm_latency*1000:.1f}ms | total={total_latency*1000:.1f}ms" if TRACE.log_latency else ""
-        LOGGER.info(f"[request_id={request_id}] Q len={len(input)} | ctx_docs={len(docs)} | A len={len(llm_answer)}{latency_info}")
-        
-        # Use enhanced trace writing
-        TRACE.write_enhanced_invoke(
-            session_id=self.trace_session_id,
-            request_id=request_id,
+        return self.pipeline.run(
             question=input,
-            answer=llm_answer,
-            retrieved_docs=docs,
-            doc_ids=doc_ids if doc_ids else None,
-            distances=distances if distances else None,
-            retrieval_latency=retrieval_latency,
-            llm_latency=llm_latency,
-            total_latency=total_latency,
-            memory_excerpt=memory_block,
+            session_id=session_id or self.trace_session_id,
+            n_results=n_results,
+            threshold=threshold,
+            trace=trace if trace is not None else TRACE,
+            priority=priority,
+            deadline_seconds=deadline_seconds,
         )
 
-        return llm_answer
+    def invoke(self, input: str, n_results: int = None, threshold: float = None) -> str:
+        """
+        Query the RAG assistant.
+
+        Args:
+            input: User's input
+            n_results: Number of relevant chunks to retrieve (defaults to config value)
+            threshold: Similarity threshold for retrieval (defaults to config value)
+
+        Returns:
+            The assistant's answer as a string
+        """
+        return self.run(input, n_results=n_results, threshold=threshold).answer
 
 def main():
     """Main function to demonstrate the RAG assistant."""
@@ -288,14 +331,17 @@ def main():
         print("Initializing RAG Assistant...")
         assistant = RAGAssistant()
 
-        # Load sample documents
-        LOGGER.info("Loading documents...")
-        print("\nLoading documents...")
-        sample_docs = load_all_publications()
-        LOGGER.info(f"Loaded {len(sample_docs)} sample documents")
-        print(f"Loaded {len(sample_docs)} sample documents")
-
-        assistant.add_documents(sample_docs)
+        if assistant.corpus_watcher is not None:
+            print("\nWatching documents/ for changes; the index is synced in the background")
+        else:
+            # Load sample documents
+            LOGGER.info("Loading documents...")
+            print("\nLoading documents...")
+            sample_docs = list_publication_files()
+            LOGGER.info(f"Loaded {len(sample_docs)} sample documents")
+            print(f"Loaded {len(sample_docs)} sample documents")
+
+            assistant.add_documents(sample_docs)
 
         done = False
 
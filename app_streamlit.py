@@ -10,9 +10,10 @@ from datetime import datetime, timezone
 import streamlit as st
 
 from utils.paths import OUTPUTS_DIR, APP_CONFIG_FPATH
-from utils.file_utils import load_all_publications, load_yaml_config
-from utils.log_utils import get_logger, JsonlTrace, TimingContext
+from utils.file_utils import list_publication_files, load_yaml_config
+from utils.log_utils import get_logger, JsonlTrace
 from app import RAGAssistant
+from utils.scheduler import Overloaded
 
 LOGGER = get_logger("rag_assistant_ui", outputs_dir=OUTPUTS_DIR)
 
@@ -51,10 +52,11 @@ def get_assistant():
     if st.session_state.assistant is None:
         LOGGER.info("Initializing RAGAssistant for Streamlit UI...")
         assistant = RAGAssistant()
-        # Load documents once
-        docs = load_all_publications()
-        assistant.add_documents(docs)
-        LOGGER.info(f"Docs loaded: {len(docs)}")
+        # Load documents once (unless the corpus watcher keeps the index in sync)
+        if assistant.corpus_watcher is None:
+            docs = list_publication_files()
+            assistant.add_documents(docs)
+            LOGGER.info(f"Docs loaded: {len(docs)}")
         st.session_state.assistant = assistant
     return st.session_state.assistant
 
@@ -84,80 +86,43 @@ def format_context(docs, doc_ids=None, distances=None):
 def process_query(user_input, top_k=3, threshold=0.5):
     """Process a user query and return response with context."""
     assistant = get_assistant()
-    request_id = assistant.trace_session_id[:8] + "_" + str(len(st.session_state.chat_history))
     
     # Add user message to history
     st.session_state.chat_history.append({"role": "user", "content": user_input})
     
-    total_timer = TimingContext()
-    with total_timer:
-        # Retrieval with timing
-        retrieval_timer = TimingContext()
-        with retrieval_timer:
-            retrieved = assistant.vector_db.search(query=user_input, n_results=top_k, threshold=threshold)
-        retrieval_latency = retrieval_timer.get_elapsed()
-        
-        docs = retrieved.get("documents", []) if isinstance(retrieved, dict) else []
-        doc_ids = retrieved.get("ids", []) if isinstance(retrieved, dict) else []
-        distances = retrieved.get("distances", []) if isinstance(retrieved, dict) else []
-        
-        # Memory block for prompt
-        assistant.memory.add_user_turn(user_input)
-        memory_block = assistant.memory.get_memory_context()
-        
-        # LLM call with timing
-        llm_timer = TimingContext()
-        with llm_timer:
-            answer = assistant.chain.invoke({
-                "memory": memory_block,
-                "context": "\n\n".join(f"[{i+1}] {d}" for i, d in enumerate(docs)) if docs else "",
-                "question": user_input
-            })
-        llm_latency = llm_timer.get_elapsed()
-        
-        # Record assistant turn
-        assistant.memory.add_assistant_turn(answer)
-    
-    total_latency = total_timer.get_elapsed()
+    # Same pipeline as the CLI; only the trace file differs
+    try:
+        result = assistant.run(user_input, n_results=top_k, threshold=threshold, trace=TRACE)
+    except Overloaded as e:
+        # Turned away by admission control: drop the question so the user can resend it
+        LOGGER.warning(f"Query rejected by admission control: {e}")
+        st.session_state.chat_history.pop()
+        return None, None, None
     
     # Add assistant response to history
-    st.session_state.chat_history.append({"role": "assistant", "content": answer})
+    st.session_state.chat_history.append({"role": "assistant", "content": result.answer})
     
     # Store context and memory for display
     context_info = {
         "query": user_input,
-        "documents": docs,
-        "doc_ids": doc_ids,
-        "distances": distances,
+        "documents": result.documents,
+        "doc_ids": result.doc_ids,
+        "distances": result.distances,
         "threshold": threshold,
         "n_results": top_k,
-        "retrieval_latency": retrieval_latency,
-        "llm_latency": llm_latency,
-        "total_latency": total_latency,
+        "retrieval_latency": result.retrieval_latency,
+        "llm_latency": result.llm_latency,
+        "total_latency": result.total_latency,
+        "stage_timings": result.timings,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     st.session_state.retrieved_contexts.append(context_info)
     st.session_state.memory_history.append({
-        "memory": memory_block,
+        "memory": result.memory_block,
         "timestamp": datetime.now(timezone.utc).isoformat()
     })
     
-    # Enhanced trace for debugging
-    TRACE.write_enhanced_invoke(
-        session_id=assistant.trace_session_id,
-        request_id=request_id,
-        question=user_input,
-        answer=answer,
-        retrieved_docs=docs,
-        doc_ids=doc_ids if doc_ids else None,
-        distances=distances if distances else None,
-        retrieval_latency=retrieval_latency,
-        llm_latency=llm_latency,
-        total_latency=total_latency,
-        memory_excerpt=memory_block or "",
-    )
-    
-    return answer, context_info, memory_block
+    return result.answer, context_info, result.memory_block
 
 
 # Main UI
@@ -235,6 +200,9 @@ with col1:
     if user_input:
         with st.spinner("Processing your query..."):
             answer, context_info, memory_block = process_query(user_input, top_k, threshold)
+        if answer is None:
+            st.warning("The assistant is busy right now. Please try again in a moment.")
+        else:
             st.rerun()
 
 with col2:
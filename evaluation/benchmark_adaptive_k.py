@@ -0,0 +1,155 @@
+"""
+Adaptive top-k Benchmark
+
+Runs the evaluation questions through VectorDB.search with fixed k values and
+with the adaptive cut-offs, and reports for each setting the average number of
+chunks and context characters sent to the LLM (prompt size), answer coverage
+of the retrieved context (share of the reference answer's content words it
+contains, a label-free recall proxy) and search latency.
+"""
+
+import os
+
+# Disable ChromaDB telemetry BEFORE any imports to avoid "capture() takes 1 positional argument but 3 were given" warnings
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import json
+from pathlib import Path
+from typing import Dict, Any, List
+
+# Import project modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from utils.vectordb import VectorDB
+from utils.file_utils import list_publication_files
+from utils.paths import EVALUATION_RESULTS_DIR
+from utils.retrieval_eval import answer_coverage, latency_summary, load_evaluation_cases, time_calls
+from evaluation.run_registry import config_fingerprint, record_run
+
+FIXED_KS = (1, 3, 5, 8)
+ADAPTIVE_METHODS = ("gap", "relative")
+
+
+def run_benchmark(
+    threshold: float = 0.5,
+    min_k: int = 1,
+    max_k: int = 8,
+    min_gap: float = 0.05,
+    min_relative_score: float = 0.85,
+    repeat: int = 3,
+    max_cases: int = None,
+) -> Dict[str, Any]:
+    """
+    Compare fixed and adaptive k on the evaluation set.
+
+    Args:
+        threshold: Cosine distance threshold used for every setting
+        min_k: Adaptive lower bound
+        max_k: Adaptive upper bound (and candidates fetched)
+        min_gap: Smallest distance jump the "gap" method cuts at
+        min_relative_score: Similarity ratio kept by the "relative" method
+        repeat: Timed passes over the questions
+        max_cases: Optional limit on evaluation cases
+
+    Returns:
+        Dictionary with one entry per setting (k, context size, coverage, latency)
+        plus per-case coverage and latency samples for the run registry
+    """
+    vector_db = VectorDB(
+        collection_name="publications",
+        embedding_model="sentence-transformers/all-MiniLM-L6-v2",
+        min_k=min_k,
+        max_k=max_k,
+        min_gap=min_gap,
+        min_relative_score=min_relative_score,
+    )
+    if vector_db.collection.count() == 0:
+        print("Collection is empty; loading documents...")
+        vector_db.add_documents(list_publication_files())
+
+    cases = load_evaluation_cases(max_cases=max_cases)
+    questions = [case["Question"] for case in cases]
+
+    settings = [(f"fixed_k{k}", {"n_results": k, "adaptive": False}) for k in FIXED_KS]
+    for method in ADAPTIVE_METHODS:
+        settings.append((f"adaptive_{method}", {"adaptive": True, "method": method}))
+
+    report: Dict[str, Any] = {"questions": len(questions), "threshold": threshold, "settings": {}}
+    registry: Dict[str, Dict] = {"quality": {}, "latency_ms": {}}
+    for name, options in settings:
+        if "method" in options:
+            vector_db.adaptive_options["method"] = options["method"]
+        latencies, outputs = time_calls(
+            lambda q: vector_db.search(
+                query=q, n_results=options.get("n_results", max_k), threshold=threshold, adaptive=options["adaptive"]
+            ),
+            questions,
+            repeat=repeat,
+        )
+        coverage = [answer_coverage(case["Answer"], out["documents"]) for case, out in zip(cases, outputs)]
+        report["settings"][name] = {
+            "mean_k": round(float(np.mean([len(out["documents"]) for out in outputs])), 3),
+            "mean_context_chars": round(float(np.mean([sum(map(len, out["documents"])) for out in outputs])), 1),
+            "answer_coverage": round(float(np.mean(coverage)), 4),
+            "latency": latency_summary(latencies),
+        }
+        registry["quality"][f"answer_coverage:{name}"] = {str(i): c for i, c in enumerate(coverage)}
+        registry["latency_ms"][name] = [seconds * 1000 for seconds in latencies]
+    report["registry"] = registry
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the benchmark report as a table."""
+    print(f"\n{'='*80}")
+    print(f"Adaptive top-k benchmark: {report['questions']} questions, threshold={report['threshold']}")
+    print(f"{'='*80}")
+    print(f"{'setting':<20}{'mean k':>10}{'ctx chars':>12}{'coverage':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in report["settings"].items():
+        lat = stats["latency"]
+        print(f"{name:<20}{stats['mean_k']:>10.2f}{stats['mean_context_chars']:>12.0f}"
+              f"{stats['answer_coverage']:>10.3f}{lat['p50_ms']:>10.3f}{lat['p95_ms']:>10.3f}")
+    print(f"{'='*80}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare fixed top-k with adaptive top-k on the evaluation set")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Cosine distance threshold (default: 0.5)")
+    parser.add_argument("--min-k", type=int, default=1)
+    parser.add_argument("--max-k", type=int, default=8)
+    parser.add_argument("--min-gap", type=float, default=0.05)
+    parser.add_argument("--min-relative-score", type=float, default=0.85)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the questions (default: 3)")
+    parser.add_argument("--max-cases", type=int, default=None, help="Limit the number of evaluation cases")
+    parser.add_argument("--no-register", action="store_true", help="Do not record this run in the run registry")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        threshold=args.threshold,
+        min_k=args.min_k,
+        max_k=args.max_k,
+        min_gap=args.min_gap,
+        min_relative_score=args.min_relative_score,
+        repeat=args.repeat,
+        max_cases=args.max_cases,
+    )
+    registry = report.pop("registry")
+    print_report(report)
+
+    results_path = Path(EVALUATION_RESULTS_DIR) / "benchmark_adaptive_k.json"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
+
+    if not args.no_register:
+        fingerprint = config_fingerprint(
+            threshold=args.threshold, min_k=args.min_k, max_k=args.max_k,
+            min_gap=args.min_gap, min_relative_score=args.min_relative_score,
+        )
+        record_run("benchmark_adaptive_k", fingerprint, registry["quality"], registry["latency_ms"], summary=report)
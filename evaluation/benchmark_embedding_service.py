@@ -0,0 +1,231 @@
+"""
+Embedding Service Benchmark
+
+Starts N worker processes that each embed evaluation questions one at a time,
+as concurrent searches do, in two modes:
+
+- local: every worker loads its own copy of the embedding model
+- service: workers send requests to one shared embedding server
+  (utils/embedding_service.py), which batches them across workers
+
+and reports per-worker and total resident memory (RSS), aggregate throughput
+and per-request latency for each mode.
+"""
+
+import os
+import json
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+# Import project modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from utils.paths import EVALUATION_RESULTS_DIR
+from utils.retrieval_eval import load_evaluation_questions, latency_summary
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, in KB on Linux
+
+
+def _set_threads(threads: int) -> None:
+    import torch
+
+    torch.set_num_threads(max(1, threads))
+
+
+def _serve(socket_path: str, max_batch_size: int, max_wait_ms: float, threads: int, ready, stop, results) -> None:
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from sentence_transformers import SentenceTransformer
+    from utils.embedding_service import EmbeddingServer
+
+    _set_threads(threads)
+    server = EmbeddingServer(
+        SentenceTransformer(MODEL_NAME), MODEL_NAME, socket_path,
+        max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+    ).start()
+    ready.set()
+    stop.wait()
+    results.put({"role": "server", "rss_mb": rss_mb()})
+    server.close()
+
+
+def _worker(mode: str, socket_path: str, texts: List[str], threads: int, barrier, results) -> None:
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    if mode == "local":
+        from sentence_transformers import SentenceTransformer
+
+        _set_threads(threads)
+        model = SentenceTransformer(MODEL_NAME)
+    else:
+        from utils.embedding_service import EmbeddingClient
+
+        model = EmbeddingClient(socket_path, model_name=MODEL_NAME)
+    model.encode([texts[0]])  # warm-up
+
+    barrier.wait()
+    latencies = []
+    start = time.time()
+    for text in texts:
+        t0 = time.perf_counter()
+        model.encode([text])
+        latencies.append(time.perf_counter() - t0)
+    results.put({"role": "worker", "rss_mb": rss_mb(), "latencies": latencies, "start": start, "end": time.time()})
+
+
+def run_mode(
+    mode: str,
+    workers: int,
+    texts: List[str],
+    max_batch_size: int = 64,
+    max_wait_ms: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Run every worker in one mode and collect memory, throughput and latency.
+
+    Args:
+        mode: "local" or "service"
+        workers: Worker processes
+        texts: Texts each worker embeds, one request per text
+        max_batch_size: Server batch size (service mode)
+        max_wait_ms: Server batching window (service mode)
+
+    Returns:
+        Dictionary of RSS, throughput and latency statistics
+    """
+    ctx = mp.get_context("spawn")
+    cpus = os.cpu_count() or 1
+    results = ctx.Queue()
+    barrier = ctx.Barrier(workers)
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="embedding-bench-"), "embedding.sock")
+
+    server = stop = None
+    if mode == "service":
+        ready, stop = ctx.Event(), ctx.Event()
+        server = ctx.Process(target=_serve, args=(socket_path, max_batch_size, max_wait_ms, cpus, ready, stop, results))
+        server.start()
+        if not ready.wait(timeout=300):
+            raise RuntimeError("Embedding server did not start")
+
+    # Local workers split the cores; the server gets all of them
+    threads = max(1, cpus // workers)
+    processes = [
+        ctx.Process(target=_worker, args=(mode, socket_path, texts, threads, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    server_rss = 0.0
+    if server is not None:
+        stop.set()
+        server_rss = results.get()["rss_mb"]
+        server.join()
+
+    latencies = [seconds for report in reports for seconds in report["latencies"]]
+    wall = max(r["end"] for r in reports) - min(r["start"] for r in reports)
+    worker_rss = [r["rss_mb"] for r in reports]
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "throughput_texts_per_s": round(len(latencies) / wall, 1) if wall > 0 else None,
+        "latency": latency_summary(latencies),
+        "worker_rss_mb": round(float(np.mean(worker_rss)), 1),
+        "server_rss_mb": round(server_rss, 1),
+        "total_rss_mb": round(sum(worker_rss) + server_rss, 1),
+    }
+
+
+def run_benchmark(
+    workers: int = 4,
+    requests_per_worker: int = 200,
+    max_batch_size: int = 64,
+    max_wait_ms: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Compare per-worker models with the shared embedding service.
+
+    Args:
+        workers: Concurrent worker processes
+        requests_per_worker: Single-text encode requests per worker (evaluation questions, cycled)
+        max_batch_size: Server batch size
+        max_wait_ms: Server batching window
+
+    Returns:
+        Dictionary with one entry per mode
+    """
+    questions = load_evaluation_questions()
+    texts = [questions[i % len(questions)] for i in range(requests_per_worker)]
+    report: Dict[str, Any] = {
+        "model": MODEL_NAME,
+        "cpus": os.cpu_count(),
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait_ms,
+        "modes": {},
+    }
+    for mode in ("local", "service"):
+        print(f"Running {mode} mode with {workers} workers...")
+        report["modes"][mode] = run_mode(mode, workers, texts, max_batch_size, max_wait_ms)
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the benchmark report as a table."""
+    print(f"\n{'='*84}")
+    print(f"Embedding service benchmark: {report['model']}, {report['cpus']} CPUs, "
+          f"batch <= {report['max_batch_size']}, wait <= {report['max_wait_ms']} ms")
+    print(f"{'='*84}")
+    print(f"{'mode':<10}{'workers':>8}{'texts/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'worker MB':>11}{'server MB':>11}{'total MB':>10}")
+    for mode, stats in report["modes"].items():
+        lat = stats["latency"]
+        print(f"{mode:<10}{stats['workers']:>8}{stats['throughput_texts_per_s']:>10.1f}{lat['p50_ms']:>10.2f}"
+              f"{lat['p95_ms']:>10.2f}{stats['worker_rss_mb']:>11.1f}{stats['server_rss_mb']:>11.1f}"
+              f"{stats['total_rss_mb']:>10.1f}")
+    print(f"{'='*84}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare per-worker embedding models with the shared embedding service")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent worker processes (default: 4)")
+    parser.add_argument("--requests", type=int, default=200, help="Encode requests per worker (default: 200)")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Server batch size (default: 64)")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Server batching window in ms (default: 5)")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        workers=args.workers,
+        requests_per_worker=args.requests,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    )
+    print_report(report)
+
+    results_path = Path(EVALUATION_RESULTS_DIR) / "benchmark_embedding_service.json"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
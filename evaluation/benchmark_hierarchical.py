@@ -0,0 +1,219 @@
+"""
+Two-stage Retrieval Benchmark
+
+Compares flat Chroma HNSW search with coarse-to-fine search (document vectors
+first, then chunks of the top documents only) as the corpus grows. Larger
+corpora are synthesized from the indexed one: every source document is copied
+``scale - 1`` times as a new source, with small Gaussian noise added to its
+chunk embeddings. Each scale is loaded into an in-memory Chroma client; recall@k
+of both methods is measured against exact search over the same scaled corpus.
+"""
+
+import os
+
+# Disable ChromaDB telemetry BEFORE any imports to avoid "capture() takes 1 positional argument but 3 were given" warnings
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import json
+from pathlib import Path
+from typing import Dict, Any, Sequence
+
+# Import project modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chromadb
+import numpy as np
+
+from utils.vectordb import COLLECTION_METADATA, VectorDB
+from utils.vector_backends import NumpyIndex
+from utils.hierarchical_index import DocumentIndex, doc_collection_name
+from utils.file_utils import list_publication_files
+from utils.paths import EVALUATION_RESULTS_DIR
+from utils.retrieval_eval import load_evaluation_questions, recall_at_k, latency_summary, time_calls
+from evaluation.run_registry import config_fingerprint, record_run
+
+
+def load_corpus(collection, page_size: int = 5000) -> Dict[str, Any]:
+    """Read ids, embeddings, documents and sources of every chunk with a source."""
+    corpus = {"ids": [], "embeddings": [], "documents": [], "sources": []}
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        for chunk_id, embedding, document, metadata in zip(
+            page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+        ):
+            if metadata and metadata.get("source"):
+                corpus["ids"].append(chunk_id)
+                corpus["embeddings"].append(embedding)
+                corpus["documents"].append(document)
+                corpus["sources"].append(metadata["source"])
+    corpus["embeddings"] = np.asarray(corpus["embeddings"], dtype=np.float32)
+    return corpus
+
+
+def build_scaled(client, corpus: Dict[str, Any], scale: int, noise: float, batch_size: int, seed: int = 0):
+    """
+    Load ``scale`` copies of the corpus into ``client``.
+
+    Returns:
+        (chunk collection, DocumentIndex, exact NumpyIndex) over the scaled corpus
+    """
+    rng = np.random.default_rng(seed)
+    name = f"bench_x{scale}"
+    for existing in (name, doc_collection_name(name)):
+        try:
+            client.delete_collection(existing)
+        except Exception:
+            pass
+    collection = client.create_collection(name=name, metadata=COLLECTION_METADATA)
+    exact = NumpyIndex(initial_capacity=len(corpus["ids"]) * scale)
+
+    for replica in range(scale):
+        embeddings = corpus["embeddings"]
+        if replica:
+            embeddings = embeddings + noise * rng.standard_normal(embeddings.shape, dtype=np.float32)
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        ids = [f"{chunk_id}#copy{replica}" for chunk_id in corpus["ids"]]
+        metadatas = [{"source": f"{source}#copy{replica}"} for source in corpus["sources"]]
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end].tolist(),
+                documents=corpus["documents"][start:end],
+                metadatas=metadatas[start:end],
+            )
+        exact.add(ids, embeddings, corpus["documents"])
+
+    doc_index = DocumentIndex(client.create_collection(name=doc_collection_name(name), metadata=COLLECTION_METADATA))
+    doc_index.rebuild(collection, page_size=batch_size)
+    return collection, doc_index, exact
+
+
+def run_benchmark(
+    scales: Sequence[int] = (1, 10, 100),
+    k: int = 3,
+    top_docs: Sequence[int] = (3, 5, 10),
+    noise: float = 0.01,
+    repeat: int = 3,
+    max_cases: int = None,
+) -> Dict[str, Any]:
+    """
+    Compare flat and two-stage search at several corpus sizes.
+
+    Args:
+        scales: Corpus multipliers (1 = the indexed corpus)
+        k: Number of results per query
+        top_docs: First-stage document counts to try
+        noise: Standard deviation of the noise added to copied embeddings
+        repeat: Timed passes over the questions
+        max_cases: Optional limit on evaluation questions
+
+    Returns:
+        (report, registry): per-scale latency summaries and recall@k, and per-query
+        recall plus raw latency samples for the run registry
+    """
+    vector_db = VectorDB(
+        collection_name="publications",
+        embedding_model="sentence-transformers/all-MiniLM-L6-v2",
+    )
+    if vector_db.collection.count() == 0:
+        print("Collection is empty; loading documents...")
+        vector_db.add_documents(list_publication_files())
+
+    corpus = load_corpus(vector_db.collection)
+    questions = load_evaluation_questions(max_cases=max_cases)
+    query_embeddings = vector_db.embedding_model.encode(questions)
+    client = chromadb.EphemeralClient()
+    batch_size = getattr(client, "get_max_batch_size", lambda: 5000)()
+
+    report: Dict[str, Any] = {
+        "corpus_chunks": len(corpus["ids"]),
+        "corpus_documents": len(set(corpus["sources"])),
+        "questions": len(questions),
+        "k": k,
+        "noise": noise,
+        "scales": {},
+    }
+    registry: Dict[str, Dict] = {"quality": {}, "latency_ms": {}}
+    for scale in scales:
+        print(f"Building x{scale} corpus ({len(corpus['ids']) * scale} chunks)...")
+        collection, doc_index, exact = build_scaled(client, corpus, scale, noise, batch_size)
+        reference_ids = [
+            exact.query(query_embeddings=[q], n_results=k, include=[])["ids"][0] for q in query_embeddings
+        ]
+
+        methods = [("flat", lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k, include=["distances"]))]
+        for n_docs in top_docs:
+            methods.append((
+                f"two_stage_docs{n_docs}",
+                lambda q, n_docs=n_docs: doc_index.query(collection, [q], n_results=k, include=["distances"], n_docs=n_docs),
+            ))
+
+        stats: Dict[str, Any] = {"chunks": collection.count(), "documents": doc_index.count(), "methods": {}}
+        for name, search in methods:
+            latencies, outputs = time_calls(search, list(query_embeddings), repeat=repeat)
+            candidate_ids = [out["ids"][0] for out in outputs]
+            stats["methods"][name] = {
+                "latency": latency_summary(latencies),
+                f"recall@{k}": round(recall_at_k(reference_ids, candidate_ids), 4),
+            }
+            tag = f"x{scale}:{name}"
+            registry["quality"][f"recall@{k}:{tag}"] = {
+                str(i): recall_at_k([ref], [cand]) for i, (ref, cand) in enumerate(zip(reference_ids, candidate_ids))
+            }
+            registry["latency_ms"][tag] = [seconds * 1000 for seconds in latencies]
+        report["scales"][f"x{scale}"] = stats
+
+        client.delete_collection(collection.name)
+        client.delete_collection(doc_index.collection.name)
+    return report, registry
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the benchmark report as a table."""
+    k = report["k"]
+    print(f"\n{'='*84}")
+    print(f"Two-stage retrieval benchmark: {report['corpus_chunks']} chunks / {report['corpus_documents']} documents "
+          f"per copy, {report['questions']} questions, k={k}")
+    print(f"{'='*84}")
+    print(f"{'scale':<8}{'chunks':>10}{'docs':>8}  {'method':<20}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'recall':>8}")
+    for scale, stats in report["scales"].items():
+        for name, method in stats["methods"].items():
+            lat = method["latency"]
+            print(f"{scale:<8}{stats['chunks']:>10}{stats['documents']:>8}  {name:<20}{lat['mean_ms']:>10.3f}"
+                  f"{lat['p50_ms']:>10.3f}{lat['p95_ms']:>10.3f}{method[f'recall@{k}']:>8.3f}")
+    print(f"{'='*84}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark flat vs two-stage (document, then chunk) retrieval")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Corpus multipliers (default: 1 10 100)")
+    parser.add_argument("--k", type=int, default=3, help="Number of results per query (default: 3)")
+    parser.add_argument("--top-docs", type=int, nargs="+", default=[3, 5, 10], help="First-stage document counts (default: 3 5 10)")
+    parser.add_argument("--noise", type=float, default=0.01, help="Noise std-dev for copied embeddings (default: 0.01)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the questions (default: 3)")
+    parser.add_argument("--max-cases", type=int, default=None, help="Limit the number of evaluation questions")
+    parser.add_argument("--no-register", action="store_true", help="Do not record this run in the run registry")
+    args = parser.parse_args()
+
+    report, registry = run_benchmark(
+        scales=args.scales, k=args.k, top_docs=args.top_docs, noise=args.noise,
+        repeat=args.repeat, max_cases=args.max_cases,
+    )
+    print_report(report)
+
+    results_path = Path(EVALUATION_RESULTS_DIR) / "benchmark_hierarchical.json"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
+
+    if not args.no_register:
+        fingerprint = config_fingerprint(
+            n_results=args.k, scales=args.scales, top_docs=args.top_docs, noise=args.noise,
+            corpus_chunks=report["corpus_chunks"],
+        )
+        record_run("benchmark_hierarchical", fingerprint, registry["quality"], registry["latency_ms"], summary=report)
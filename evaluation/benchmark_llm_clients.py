@@ -0,0 +1,213 @@
+"""
+LLM Client Reuse Benchmark
+
+Runs a local fake OpenAI-compatible provider and simulates sessions (each new
+Streamlit session or evaluator builds a RAGAssistant, then asks a few
+questions) in two modes:
+
+- per_session: a fresh ChatOpenAI client with its own connection pool per
+  session (every session opens its own connections)
+- registry: clients from the process-wide LLMClientRegistry (utils/llm_utils.py),
+  sharing one warmed-up connection pool
+
+The fake provider adds ``--handshake-ms`` to the first request on every new
+connection (standing in for TCP + TLS setup to a remote API) and
+``--latency-ms`` to every request. Reported: first-request and overall latency
+per session, and connections opened.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Any
+
+# Import project modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from utils.llm_utils import LLMClientRegistry
+from utils.paths import EVALUATION_RESULTS_DIR
+from utils.retrieval_eval import latency_summary
+
+
+class FakeProvider:
+    """Minimal OpenAI-compatible server (``/v1/models`` and ``/v1/chat/completions``) on localhost."""
+
+    def __init__(self, handshake_ms: float = 50.0, latency_ms: float = 20.0):
+        provider = self
+        self.handshake_seconds = handshake_ms / 1000.0
+        self.latency_seconds = latency_ms / 1000.0
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def setup(self):
+                super().setup()
+                with provider._lock:
+                    provider.connections += 1
+                self._handshake_pending = True
+
+            def _respond(self, body: Dict[str, Any]) -> None:
+                if self._handshake_pending:
+                    time.sleep(provider.handshake_seconds)
+                    self._handshake_pending = False
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):  # noqa: N802 (http.server API)
+                self._respond({"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+
+            def do_POST(self):  # noqa: N802 (http.server API)
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with provider._lock:
+                    provider.requests += 1
+                time.sleep(provider.latency_seconds)
+                self._respond({
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "fake-model",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "This is a fake answer."},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                })
+
+            def log_message(self, format, *args):  # keep requests out of stderr
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, name="fake-llm", daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_sessions(make_llm, sessions: int, requests_per_session: int) -> Dict[str, Any]:
+    """Build a client per session with ``make_llm`` and time each request."""
+    first, later, setup = [], [], []
+    for _ in range(sessions):
+        start = time.perf_counter()
+        llm = make_llm()
+        setup.append(time.perf_counter() - start)
+        for i in range(requests_per_session):
+            start = time.perf_counter()
+            llm.invoke("What is the contribution limit?")
+            (first if i == 0 else later).append(time.perf_counter() - start)
+    return {
+        "client_setup": latency_summary(setup),
+        "first_request": latency_summary(first),
+        "later_requests": latency_summary(later),
+        "all_requests": latency_summary(first + later),
+    }
+
+
+def run_benchmark(
+    sessions: int = 20,
+    requests_per_session: int = 3,
+    handshake_ms: float = 50.0,
+    latency_ms: float = 20.0,
+) -> Dict[str, Any]:
+    """
+    Compare per-session clients with the client registry against the fake provider.
+
+    Args:
+        sessions: Simulated sessions (one client lookup each)
+        requests_per_session: LLM calls per session
+        handshake_ms: Extra delay on the first request of every new connection
+        latency_ms: Delay on every request
+
+    Returns:
+        Dictionary with one entry per mode
+    """
+    provider = FakeProvider(handshake_ms=handshake_ms, latency_ms=latency_ms)
+    llm_config = {
+        "provider_preference": "local",
+        "local_base_url": provider.base_url,
+        "local_model": "fake-model",
+        "temperature": 0.0,
+        "http": {"warm_up": True, "max_retries": 0},
+    }
+    modes = {
+        "per_session": lambda: ChatOpenAI(
+            api_key="not-needed", base_url=provider.base_url, model="fake-model", temperature=0.0, max_retries=0,
+            http_client=httpx.Client(),
+        ),
+    }
+    registry = LLMClientRegistry()
+    modes["registry"] = lambda: registry.get(llm_config)
+
+    report: Dict[str, Any] = {
+        "sessions": sessions,
+        "requests_per_session": requests_per_session,
+        "handshake_ms": handshake_ms,
+        "latency_ms": latency_ms,
+        "modes": {},
+    }
+    try:
+        for mode, make_llm in modes.items():
+            connections_before = provider.connections
+            stats = run_sessions(make_llm, sessions, requests_per_session)
+            stats["connections_opened"] = provider.connections - connections_before
+            report["modes"][mode] = stats
+    finally:
+        registry.close()
+        provider.close()
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the benchmark report as a table."""
+    print(f"\n{'='*84}")
+    print(f"LLM client reuse: {report['sessions']} sessions x {report['requests_per_session']} requests, "
+          f"handshake {report['handshake_ms']} ms, latency {report['latency_ms']} ms")
+    print(f"{'='*84}")
+    print(f"{'mode':<14}{'setup ms':>10}{'1st p50':>10}{'1st p95':>10}{'later p50':>11}{'all mean':>10}{'conns':>8}")
+    for mode, stats in report["modes"].items():
+        print(f"{mode:<14}{stats['client_setup']['mean_ms']:>10.2f}{stats['first_request']['p50_ms']:>10.2f}"
+              f"{stats['first_request']['p95_ms']:>10.2f}{stats['later_requests']['p50_ms']:>11.2f}"
+              f"{stats['all_requests']['mean_ms']:>10.2f}{stats['connections_opened']:>8}")
+    print(f"{'='*84}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark per-session LLM clients vs the shared client registry")
+    parser.add_argument("--sessions", type=int, default=20, help="Simulated sessions (default: 20)")
+    parser.add_argument("--requests", type=int, default=3, help="LLM calls per session (default: 3)")
+    parser.add_argument("--handshake-ms", type=float, default=50.0, help="Delay on each new connection's first request (default: 50)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Delay on every request (default: 20)")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        sessions=args.sessions,
+        requests_per_session=args.requests,
+        handshake_ms=args.handshake_ms,
+        latency_ms=args.latency_ms,
+    )
+    print_report(report)
+
+    results_path = Path(EVALUATION_RESULTS_DIR) / "benchmark_llm_clients.json"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
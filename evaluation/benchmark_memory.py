@@ -0,0 +1,147 @@
+"""
+Memory Manager Benchmark
+
+Replays long synthetic sessions (10k turns by default) through MemoryManager
+and reports per-turn append latency, get_memory_context latency (first render
+after a turn vs. cached re-reads), summarizations triggered, and the peak
+size of the turn buffer. The summarizer is a stub runnable, so the numbers
+isolate the bookkeeping cost, not the LLM.
+"""
+
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+# Import project modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.runnables import RunnableLambda
+
+from utils.memory_utils import MemoryManager
+from utils.paths import EVALUATION_RESULTS_DIR
+from utils.retrieval_eval import latency_summary
+
+WORDS = "retirement account contribution limit roth traditional employer match tax deferred withdrawal penalty".split()
+
+
+def synthetic_text(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def run_benchmark(
+    turns: int = 10000,
+    summarize_after_tokens: int = 1500,
+    recent_window_n: int = 8,
+    max_turns: int = 64,
+    context_reads: int = 3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Replay one session of ``turns`` user/assistant pairs.
+
+    Args:
+        turns: Number of question/answer pairs
+        summarize_after_tokens: MemoryManager token budget
+        recent_window_n: Turns kept after a summary
+        max_turns: Ring buffer capacity
+        context_reads: get_memory_context calls per turn (the pipeline and UI read it more than once)
+        seed: Random seed for the synthetic conversation
+
+    Returns:
+        Dictionary with latency summaries and buffer statistics
+    """
+    rng = random.Random(seed)
+    summaries = {"count": 0}
+
+    def fake_summarizer(_prompt) -> str:
+        summaries["count"] += 1
+        return f"- summary #{summaries['count']}"
+
+    with tempfile.TemporaryDirectory() as memory_dir:
+        memory = MemoryManager(
+            llm=RunnableLambda(fake_summarizer),
+            memory_dir=memory_dir,
+            summarize_after_tokens=summarize_after_tokens,
+            recent_window_n=recent_window_n,
+            max_turns=max_turns,
+        )
+        append_latencies: List[float] = []
+        first_read_latencies: List[float] = []
+        cached_read_latencies: List[float] = []
+        peak_turns = 0
+
+        for _ in range(turns):
+            question = synthetic_text(rng, 5, 25)
+            answer = synthetic_text(rng, 30, 150)
+
+            start = time.perf_counter()
+            memory.add_user_turn(question)
+            append_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            memory.get_memory_context()
+            first_read_latencies.append(time.perf_counter() - start)
+            for _ in range(context_reads - 1):
+                start = time.perf_counter()
+                memory.get_memory_context()
+                cached_read_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            memory.add_assistant_turn(answer)
+            append_latencies.append(time.perf_counter() - start)
+            peak_turns = max(peak_turns, len(memory.turns))
+
+    return {
+        "turn_pairs": turns,
+        "summarize_after_tokens": summarize_after_tokens,
+        "max_turns": max_turns,
+        "summarizations": summaries["count"],
+        "peak_buffered_turns": peak_turns,
+        "append": latency_summary(append_latencies),
+        "context_first_read": latency_summary(first_read_latencies),
+        "context_cached_read": latency_summary(cached_read_latencies),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the benchmark report as a table."""
+    print(f"\n{'='*72}")
+    print(f"Memory benchmark: {report['turn_pairs']} turn pairs, {report['summarizations']} summarizations, "
+          f"peak buffer {report['peak_buffered_turns']}/{report['max_turns']} turns")
+    print(f"{'='*72}")
+    print(f"{'operation':<24}{'mean ms':>12}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for name in ("append", "context_first_read", "context_cached_read"):
+        lat = report[name]
+        print(f"{name:<24}{lat['mean_ms']:>12.4f}{lat['p50_ms']:>12.4f}{lat['p95_ms']:>12.4f}{lat['p99_ms']:>12.4f}")
+    print(f"{'='*72}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark MemoryManager bookkeeping on long sessions")
+    parser.add_argument("--turns", type=int, default=10000, help="Question/answer pairs per session (default: 10000)")
+    parser.add_argument("--summarize-after-tokens", type=int, default=1500)
+    parser.add_argument("--recent-window", type=int, default=8)
+    parser.add_argument("--max-turns", type=int, default=64)
+    parser.add_argument("--context-reads", type=int, default=3, help="Memory block reads per turn (default: 3)")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        turns=args.turns,
+        summarize_after_tokens=args.summarize_after_tokens,
+        recent_window_n=args.recent_window,
+        max_turns=args.max_turns,
+        context_reads=args.context_reads,
+    )
+    print_report(report)
+
+    results_path = Path(EVALUATION_RESULTS_DIR) / "benchmark_memory.json"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
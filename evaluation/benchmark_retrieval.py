@@ -0,0 +1,187 @@
+"""
+Retrieval Backend Benchmark
+
+Compares the Chroma HNSW path against exact in-memory NumPy search and the
+int8/float16 quantized index on the questions from rag_evaluation_cases.json.
+Query embeddings are computed once up front, so the numbers isolate index
+latency; recall is measured against exact search. The numpy and quantized
+runs also report the size of their own in-memory index (float32 matrix or
+search codes). That is not process memory: the Chroma store stays resident,
+and the quantized index rescores from it.
+"""
+
+import os
+
+# Disable ChromaDB telemetry BEFORE any imports to avoid "capture() takes 1 positional argument but 3 were given" warnings
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+# Import project modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.vectordb import VectorDB
+from utils.vector_backends import NumpyIndex, QuantizedIndex
+from utils.file_utils import list_publication_files
+from utils.paths import EVALUATION_RESULTS_DIR
+from utils.retrieval_eval import load_evaluation_questions, recall_at_k, latency_summary, time_calls
+from evaluation.run_registry import config_fingerprint, record_run
+
+
+def benchmark_single(name: str, index, query_embeddings, k: int, repeat: int) -> Dict[str, Any]:
+    """Time one ``index.query`` call per question (the path VectorDB.search takes)."""
+    latencies, outputs = time_calls(
+        lambda q: index.query(query_embeddings=[q], n_results=k, include=["documents", "distances"]),
+        list(query_embeddings),
+        repeat=repeat,
+    )
+    return {
+        "name": name,
+        "latency": latency_summary(latencies),
+        "samples_ms": [seconds * 1000 for seconds in latencies],
+        "ids": [out["ids"][0] for out in outputs],
+    }
+
+
+def benchmark_batched(name: str, index, query_embeddings, k: int, repeat: int) -> Dict[str, Any]:
+    """Time a single batched ``index.query`` over all questions; latency is per query."""
+    latencies = []
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = index.query(query_embeddings=query_embeddings, n_results=k, include=["documents", "distances"])
+        latencies.append((time.perf_counter() - start) / len(query_embeddings))
+    return {
+        "name": name,
+        "latency": latency_summary(latencies),
+        "samples_ms": [seconds * 1000 for seconds in latencies],
+        "ids": results["ids"],
+    }
+
+
+def run_benchmark(k: int = 3, repeat: int = 5, max_cases: int = None, rescore_multiplier: int = 4) -> Dict[str, Any]:
+    """
+    Run the backend comparison.
+
+    Args:
+        k: Number of results per query
+        repeat: Number of timed passes over the questions
+        max_cases: Optional limit on evaluation questions
+        rescore_multiplier: Candidates rescored per result for the quantized runs
+
+    Returns:
+        (report, registry): the report with per-backend latency summaries and recall@k,
+        and per-query recall plus raw latency samples for the run registry
+    """
+    vector_db = VectorDB(
+        collection_name="publications",
+        embedding_model="sentence-transformers/all-MiniLM-L6-v2",
+    )
+    if vector_db.collection.count() == 0:
+        print("Collection is empty; loading documents...")
+        vector_db.add_documents(list_publication_files())
+
+    questions = load_evaluation_questions(max_cases=max_cases)
+    query_embeddings = vector_db.embedding_model.encode(questions)
+
+    start = time.perf_counter()
+    exact_index = NumpyIndex.from_collection(vector_db.collection)
+    load_seconds = time.perf_counter() - start
+
+    runs: List[Dict[str, Any]] = [
+        benchmark_single("numpy_exact", exact_index, query_embeddings, k, repeat),
+        benchmark_single("chroma_hnsw", vector_db.collection, query_embeddings, k, repeat),
+        benchmark_batched("numpy_exact_batched", exact_index, query_embeddings, k, repeat),
+    ]
+
+    memory = {"numpy_exact": exact_index.matrix.nbytes}
+    for dtype in ("float16", "int8"):
+        # multiplier 1 shows the raw quantization error, the configured multiplier the rescored result
+        for multiplier in sorted({1, rescore_multiplier}):
+            name = f"quantized_{dtype}_rescore{multiplier}"
+            index = QuantizedIndex.from_collection(vector_db.collection, dtype=dtype, rescore_multiplier=multiplier)
+            runs.append(benchmark_single(name, index, query_embeddings, k, repeat))
+            memory[name] = index.memory_bytes()
+
+    reference_ids = runs[0]["ids"]
+    # Per-query recall and raw latency samples for the run registry (not part of the saved report)
+    registry = {
+        "quality": {
+            f"recall@{k}:{run['name']}": {
+                str(i): recall_at_k([ref], [cand]) for i, (ref, cand) in enumerate(zip(reference_ids, run["ids"]))
+            }
+            for run in runs
+        },
+        "latency_ms": {run["name"]: run["samples_ms"] for run in runs},
+    }
+    report = {
+        "corpus_chunks": exact_index.count(),
+        "questions": len(questions),
+        "k": k,
+        "repeat": repeat,
+        "numpy_load_ms": round(load_seconds * 1000, 2),
+        "backends": {
+            run["name"]: {
+                "latency": run["latency"],
+                f"recall@{k}": round(recall_at_k(reference_ids, run["ids"]), 4),
+                f"recall@{k}_delta": round(recall_at_k(reference_ids, run["ids"]) - 1.0, 4),
+                **({
+                    "index_bytes": memory[run["name"]],
+                    "index_bytes_saved_vs_float32": memory["numpy_exact"] - memory[run["name"]],
+                } if run["name"] in memory else {}),
+            }
+            for run in runs
+        },
+    }
+    return report, registry
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print the benchmark report as a table."""
+    k = report["k"]
+    print(f"\n{'='*72}")
+    print(f"Retrieval benchmark: {report['corpus_chunks']} chunks, {report['questions']} questions, k={k}")
+    print(f"{'='*72}")
+    print(f"{'backend':<30}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'recall':>8}{'idx MB':>8}")
+    for name, stats in report["backends"].items():
+        lat = stats["latency"]
+        mb = f"{stats['index_bytes'] / 1e6:>8.2f}" if "index_bytes" in stats else f"{'-':>8}"
+        print(
+            f"{name:<30}{lat['mean_ms']:>10.3f}{lat['p50_ms']:>10.3f}"
+            f"{lat['p95_ms']:>10.3f}{lat['p99_ms']:>10.3f}{stats[f'recall@{k}']:>8.3f}{mb}"
+        )
+    print("idx MB: the backend's own index (float32 matrix or search codes); the Chroma store is resident in every case")
+    print(f"{'='*72}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark Chroma HNSW vs exact and quantized NumPy retrieval")
+    parser.add_argument("--k", type=int, default=3, help="Number of results per query (default: 3)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes over the questions (default: 5)")
+    parser.add_argument("--max-cases", type=int, default=None, help="Limit the number of evaluation questions")
+    parser.add_argument("--rescore-multiplier", type=int, default=4, help="Quantized candidates rescored per result (default: 4)")
+    parser.add_argument("--no-register", action="store_true", help="Do not record this run in the run registry")
+    args = parser.parse_args()
+
+    report, registry = run_benchmark(
+        k=args.k, repeat=args.repeat, max_cases=args.max_cases, rescore_multiplier=args.rescore_multiplier
+    )
+    print_report(report)
+
+    results_path = Path(EVALUATION_RESULTS_DIR) / "benchmark_retrieval.json"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
+
+    if not args.no_register:
+        fingerprint = config_fingerprint(
+            n_results=args.k, rescore_multiplier=args.rescore_multiplier, corpus_chunks=report["corpus_chunks"]
+        )
+        record_run("benchmark_retrieval", fingerprint, registry["quality"], registry["latency_ms"], summary=report)
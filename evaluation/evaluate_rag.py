@@ -15,7 +15,6 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
-from deepeval import evaluate
 from deepeval.metrics import AnswerRelevancyMetric, ContextualRelevancyMetric, FaithfulnessMetric
 from deepeval.test_case import LLMTestCase, LLMTestCaseParams
 from deepeval.models import GPTModel, DeepEvalBaseLLM
@@ -25,8 +24,11 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app import RAGAssistant
-from utils.file_utils import load_all_publications
+from utils.file_utils import list_publication_files
 from utils.paths import EVALUATION_CASES_PATH, EVALUATION_RESULTS_DIR, OUTPUTS_DIR
+from evaluation.judge_cache import JudgeCache, judge_key
+from evaluation.judge_runner import JudgeRunner
+from evaluation.run_registry import config_fingerprint, record_evaluation_run
 
 # Load environment variables
 load_dotenv()
@@ -38,6 +40,13 @@ Path(EVALUATION_RESULTS_DIR).mkdir(parents=True, exist_ok=True)
 # Set to None to run all cases, or specify a number (e.g., 40) to limit
 MAX_EVALUATION_CASES = 40
 
+# Results retrieved per question when generating test cases
+EVALUATION_N_RESULTS = 3
+
+# Judge throughput: metric evaluations in flight and judge LLM calls per minute (per judge model)
+JUDGE_CONCURRENCY = 4
+JUDGE_REQUESTS_PER_MINUTE = 60
+
 
 class RAGEvaluator:
     """
@@ -52,7 +61,11 @@ class RAGEvaluator:
         max_evaluation_cases: Optional[int] = None,
         use_openai_for_eval: bool = True,
         evaluation_cases_path: Optional[Path] = None,
-        results_dir: Optional[Path] = None
+        results_dir: Optional[Path] = None,
+        use_judge_cache: bool = True,
+        judge_concurrency: int = JUDGE_CONCURRENCY,
+        judge_requests_per_minute: float = JUDGE_REQUESTS_PER_MINUTE,
+        register_runs: bool = True,
     ):
         """
         Initialize the RAG Evaluator.
@@ -62,6 +75,10 @@ class RAGEvaluator:
             use_openai_for_eval: Whether to use OpenAI for evaluation metrics (better JSON parsing)
             evaluation_cases_path: Path to evaluation cases JSON file (defaults to EVALUATION_CASES_PATH)
             results_dir: Directory for evaluation results (defaults to EVALUATION_RESULTS_DIR)
+            use_judge_cache: Reuse metric scores for unchanged (metric, judge, case) combinations
+            judge_concurrency: Metric evaluations run in parallel
+            judge_requests_per_minute: Rate limit on judge LLM calls, per judge model
+            register_runs: Record each run in the run registry (see evaluation/run_registry.py)
         """
         self.max_evaluation_cases = max_evaluation_cases if max_evaluation_cases is not None else MAX_EVALUATION_CASES
         self.use_openai_for_eval = use_openai_for_eval
@@ -73,6 +90,11 @@ class RAGEvaluator:
         
         # Cache path
         self.test_cases_cache_path = self.results_dir / "test_cases_cache.json"
+        self.results_path = self.results_dir / f"evaluation_results_{Path(__file__).stem}.json"
+        self.case_results_path = self.results_path.with_suffix(".jsonl")
+        self.register_runs = register_runs
+        self.judge_cache = JudgeCache(self.results_dir / "judge_cache.sqlite") if use_judge_cache else None
+        self.judge_runner = JudgeRunner(concurrency=judge_concurrency, requests_per_minute=judge_requests_per_minute)
         
         # Initialize assistant (lazy loading)
         self._assistant = None
@@ -83,7 +105,7 @@ class RAGEvaluator:
             print("\nInitializing RAG Assistant...")
             self._assistant = RAGAssistant()
             print("Loading documents...")
-            docs = load_all_publications()
+            docs = list_publication_files()
             self._assistant.add_documents(docs)
             print(f"Loaded {len(docs)} documents\n")
         return self._assistant
@@ -212,6 +234,8 @@ class RAGEvaluator:
         """
         assistant = self._get_assistant()
         test_cases = []
+        # Stored with each case so runs on cached cases are attributed to the config that produced them
+        fingerprint = config_fingerprint(n_results=EVALUATION_N_RESULTS)
         
         print(f"\n{'='*60}")
         print(f"Creating test cases from {len(evaluation_cases)} evaluation cases...")
@@ -224,13 +248,12 @@ class RAGEvaluator:
             
             print(f"[{i}/{len(evaluation_cases)}] Processing: {question[:60]}...")
             
-            # Get retrieval context and answer from RAG assistant
-            # We need to capture the retrieved context for evaluation
-            retrieved = assistant.vector_db.search(query=question, n_results=3)
-            retrieved_docs = retrieved.get("documents", [])
-            
-            # Get the answer
-            answer = assistant.invoke(question, n_results=3)
+            # Get retrieval context and answer from the same pipeline run
+            result = assistant.run(
+                question, n_results=EVALUATION_N_RESULTS, priority="batch", deadline_seconds=float("inf")
+            )
+            retrieved_docs = result.documents
+            answer = result.answer
             
             # Create test case - DeepEval LLMTestCase expects context as a list of strings
             # Store metadata separately and attach it to the test case object
@@ -245,8 +268,10 @@ class RAGEvaluator:
             # Attach metadata as an attribute (not a parameter)
             test_case.metadata = {
                 "case_id": case_id,
-                "retrieved_doc_ids": retrieved.get("ids", []),
-                "retrieval_distances": retrieved.get("distances", []),
+                "retrieved_doc_ids": result.doc_ids,
+                "retrieval_distances": result.distances,
+                "stage_timings": result.timings,
+                "config_fingerprint": fingerprint,
             }
             
             test_cases.append(test_case)
@@ -260,12 +285,18 @@ class RAGEvaluator:
         save_results: bool = True
     ) -> Dict[str, Any]:
         """
-        Run evaluation using DeepEval.
+        Run evaluation using DeepEval metrics on a rate-limited thread pool.
+
+        Scores already in the judge cache (same metric, threshold, judge model,
+        input, answer and context) are reused; only the remaining
+        (metric, case) pairs are sent to the judge. Each case is appended to a
+        JSONL results file as soon as all its metrics are in, and every judged
+        score is cached immediately, so an interrupted run resumes cheaply.
         
         Args:
             test_cases: List of LLMTestCase objects
             metrics: List of DeepEval metrics to use (default: AnswerRelevancy, ContextualRelevancy, Faithfulness)
-            save_results: Whether to save results to JSON file
+            save_results: Whether to save results (per-case JSONL plus a summary JSON)
             
         Returns:
             Dictionary containing evaluation results
@@ -294,59 +325,113 @@ class RAGEvaluator:
             ]
         
         print(f"\n{'='*60}")
-        print(f"Running evaluation with {len(metrics)} metrics on {len(test_cases)} test cases...")
+        print(f"Running evaluation with {len(metrics)} metrics on {len(test_cases)} test cases "
+              f"({self.judge_runner.concurrency} concurrent, {self.judge_runner.requests_per_minute:g} judge calls/min)...")
         print(f"{'='*60}\n")
-        
-        # Run evaluation with error handling for JSON parsing issues
-        try:
-            evaluate(test_cases, metrics=metrics)
-        except ValueError as e:
-            if "invalid JSON" in str(e) or "JSONDecodeError" in str(e):
-                print(f"\n⚠️  Warning: Evaluation encountered JSON parsing errors.")
-                print(f"   This may be due to the evaluation model returning invalid JSON.")
-                print(f"   Some metrics may not have been computed correctly.")
-                print(f"   Error: {str(e)[:200]}...\n")
-                # Continue processing - some metrics may still have been computed
+
+        results_path, cases_path = self.results_path, self.case_results_path
+        cases_file = open(cases_path, "w", encoding="utf-8") if save_results else None
+
+        # Running aggregates only; per-case results are dropped once written
+        stats = {m.__class__.__name__: {"n": 0, "sum": 0.0, "min": None, "max": None, "passed": 0} for m in metrics}
+        errors = {m.__class__.__name__: 0 for m in metrics}
+        open_cases: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        passed_cases = scored_cases = reused = judged = 0
+
+        def record(case_index: int, metric, result: Dict[str, Any]) -> None:
+            nonlocal passed_cases, scored_cases
+            name = metric.__class__.__name__
+            case_metrics = open_cases.setdefault(case_index, {})
+            case_metrics[name] = result
+            if result.get("score") is None:
+                errors[name] += 1
             else:
-                raise
+                score = result["score"]
+                s = stats[name]
+                s["n"] += 1
+                s["sum"] += score
+                s["min"] = score if s["min"] is None else min(s["min"], score)
+                s["max"] = score if s["max"] is None else max(s["max"], score)
+                s["passed"] += score >= metric.threshold
+            if len(case_metrics) < len(metrics):
+                return
+
+            # Case complete: a case passes when every scored metric passes; cases where
+            # every metric errored are left out of the pass rate
+            del open_cases[case_index]
+            scores = [(m.threshold, case_metrics[m.__class__.__name__].get("score")) for m in metrics]
+            scores = [(threshold, score) for threshold, score in scores if score is not None]
+            if scores:
+                scored_cases += 1
+                passed_cases += all(score >= threshold for threshold, score in scores)
+            if cases_file is not None:
+                tc = test_cases[case_index]
+                cases_file.write(json.dumps({
+                    "input": tc.input,
+                    "expected_output": tc.expected_output,
+                    "actual_output": tc.actual_output,
+                    "context": tc.context if tc.context else [],  # Convert None to empty list for JSON
+                    "metadata": getattr(tc, 'metadata', {}),
+                    "metrics": case_metrics,
+                }, ensure_ascii=False) + "\n")
+                cases_file.flush()
+
+        def pending_jobs():
+            nonlocal reused
+            for case_index, tc in enumerate(test_cases):
+                for metric in metrics:
+                    cached = self.judge_cache.get(judge_key(metric, tc)) if self.judge_cache else None
+                    if cached is not None:
+                        reused += 1
+                        record(case_index, metric, cached)
+                    else:
+                        yield (case_index, metric), metric, tc
+
+        try:
+            for (case_index, metric), result in self.judge_runner.run(pending_jobs()):
+                judged += 1
+                if self.judge_cache:
+                    self.judge_cache.put(judge_key(metric, test_cases[case_index]), metric, result)
+                if "error" in result:
+                    print(f"⚠️  {metric.__class__.__name__} failed on case {case_index + 1} "
+                          f"after {result['attempts']} attempts: {result['error'][:120]}")
+                record(case_index, metric, result)
+                done = reused + judged
+                if done % 10 == 0:
+                    print(f"[{done}/{len(test_cases) * len(metrics)}] scores ({reused} cached)")
+        finally:
+            if cases_file is not None:
+                cases_file.close()
         
         # Compile summary statistics
         summary = {
             "total_cases": len(test_cases),
             "metrics": {},
             "overall_scores": {},
+            "judge_cache": {
+                "reused_scores": reused,
+                "judged_scores": judged,
+                "reuse_rate": reused / (reused + judged) if reused + judged else None,
+            },
+            "judge_runner": {
+                "concurrency": self.judge_runner.concurrency,
+                "requests_per_minute": self.judge_runner.requests_per_minute,
+                "retries": self.judge_runner.retries,
+                "throttled_seconds": round(self.judge_runner.throttled_seconds, 2),
+            },
         }
         
-        # Extract scores from test cases after evaluation
         for metric in metrics:
             metric_name = metric.__class__.__name__
-            scores = []
-            failed_cases = 0
-            
-            for test_case in test_cases:
-                try:
-                    # DeepEval stores results in test_case.metrics or metric object
-                    if hasattr(test_case, 'metrics') and metric_name in test_case.metrics:
-                        metric_result = test_case.metrics[metric_name]
-                        score = metric_result.score if hasattr(metric_result, 'score') else metric_result
-                        if score is not None:
-                            scores.append(score)
-                    elif hasattr(metric, 'score') and metric.score is not None:
-                        # Some metrics store score directly
-                        scores.append(metric.score)
-                except (AttributeError, KeyError, TypeError) as e:
-                    # Skip cases where metric evaluation failed
-                    failed_cases += 1
-                    continue
-            
-            if scores:
+            s = stats[metric_name]
+            if s["n"]:
                 summary["metrics"][metric_name] = {
-                    "mean": sum(scores) / len(scores),
-                    "min": min(scores),
-                    "max": max(scores),
-                    "pass_rate": sum(1 for s in scores if s >= metric.threshold) / len(scores),
-                    "evaluated_cases": len(scores),
-                    "failed_cases": failed_cases,
+                    "mean": s["sum"] / s["n"],
+                    "min": s["min"],
+                    "max": s["max"],
+                    "pass_rate": s["passed"] / s["n"],
+                    "evaluated_cases": s["n"],
+                    "failed_cases": errors[metric_name],
                 }
             else:
                 summary["metrics"][metric_name] = {
@@ -355,60 +440,21 @@ class RAGEvaluator:
                     "max": None,
                     "pass_rate": None,
                     "evaluated_cases": 0,
-                    "failed_cases": failed_cases,
+                    "failed_cases": errors[metric_name],
                     "error": "No valid scores computed - likely due to JSON parsing errors"
                 }
         
-        # Calculate overall pass rate (all metrics must pass)
-        pass_counts = {}
-        for test_case in test_cases:
-            all_passed = True
-            for metric in metrics:
-                metric_name = metric.__class__.__name__
-                if hasattr(test_case, 'metrics') and metric_name in test_case.metrics:
-                    metric_result = test_case.metrics[metric_name]
-                    score = metric_result.score if hasattr(metric_result, 'score') else metric_result
-                    if score < metric.threshold:
-                        all_passed = False
-                        break
-            case_id = getattr(test_case, 'metadata', {}).get("case_id", "unknown")
-            pass_counts[case_id] = all_passed
-        
-        summary["overall_pass_rate"] = sum(pass_counts.values()) / len(pass_counts) if pass_counts else 0
+        summary["scored_cases"] = scored_cases
+        summary["overall_pass_rate"] = passed_cases / scored_cases if scored_cases else 0
         
         # Save results if requested
         if save_results:
-            results_path = self.results_dir / f"evaluation_results_{Path(__file__).stem}.json"
-            
-            # Prepare detailed results for saving
-            detailed_results = {
-                "summary": summary,
-                "test_cases": [
-                    {
-                        "input": tc.input,
-                        "expected_output": tc.expected_output,
-                        "actual_output": tc.actual_output,
-                        "context": tc.context if tc.context else [],  # Convert None to empty list for JSON
-                        "context_joined": "\n\n".join(tc.context) if tc.context else "",  # For readability
-                        "metadata": getattr(tc, 'metadata', {}),
-                        "metrics": {
-                            name: {
-                                "score": metric.score if hasattr(metric, 'score') else metric,
-                                "reason": getattr(metric, 'reason', None) if hasattr(metric, 'reason') else None,
-                                "threshold": getattr(metric, 'threshold', None) if hasattr(metric, 'threshold') else None,
-                            }
-                            for name, metric in (tc.metrics.items() if hasattr(tc, 'metrics') else {})
-                        }
-                    }
-                    for tc in test_cases
-                ]
-            }
-            
             with open(results_path, 'w', encoding='utf-8') as f:
-                json.dump(detailed_results, f, indent=2, ensure_ascii=False)
+                json.dump({"summary": summary, "test_cases_path": str(cases_path)}, f, indent=2, ensure_ascii=False)
             
             print(f"\n{'='*60}")
             print(f"Results saved to: {results_path}")
+            print(f"Per-case results: {cases_path}")
             print(f"{'='*60}\n")
         
         return summary
@@ -436,8 +482,16 @@ class RAGEvaluator:
             else:
                 print(f"  Error: {stats.get('error', 'No scores computed')}")
         
+        cache_stats = summary.get("judge_cache")
+        if cache_stats and cache_stats["reuse_rate"] is not None:
+            print(f"\nJudge cache: reused {cache_stats['reused_scores']} scores, "
+                  f"judged {cache_stats['judged_scores']} ({cache_stats['reuse_rate']:.1%} reused)")
+
         print(f"\n{'='*60}")
         print(f"Overall Pass Rate (All Metrics): {summary['overall_pass_rate']:.1%}")
+        unscored = summary["total_cases"] - summary.get("scored_cases", summary["total_cases"])
+        if unscored:
+            print(f"({unscored} cases had no successful metric and are excluded)")
         print(f"{'='*60}\n")
 
     def evaluate(
@@ -469,6 +523,7 @@ class RAGEvaluator:
         
         # Try to load cached test cases first
         test_cases = None
+        regenerated = False
         if not force_regenerate:
             # Try to load from cache (try max_cases-specific cache first, then general cache)
             test_cases = self.load_test_cases(max_cases=max_cases)
@@ -489,6 +544,7 @@ class RAGEvaluator:
             
             # Create test cases (assistant will be initialized lazily)
             test_cases = self.create_test_cases(evaluation_cases)
+            regenerated = True
             
             # Save test cases for future use
             print("\nSaving test cases to cache...")
@@ -499,6 +555,19 @@ class RAGEvaluator:
         
         # Run evaluation
         summary = self.run_evaluation(test_cases, save_results=True)
+
+        # Keep a history of runs so changes can be compared (python -m evaluation.run_registry compare)
+        if self.register_runs:
+            # Cached cases carry the answers and timings of the run that generated them: attribute the
+            # run to that config, and record latency only when the pipeline actually ran now
+            metadata = (getattr(test_cases[0], "metadata", None) or {}) if test_cases else {}
+            generated_with = metadata.get("config_fingerprint")
+            if regenerated or generated_with is None:
+                generated_with = config_fingerprint(n_results=EVALUATION_N_RESULTS)
+            fingerprint = {**generated_with, "cases": len(test_cases)}
+            record_evaluation_run(self.case_results_path, summary, fingerprint, include_latency=regenerated)
+            if not regenerated:
+                print("Recorded as quality-only (cached test cases; use --force-regenerate to re-time the pipeline)")
         
         # Print summary
         self.print_summary(summary)
@@ -506,19 +575,36 @@ class RAGEvaluator:
         return summary
 
 
-def main(force_regenerate: bool = False, max_cases: Optional[int] = None):
+def main(
+    force_regenerate: bool = False,
+    max_cases: Optional[int] = None,
+    use_judge_cache: bool = True,
+    concurrency: int = JUDGE_CONCURRENCY,
+    judge_rpm: float = JUDGE_REQUESTS_PER_MINUTE,
+    register: bool = True,
+):
     """
     Main function for command-line usage.
     
     Args:
         force_regenerate: If True, regenerate test cases even if cache exists
         max_cases: Maximum number of evaluation cases to run (None = use default from RAGEvaluator)
+        use_judge_cache: Reuse cached judge scores for unchanged cases
+        concurrency: Metric evaluations run in parallel
+        judge_rpm: Judge LLM calls allowed per minute
+        register: Record the run in the run registry
     """
     # Default max_cases from class default
     if max_cases is None:
         max_cases = MAX_EVALUATION_CASES
     
-    evaluator = RAGEvaluator(max_evaluation_cases=max_cases)
+    evaluator = RAGEvaluator(
+        max_evaluation_cases=max_cases,
+        use_judge_cache=use_judge_cache,
+        judge_concurrency=concurrency,
+        judge_requests_per_minute=judge_rpm,
+        register_runs=register,
+    )
     return evaluator.evaluate(force_regenerate=force_regenerate, max_cases=max_cases)
 
 
@@ -537,9 +623,38 @@ if __name__ == "__main__":
         default=None,
         help=f"Maximum number of evaluation cases to run (default: {MAX_EVALUATION_CASES} from config, or None for all)"
     )
+    parser.add_argument(
+        "--no-judge-cache",
+        action="store_true",
+        help="Re-judge every case instead of reusing cached metric scores"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=JUDGE_CONCURRENCY,
+        help=f"Metric evaluations run in parallel (default: {JUDGE_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--judge-rpm",
+        type=float,
+        default=JUDGE_REQUESTS_PER_MINUTE,
+        help=f"Judge LLM calls per minute, per judge model (default: {JUDGE_REQUESTS_PER_MINUTE})"
+    )
+    parser.add_argument(
+        "--no-register",
+        action="store_true",
+        help="Do not record this run in the run registry"
+    )
     args = parser.parse_args()
     
     # Use MAX_EVALUATION_CASES if --max-cases not provided
     max_cases = args.max_cases if args.max_cases is not None else MAX_EVALUATION_CASES
     
-    main(force_regenerate=args.force_regenerate, max_cases=max_cases)
+    main(
+        force_regenerate=args.force_regenerate,
+        max_cases=max_cases,
+        use_judge_cache=not args.no_judge_cache,
+        concurrency=args.concurrency,
+        judge_rpm=args.judge_rpm,
+        register=not args.no_register,
+    )
@@ -0,0 +1,116 @@
+"""
+Content-addressed cache for DeepEval judge results.
+
+A metric score depends only on the metric (class and threshold), the judge
+model and the test case content the metric reads. Results are stored in a
+local SQLite file keyed by a SHA-256 of exactly those fields, so re-running
+the evaluation only pays for judge calls on cases whose question, answer or
+retrieved context actually changed.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Bump when the key layout or the stored result shape changes
+CACHE_SCHEMA_VERSION = 1
+
+
+def judge_name(metric) -> str:
+    """Judge model a DeepEval metric scores with (DeepEval sets ``evaluation_model`` on init)."""
+    return str(getattr(metric, "evaluation_model", None) or "default")
+
+
+def judge_key(metric, test_case) -> str:
+    """
+    Cache key for one metric on one test case.
+
+    Args:
+        metric: DeepEval metric instance
+        test_case: LLMTestCase
+
+    Returns:
+        Hex SHA-256 of (metric, threshold, judge model, input, actual output, contexts)
+    """
+    payload = {
+        "schema": CACHE_SCHEMA_VERSION,
+        "metric": metric.__class__.__name__,
+        "threshold": getattr(metric, "threshold", None),
+        "judge": judge_name(metric),
+        "input": test_case.input,
+        "actual_output": test_case.actual_output,
+        "context": test_case.context,
+        "retrieval_context": getattr(test_case, "retrieval_context", None),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class JudgeCache:
+    """SQLite store of metric results keyed by judge_key()."""
+
+    def __init__(self, path: str | Path):
+        """
+        Args:
+            path: SQLite file (created if missing)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared across threads, serialized by a lock
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS judge_results ("
+                "key TEXT PRIMARY KEY, metric TEXT, judge TEXT, score REAL, reason TEXT, "
+                "threshold REAL, success INTEGER, created_at TEXT)"
+            )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for ``key`` ({"score", "reason", "threshold", "success"}) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT score, reason, threshold, success FROM judge_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        score, reason, threshold, success = row
+        return {"score": score, "reason": reason, "threshold": threshold, "success": bool(success), "cached": True}
+
+    def put(self, key: str, metric, result: Dict[str, Any]) -> None:
+        """
+        Store a judged result; results without a score are not cached so they are retried.
+
+        Args:
+            key: judge_key() of the metric and test case
+            metric: DeepEval metric that produced the result
+            result: {"score", "reason", "threshold", "success"}
+        """
+        if result.get("score") is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    metric.__class__.__name__,
+                    judge_name(metric),
+                    float(result["score"]),
+                    result.get("reason"),
+                    result.get("threshold"),
+                    int(bool(result.get("success"))),
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,162 @@
+"""
+Concurrent driver for DeepEval judge metrics.
+
+Each (metric, test case) pair is measured on a thread pool. Calls to the same
+judge model share a token-bucket rate limiter, failures are retried with
+exponential backoff and jitter, and results are yielded as they complete so
+callers can stream them to disk instead of holding the whole run in memory.
+"""
+
+import copy
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from evaluation.judge_cache import judge_name
+
+# Approximate judge LLM calls per measure(); each call takes one rate-limiter token
+METRIC_CALLS = {
+    "AnswerRelevancyMetric": 3,  # statements, verdicts, reason
+    "ContextualRelevancyMetric": 2,  # verdicts, reason
+    "FaithfulnessMetric": 4,  # truths, claims, verdicts, reason
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until ``tokens`` are available and take them.
+
+        Returns:
+            Seconds spent waiting
+        """
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class JudgeRunner:
+    """Rate-limited, retrying, concurrent metric evaluation."""
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        requests_per_minute: float = 60.0,
+        burst: Optional[float] = None,
+        max_retries: int = 4,
+        backoff_seconds: float = 2.0,
+        max_backoff_seconds: float = 60.0,
+    ):
+        """
+        Args:
+            concurrency: Metric evaluations in flight at once
+            requests_per_minute: Judge LLM calls allowed per minute, per judge model
+            burst: Bucket capacity (default: ``concurrency`` metrics' worth of calls)
+            max_retries: Retries per (metric, case) after the first failure
+            backoff_seconds: First retry delay; doubles per attempt (with jitter)
+            max_backoff_seconds: Upper bound on a single retry delay
+        """
+        self.concurrency = max(1, concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst or max(METRIC_CALLS.values()) * self.concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def _bucket(self, metric) -> TokenBucket:
+        judge = judge_name(metric)
+        with self._lock:
+            if judge not in self._buckets:
+                self._buckets[judge] = TokenBucket(self.requests_per_minute / 60.0, self.burst)
+            return self._buckets[judge]
+
+    def measure(self, metric, test_case) -> Dict[str, Any]:
+        """
+        Score one test case, retrying failures.
+
+        Args:
+            metric: DeepEval metric (copied, so the shared instance keeps no per-case state)
+            test_case: LLMTestCase
+
+        Returns:
+            {"score", "reason", "threshold", "success"}, or {"error", "attempts"} after the last retry
+        """
+        bucket = self._bucket(metric)
+        calls = METRIC_CALLS.get(metric.__class__.__name__, 1)
+        for attempt in range(self.max_retries + 1):
+            # Shallow copy: shares the judge model client, owns score/reason
+            instance = copy.copy(metric)
+            instance.async_mode = False  # concurrency comes from the thread pool
+            waited = bucket.acquire(calls)
+            with self._lock:
+                self.throttled_seconds += waited
+            try:
+                instance.measure(test_case)
+                return {
+                    "score": instance.score,
+                    "reason": getattr(instance, "reason", None),
+                    "threshold": instance.threshold,
+                    "success": instance.score is not None and instance.score >= instance.threshold,
+                }
+            except Exception as e:
+                if attempt == self.max_retries:
+                    return {"error": f"{type(e).__name__}: {str(e)[:300]}", "attempts": attempt + 1}
+                with self._lock:
+                    self.retries += 1
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        return {"error": "unreachable", "attempts": self.max_retries + 1}
+
+    def run(self, jobs: Iterable[Tuple[Any, Any, Any]]) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """
+        Measure jobs concurrently, yielding results in completion order.
+
+        At most ``2 * concurrency`` jobs are queued at a time, so memory stays
+        bounded for large suites.
+
+        Args:
+            jobs: (tag, metric, test_case) tuples; the tag is returned with the result
+
+        Yields:
+            (tag, result) as each evaluation finishes
+        """
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="judge") as pool:
+            in_flight = {}
+            while True:
+                while len(in_flight) < 2 * self.concurrency:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    tag, metric, test_case = job
+                    in_flight[pool.submit(self.measure, metric, test_case)] = tag
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
@@ -0,0 +1,330 @@
+"""
+Run registry and regression gate for evaluation and benchmark runs.
+
+Every evaluate_rag.py / benchmark_retrieval.py run is stored as one JSON file
+with its per-case quality scores, per-stage latency samples and a fingerprint
+of the configuration that produced it (embedding model, chunking,
+n_results, threshold, backend). ``compare`` bootstraps confidence intervals
+for the change in each quality mean (paired by case) and each latency
+percentile, flags the changes that are significant regressions and exits
+nonzero, so a deploy can be gated on it.
+
+Usage:
+    python -m evaluation.run_registry list
+    python -m evaluation.run_registry show latest
+    python -m evaluation.run_registry compare previous latest
+    python -m evaluation.run_registry compare <base_run_id> <candidate_run_id> --kind benchmark_retrieval
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.collection_versions import DEFAULT_ALIAS, DEFAULT_EMBEDDING_MODEL, resolve_alias
+from utils.file_utils import load_yaml_config
+from utils.paths import APP_CONFIG_FPATH, EVALUATION_RESULTS_DIR
+
+RUNS_DIR = Path(EVALUATION_RESULTS_DIR) / "runs"
+LATENCY_PERCENTILES = (50, 95)
+
+
+def config_fingerprint(n_results: Optional[int] = None, threshold: Optional[float] = None, **extra) -> Dict[str, Any]:
+    """
+    Settings that change retrieval quality or latency, as used by the assistant.
+
+    The promoted collection version (if any) wins over app_config.yaml, like in VectorDB.
+
+    Args:
+        n_results: Results per query used by the run
+        threshold: Distance threshold used by the run
+        **extra: Additional run settings to include
+
+    Returns:
+        Fingerprint dict (JSON-serializable)
+    """
+    try:
+        app_config = load_yaml_config(APP_CONFIG_FPATH)
+    except Exception:
+        app_config = {}
+    vectordb_config = app_config.get("vectordb", {})
+    version = resolve_alias(DEFAULT_ALIAS) or {}
+    return {
+        "collection": version.get("collection", DEFAULT_ALIAS),
+        "embedding_model": version.get("embedding_model", DEFAULT_EMBEDDING_MODEL),
+        "chunk_size": version.get("chunk_size", vectordb_config.get("chunk_size", 400)),
+        "chunk_overlap": version.get("chunk_overlap", vectordb_config.get("chunk_overlap", 100)),
+        "backend": vectordb_config.get("backend", "chroma"),
+        "n_results": n_results if n_results is not None else vectordb_config.get("n_results", 3),
+        "threshold": threshold if threshold is not None else vectordb_config.get("threshold", 0.5),
+        **extra,
+    }
+
+
+def fingerprint_hash(fingerprint: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def record_run(
+    kind: str,
+    fingerprint: Dict[str, Any],
+    quality: Dict[str, Dict[str, float]],
+    latency_ms: Dict[str, List[float]],
+    summary: Optional[Dict[str, Any]] = None,
+    runs_dir: str | Path = RUNS_DIR,
+) -> Path:
+    """
+    Store one run.
+
+    Args:
+        kind: Run type, e.g. "evaluate_rag" or "benchmark_retrieval" (runs are compared within a kind)
+        fingerprint: config_fingerprint() of the run
+        quality: Metric name -> {case id: score} (higher is better)
+        latency_ms: Stage name -> latency samples in milliseconds (lower is better)
+        summary: Optional run summary kept for reference
+        runs_dir: Registry directory
+
+    Returns:
+        Path of the stored run file
+    """
+    created_at = datetime.now(timezone.utc)
+    run_id = f"{created_at.strftime('%Y%m%dT%H%M%S%f')}_{kind}_{fingerprint_hash(fingerprint)}"
+    record = {
+        "run_id": run_id,
+        "kind": kind,
+        "created_at": created_at.isoformat(),
+        "fingerprint": fingerprint,
+        "fingerprint_hash": fingerprint_hash(fingerprint),
+        "quality": quality,
+        "latency_ms": latency_ms,
+        "summary": summary or {},
+    }
+    runs_dir = Path(runs_dir)
+    runs_dir.mkdir(parents=True, exist_ok=True)
+    path = runs_dir / f"{run_id}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2, ensure_ascii=False)
+    print(f"Run recorded: {run_id}")
+    return path
+
+
+def record_evaluation_run(
+    cases_path: str | Path,
+    summary: Dict[str, Any],
+    fingerprint: Dict[str, Any],
+    include_latency: bool = True,
+    runs_dir: str | Path = RUNS_DIR,
+) -> Path:
+    """
+    Register an evaluate_rag.py run from its per-case JSONL results.
+
+    Scores are keyed by case ID; stage latencies come from the "stage_timings"
+    the pipeline recorded when the test cases were generated. Pass
+    ``include_latency=False`` when the cases came from the cache (their timings
+    are from an earlier run); the run is then marked quality-only.
+    """
+    quality: Dict[str, Dict[str, float]] = {}
+    latency_ms: Dict[str, List[float]] = {}
+    with open(cases_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            metadata = case.get("metadata") or {}
+            case_id = str(metadata.get("case_id", line_number))
+            for metric_name, result in (case.get("metrics") or {}).items():
+                if result.get("score") is not None:
+                    quality.setdefault(metric_name, {})[case_id] = result["score"]
+            if include_latency:
+                for stage, seconds in (metadata.get("stage_timings") or {}).items():
+                    latency_ms.setdefault(stage, []).append(seconds * 1000)
+    summary = {**summary, "quality_only": not include_latency}
+    return record_run("evaluate_rag", fingerprint, quality, latency_ms, summary=summary, runs_dir=runs_dir)
+
+
+def list_runs(kind: Optional[str] = None, runs_dir: str | Path = RUNS_DIR) -> List[Dict[str, Any]]:
+    """Stored runs, oldest first (optionally of one kind)."""
+    runs = []
+    for path in sorted(Path(runs_dir).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            run = json.load(f)
+        if kind is None or run["kind"] == kind:
+            runs.append(run)
+    return sorted(runs, key=lambda r: r["created_at"])
+
+
+def load_run(ref: str, kind: Optional[str] = None, runs_dir: str | Path = RUNS_DIR) -> Dict[str, Any]:
+    """
+    Resolve a run by ID, "latest" or "previous" (the one before latest).
+
+    Raises:
+        ValueError: If no run matches
+    """
+    runs = list_runs(kind, runs_dir)
+    if ref in ("latest", "previous"):
+        offset = 1 if ref == "latest" else 2
+        if len(runs) < offset:
+            raise ValueError(f"Not enough {kind or ''} runs recorded to resolve '{ref}'")
+        return runs[-offset]
+    matches = [r for r in runs if r["run_id"] == ref or r["run_id"].startswith(ref)]
+    if len(matches) != 1:
+        raise ValueError(f"Run '{ref}' matched {len(matches)} runs")
+    return matches[0]
+
+
+def bootstrap_ci(statistic, samples: Sequence[np.ndarray], n_resamples: int, confidence: float, rng) -> tuple:
+    """
+    Percentile bootstrap CI of ``statistic(*resampled)``.
+
+    Each array in ``samples`` is resampled independently; pass a single array of
+    paired differences for a paired bootstrap.
+    """
+    estimates = np.empty(n_resamples)
+    for i in range(n_resamples):
+        resampled = [s[rng.integers(0, len(s), len(s))] for s in samples]
+        estimates[i] = statistic(*resampled)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(estimates, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def compare_runs(
+    base: Dict[str, Any],
+    candidate: Dict[str, Any],
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    min_quality_drop: float = 0.0,
+    min_latency_increase: float = 0.05,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Compare a candidate run to a base run.
+
+    A quality metric regresses when the whole CI of (candidate - base) mean
+    score, paired by case, lies below ``-min_quality_drop``. A latency
+    percentile regresses when the whole CI of its increase lies above zero and
+    the point estimate is more than ``min_latency_increase`` (relative).
+
+    Returns:
+        One row per compared quantity with deltas, CI and a "regression" flag
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    for metric in sorted(set(base["quality"]) & set(candidate["quality"])):
+        base_scores, cand_scores = base["quality"][metric], candidate["quality"][metric]
+        shared = sorted(set(base_scores) & set(cand_scores))
+        if len(shared) < 2:
+            continue
+        diffs = np.array([cand_scores[c] - base_scores[c] for c in shared])
+        low, high = bootstrap_ci(np.mean, [diffs], n_resamples, confidence, rng)
+        rows.append({
+            "name": f"quality:{metric}",
+            "base": float(np.mean([base_scores[c] for c in shared])),
+            "candidate": float(np.mean([cand_scores[c] for c in shared])),
+            "delta": float(diffs.mean()),
+            "ci": (low, high),
+            "n": len(shared),
+            "regression": high < -min_quality_drop,
+        })
+
+    for stage in sorted(set(base["latency_ms"]) & set(candidate["latency_ms"])):
+        base_ms = np.asarray(base["latency_ms"][stage], dtype=np.float64)
+        cand_ms = np.asarray(candidate["latency_ms"][stage], dtype=np.float64)
+        if len(base_ms) < 2 or len(cand_ms) < 2:
+            continue
+        for q in LATENCY_PERCENTILES:
+            base_value, cand_value = np.percentile(base_ms, q), np.percentile(cand_ms, q)
+            low, high = bootstrap_ci(
+                lambda b, c: np.percentile(c, q) - np.percentile(b, q), [base_ms, cand_ms], n_resamples, confidence, rng
+            )
+            relative = (cand_value - base_value) / base_value if base_value > 0 else 0.0
+            rows.append({
+                "name": f"latency:{stage}:p{q}",
+                "base": float(base_value),
+                "candidate": float(cand_value),
+                "delta": float(cand_value - base_value),
+                "ci": (low, high),
+                "n": min(len(base_ms), len(cand_ms)),
+                "regression": low > 0 and relative > min_latency_increase,
+            })
+    return rows
+
+
+def print_comparison(base: Dict[str, Any], candidate: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> None:
+    print(f"\n{'='*96}")
+    print(f"Base:      {base['run_id']}")
+    print(f"Candidate: {candidate['run_id']}")
+    if base["fingerprint_hash"] != candidate["fingerprint_hash"]:
+        changed = {
+            key: (base["fingerprint"].get(key), candidate["fingerprint"].get(key))
+            for key in set(base["fingerprint"]) | set(candidate["fingerprint"])
+            if base["fingerprint"].get(key) != candidate["fingerprint"].get(key)
+        }
+        print(f"Config changed: {changed}")
+    for label, run in (("Base", base), ("Candidate", candidate)):
+        if run.get("summary", {}).get("quality_only"):
+            print(f"{label} run is quality-only (cached test cases): latency not compared")
+    print(f"{'='*96}")
+    print(f"{'quantity':<40}{'base':>10}{'candidate':>11}{'delta':>10}{'CI low':>10}{'CI high':>10}  verdict")
+    for row in rows:
+        low, high = row["ci"]
+        verdict = "REGRESSION" if row["regression"] else "ok"
+        print(f"{row['name']:<40}{row['base']:>10.3f}{row['candidate']:>11.3f}{row['delta']:>10.3f}"
+              f"{low:>10.3f}{high:>10.3f}  {verdict}")
+    print(f"{'='*96}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluation/benchmark run registry and regression gate")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("list", help="List recorded runs")
+    p_list.add_argument("--kind", default=None, help="Only runs of this kind (evaluate_rag, benchmark_retrieval)")
+
+    p_show = sub.add_parser("show", help="Print one run's fingerprint and summary")
+    p_show.add_argument("run", help="Run ID (prefix), 'latest' or 'previous'")
+    p_show.add_argument("--kind", default="evaluate_rag")
+
+    p_compare = sub.add_parser("compare", help="Flag significant regressions of candidate vs base (exit 1 if any)")
+    p_compare.add_argument("base", help="Run ID (prefix), 'latest' or 'previous'")
+    p_compare.add_argument("candidate", help="Run ID (prefix), 'latest' or 'previous'")
+    p_compare.add_argument("--kind", default="evaluate_rag", help="Run kind to resolve latest/previous within")
+    p_compare.add_argument("--resamples", type=int, default=2000, help="Bootstrap resamples (default: 2000)")
+    p_compare.add_argument("--confidence", type=float, default=0.95, help="CI level (default: 0.95)")
+    p_compare.add_argument("--min-quality-drop", type=float, default=0.0,
+                           help="Ignore quality drops smaller than this (absolute score, default: 0)")
+    p_compare.add_argument("--min-latency-increase", type=float, default=0.05,
+                           help="Ignore latency increases below this fraction (default: 0.05)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for run in list_runs(args.kind):
+            fp = run["fingerprint"]
+            print(f"{run['run_id']}  {run['kind']:<20} model={fp.get('embedding_model')} chunk={fp.get('chunk_size')} "
+                  f"k={fp.get('n_results')} threshold={fp.get('threshold')}")
+    elif args.command == "show":
+        run = load_run(args.run, args.kind)
+        print(json.dumps({k: run[k] for k in ("run_id", "kind", "created_at", "fingerprint", "summary")}, indent=2))
+    else:
+        base_run = load_run(args.base, args.kind)
+        candidate_run = load_run(args.candidate, args.kind)
+        comparison = compare_runs(
+            base_run,
+            candidate_run,
+            n_resamples=args.resamples,
+            confidence=args.confidence,
+            min_quality_drop=args.min_quality_drop,
+            min_latency_increase=args.min_latency_increase,
+        )
+        print_comparison(base_run, candidate_run, comparison)
+        regressions = [row["name"] for row in comparison if row["regression"]]
+        if regressions:
+            print(f"{len(regressions)} significant regression(s): {', '.join(regressions)}")
+            raise SystemExit(1)
+        print("No significant regressions")
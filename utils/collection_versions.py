@@ -0,0 +1,406 @@
+"""
+Blue/green versioning for ChromaDB collections.
+
+Each build goes into a new collection named after the embedding model, the
+chunker settings and a hash of the corpus. Readers address an alias (e.g.
+"publications"); a small JSON file maps each alias to its current and previous
+version and is replaced atomically, so switching versions never mutates a
+collection that is serving traffic. Running VectorDB instances pick up a
+promotion on their next alias check.
+
+Usage:
+    python -m utils.collection_versions build --model sentence-transformers/all-MiniLM-L6-v2 --chunk-size 400
+    python -m utils.collection_versions validate <version>
+    python -m utils.collection_versions promote <version>
+    python -m utils.collection_versions rollback
+    python -m utils.collection_versions gc
+    python -m utils.collection_versions list
+"""
+
+import os
+
+# Disable ChromaDB telemetry BEFORE importing chromadb
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from utils.file_utils import file_content_hash
+from utils.paths import COLLECTION_ALIASES_FPATH, DATA_DIR, DOCUMENT_DIR
+
+DEFAULT_ALIAS = "publications"
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_COLLECTION_NAME = 63  # ChromaDB limit
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def corpus_hash(document_dir: str | Path = DOCUMENT_DIR) -> str:
+    """sha256 over the names and bytes of every file in the corpus directory."""
+    digest = hashlib.sha256()
+    root = Path(document_dir)
+    if root.exists():
+        for path in sorted(p for p in root.iterdir() if p.is_file()):
+            digest.update(path.name.encode("utf-8"))
+            digest.update(file_content_hash(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def version_name(alias: str, embedding_model: str, chunk_size: int, chunk_overlap: int, corpus_digest: str) -> str:
+    """
+    Collection name for one build, e.g. ``publications-all-minilm-l6-v2-c400-o100-3f2a9c1b``.
+
+    Args:
+        alias: Alias the version belongs to
+        embedding_model: Embedding model name
+        chunk_size: Chunker size in characters
+        chunk_overlap: Chunker overlap in characters
+        corpus_digest: Output of corpus_hash()
+    """
+    model_slug = re.sub(r"[^a-z0-9]+", "-", embedding_model.split("/")[-1].lower()).strip("-")
+    suffix = f"-c{chunk_size}-o{chunk_overlap}-{corpus_digest[:8]}"
+    head = f"{alias}-{model_slug}"[:MAX_COLLECTION_NAME - len(suffix)].rstrip("-")
+    return head + suffix
+
+
+def read_aliases(path: str | Path = COLLECTION_ALIASES_FPATH) -> Dict[str, Any]:
+    """Load the alias file ({"aliases": {...}, "versions": {...}}); empty if missing."""
+    path = Path(path)
+    if not path.exists():
+        return {"aliases": {}, "versions": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    state.setdefault("aliases", {})
+    state.setdefault("versions", {})
+    return state
+
+
+def write_aliases(state: Dict[str, Any], path: str | Path = COLLECTION_ALIASES_FPATH) -> None:
+    """Write the alias file atomically (temp file + os.replace)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def aliases_mtime(path: str | Path = COLLECTION_ALIASES_FPATH) -> Optional[float]:
+    """Modification time of the alias file (None if it does not exist)."""
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def resolve_alias(alias: str, path: str | Path = COLLECTION_ALIASES_FPATH) -> Optional[Dict[str, Any]]:
+    """
+    Current version of ``alias``.
+
+    Returns:
+        The version's build settings plus "collection" (its collection name),
+        or None if the alias has never been promoted
+    """
+    state = read_aliases(path)
+    entry = state["aliases"].get(alias)
+    if not entry or not entry.get("current"):
+        return None
+    return {"collection": entry["current"], **state["versions"].get(entry["current"], {})}
+
+
+def _client():
+    import chromadb
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return chromadb.PersistentClient(path=DATA_DIR)
+
+
+def build_version(
+    alias: str = DEFAULT_ALIAS,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    chunk_size: int = 400,
+    chunk_overlap: int = 100,
+    document_dir: str | Path = DOCUMENT_DIR,
+) -> str:
+    """
+    Build a new collection version from the corpus without touching the live one.
+
+    Args:
+        alias: Alias the version is built for
+        embedding_model: Embedding model name
+        chunk_size: Chunker size in characters
+        chunk_overlap: Chunker overlap in characters
+        document_dir: Corpus directory
+
+    Returns:
+        The new version's collection name
+    """
+    from utils.file_utils import list_publication_files
+    from utils.vectordb import VectorDB
+
+    digest = corpus_hash(document_dir)
+    name = version_name(alias, embedding_model, chunk_size, chunk_overlap, digest)
+    state = read_aliases()
+    if name in state["versions"] and state["versions"][name].get("chunks"):
+        print(f"Version {name} already built ({state['versions'][name]['chunks']} chunks)")
+        return name
+
+    print(f"Building version {name}...")
+    vector_db = VectorDB(
+        collection_name=name,
+        embedding_model=embedding_model,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    vector_db.add_documents(list_publication_files(document_dir))
+
+    state = read_aliases()
+    state["versions"][name] = {
+        "alias": alias,
+        "embedding_model": embedding_model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "corpus_hash": digest,
+        "chunks": vector_db.collection.count(),
+        "created_at": _now(),
+        "validation": None,
+    }
+    write_aliases(state)
+    print(f"Built {name} ({state['versions'][name]['chunks']} chunks)")
+    return name
+
+
+def evaluate_collection(collection, embedding_model: str, cases: List[Dict[str, str]], k: int) -> Dict[str, Any]:
+    """
+    Offline retrieval benchmark for one collection.
+
+    Reports HNSW recall@k against exact search on the same vectors (index
+    health), mean answer coverage of the retrieved chunks (retrieval quality,
+    comparable across models/chunkers) and query latency.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    from utils.retrieval_eval import answer_coverage, latency_summary, recall_at_k, time_calls
+    from utils.vector_backends import NumpyIndex
+
+    model = SentenceTransformer(embedding_model)
+    query_embeddings = model.encode([case["Question"] for case in cases])
+    latencies, outputs = time_calls(
+        lambda q: collection.query(query_embeddings=[q], n_results=k, include=["documents", "distances"]),
+        list(query_embeddings),
+    )
+    exact = NumpyIndex.from_collection(collection).query(query_embeddings=query_embeddings, n_results=k)
+    coverage = [
+        answer_coverage(case["Answer"], out["documents"][0])
+        for case, out in zip(cases, outputs)
+    ]
+    return {
+        "chunks": collection.count(),
+        f"hnsw_recall@{k}": round(recall_at_k(exact["ids"], [out["ids"][0] for out in outputs]), 4),
+        "answer_coverage": round(sum(coverage) / len(coverage), 4) if coverage else 0.0,
+        "latency": latency_summary(latencies),
+    }
+
+
+def validate_version(
+    name: str,
+    alias: str = DEFAULT_ALIAS,
+    k: int = 3,
+    max_cases: Optional[int] = None,
+    min_recall: float = 0.9,
+    max_regression: float = 0.02,
+) -> Dict[str, Any]:
+    """
+    Benchmark a built version against the alias's current version and record the verdict.
+
+    The candidate passes if its HNSW recall@k is at least ``min_recall`` and its
+    answer coverage is no more than ``max_regression`` below the current version.
+
+    Returns:
+        Validation report (also stored in the alias file)
+    """
+    from utils.retrieval_eval import load_evaluation_cases
+
+    state = read_aliases()
+    if name not in state["versions"]:
+        raise ValueError(f"Unknown version: {name}")
+    cases = load_evaluation_cases(max_cases=max_cases)
+    client = _client()
+
+    candidate = evaluate_collection(client.get_collection(name), state["versions"][name]["embedding_model"], cases, k)
+    report = {"k": k, "questions": len(cases), "candidate": candidate, "baseline": None, "validated_at": _now()}
+
+    current = resolve_alias(alias)
+    if current and current["collection"] != name:
+        report["baseline"] = {
+            "collection": current["collection"],
+            **evaluate_collection(
+                client.get_collection(current["collection"]),
+                current.get("embedding_model", DEFAULT_EMBEDDING_MODEL),
+                cases,
+                k,
+            ),
+        }
+
+    failures = []
+    if candidate[f"hnsw_recall@{k}"] < min_recall:
+        failures.append(f"hnsw_recall@{k} {candidate[f'hnsw_recall@{k}']} < {min_recall}")
+    if report["baseline"] and candidate["answer_coverage"] < report["baseline"]["answer_coverage"] - max_regression:
+        failures.append(
+            f"answer_coverage {candidate['answer_coverage']} regressed from {report['baseline']['answer_coverage']}"
+        )
+    report["passed"] = not failures
+    report["failures"] = failures
+
+    state = read_aliases()
+    state["versions"][name]["validation"] = report
+    write_aliases(state)
+    return report
+
+
+def promote(name: str, alias: str = DEFAULT_ALIAS, force: bool = False) -> None:
+    """Point ``alias`` at ``name``; the old current version becomes the rollback target."""
+    state = read_aliases()
+    version = state["versions"].get(name)
+    if version is None:
+        raise ValueError(f"Unknown version: {name}")
+    if not force and not (version.get("validation") or {}).get("passed"):
+        raise ValueError(f"Version {name} has not passed validation (run validate, or promote with --force)")
+
+    entry = state["aliases"].get(alias, {})
+    if entry.get("current") == name:
+        print(f"'{alias}' already points to {name}")
+        return
+    state["aliases"][alias] = {"current": name, "previous": entry.get("current"), "updated_at": _now()}
+    version.setdefault("promoted_at", _now())
+    write_aliases(state)
+    print(f"'{alias}' -> {name} (previous: {entry.get('current')})")
+
+
+def rollback(alias: str = DEFAULT_ALIAS) -> None:
+    """Swap the alias back to its previous version."""
+    state = read_aliases()
+    entry = state["aliases"].get(alias)
+    if not entry or not entry.get("previous"):
+        raise ValueError(f"No previous version to roll back to for '{alias}'")
+    state["aliases"][alias] = {"current": entry["previous"], "previous": entry["current"], "updated_at": _now()}
+    write_aliases(state)
+    print(f"'{alias}' rolled back to {entry['previous']}")
+
+
+def gc(alias: str = DEFAULT_ALIAS, dry_run: bool = False, include_unpromoted: bool = False) -> List[str]:
+    """
+    Delete superseded versions of ``alias``, keeping the current and previous one.
+
+    A version is superseded once it has been promoted and replaced, or if it was
+    built before the current version. Candidates built after the current version
+    and never promoted (awaiting validate/promote) are kept unless
+    ``include_unpromoted`` is set.
+
+    Returns:
+        Names of the deleted (or, with dry_run, deletable) collections
+    """
+    state = read_aliases()
+    entry = state["aliases"].get(alias, {})
+    keep = {entry.get("current"), entry.get("previous")}
+    current_created = (state["versions"].get(entry.get("current")) or {}).get("created_at", "")
+
+    def superseded(version: Dict[str, Any]) -> bool:
+        return include_unpromoted or bool(version.get("promoted_at")) or version.get("created_at", "") < current_created
+
+    stale = [
+        name for name, v in state["versions"].items()
+        if v.get("alias") == alias and name not in keep and superseded(v)
+    ]
+    if dry_run or not stale:
+        return stale
+
+    client = _client()
+    for name in stale:
+        try:
+            client.delete_collection(name)
+        except Exception as e:  # already gone
+            print(f"[warn] Could not delete {name}: {e}")
+        del state["versions"][name]
+    write_aliases(state)
+    return stale
+
+
+def print_versions(alias: str = DEFAULT_ALIAS) -> None:
+    """Print the versions of ``alias`` and which one is live."""
+    state = read_aliases()
+    entry = state["aliases"].get(alias, {})
+    print(f"Alias '{alias}': current={entry.get('current')} previous={entry.get('previous')}")
+    for name, version in sorted(state["versions"].items(), key=lambda kv: kv[1].get("created_at", "")):
+        if version.get("alias") != alias:
+            continue
+        marker = "*" if name == entry.get("current") else " "
+        validation = version.get("validation") or {}
+        verdict = "passed" if validation.get("passed") else ("failed" if validation else "not validated")
+        print(f" {marker} {name}  chunks={version.get('chunks')}  {verdict}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build, validate and switch versioned ChromaDB collections")
+    parser.add_argument("--alias", default=DEFAULT_ALIAS, help="Collection alias (default: publications)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = sub.add_parser("build", help="Build a new version from documents/")
+    build_parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Embedding model")
+    build_parser.add_argument("--chunk-size", type=int, default=400)
+    build_parser.add_argument("--chunk-overlap", type=int, default=100)
+    build_parser.add_argument("--validate", action="store_true", help="Validate after building")
+    build_parser.add_argument("--promote", action="store_true", help="Promote if validation passes")
+
+    validate_parser = sub.add_parser("validate", help="Benchmark a version against the current one")
+    validate_parser.add_argument("version")
+    validate_parser.add_argument("--k", type=int, default=3)
+    validate_parser.add_argument("--max-cases", type=int, default=None)
+    validate_parser.add_argument("--min-recall", type=float, default=0.9)
+    validate_parser.add_argument("--max-regression", type=float, default=0.02)
+
+    promote_parser = sub.add_parser("promote", help="Point the alias at a version")
+    promote_parser.add_argument("version")
+    promote_parser.add_argument("--force", action="store_true", help="Skip the validation check")
+
+    sub.add_parser("rollback", help="Point the alias back at the previous version")
+    gc_parser = sub.add_parser("gc", help="Delete superseded versions (keeps current, previous and new candidates)")
+    gc_parser.add_argument("--dry-run", action="store_true")
+    gc_parser.add_argument("--include-unpromoted", action="store_true",
+                           help="Also delete candidates built after the current version that were never promoted")
+    sub.add_parser("list", help="List versions")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        name = build_version(args.alias, args.model, args.chunk_size, args.chunk_overlap)
+        if args.validate or args.promote:
+            report = validate_version(name, alias=args.alias)
+            print(json.dumps(report, indent=2))
+            if args.promote and report["passed"]:
+                promote(name, alias=args.alias)
+    elif args.command == "validate":
+        report = validate_version(
+            args.version, alias=args.alias, k=args.k, max_cases=args.max_cases,
+            min_recall=args.min_recall, max_regression=args.max_regression,
+        )
+        print(json.dumps(report, indent=2))
+        raise SystemExit(0 if report["passed"] else 1)
+    elif args.command == "promote":
+        promote(args.version, alias=args.alias, force=args.force)
+    elif args.command == "rollback":
+        rollback(args.alias)
+    elif args.command == "gc":
+        removed = gc(args.alias, dry_run=args.dry_run, include_unpromoted=args.include_unpromoted)
+        print(("Would delete: " if args.dry_run else "Deleted: ") + (", ".join(removed) or "nothing"))
+    else:
+        print_versions(args.alias)
@@ -0,0 +1,204 @@
+# corpus_watcher.py
+"""
+Watches the documents directory and re-indexes changed files in the background.
+
+File events come from ``watchdog`` (inotify on Linux) when it is installed and
+from periodic directory scans otherwise. Events are debounced per file; a
+single worker thread then parses, embeds and swaps each changed file into the
+live collection via ``VectorDB.replace_document``, which holds the write lock
+only for the delete/add, so searches never see a half-written document.
+Unchanged files (same content hash as the indexed chunks) are skipped, so a
+restart does not re-embed the corpus.
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from utils.file_utils import SUPPORTED_EXTS, file_content_hash
+from utils.metrics import REGISTRY, stage_timer
+from utils.paths import DOCUMENT_DIR
+
+QUEUE_DEPTH = REGISTRY.gauge("rag_reindex_queue_depth", "Changed files waiting to be re-indexed")
+REINDEX_LAG = REGISTRY.gauge("rag_reindex_lag_seconds", "Seconds from the last file change to its swap into the collection")
+REINDEXED_FILES = REGISTRY.counter("rag_reindexed_files_total", "Files re-indexed by the corpus watcher")
+REINDEX_FAILURES = REGISTRY.counter("rag_reindex_failures_total", "Files the corpus watcher failed to re-index")
+
+
+class CorpusWatcher:
+    """Debounced background re-indexer for a documents directory."""
+
+    def __init__(
+        self,
+        vector_db,
+        document_dir: str | Path = DOCUMENT_DIR,
+        debounce_seconds: float = 1.0,
+        poll_interval_seconds: float = 2.0,
+        use_inotify: bool = True,
+    ):
+        """
+        Args:
+            vector_db: Writable VectorDB to keep in sync
+            document_dir: Directory to watch (non-recursive, like load_all_publications)
+            debounce_seconds: Quiet period after the last event before a file is re-indexed
+            poll_interval_seconds: Scan interval when inotify/watchdog is unavailable
+            use_inotify: Prefer watchdog's native observer when installed
+        """
+        if vector_db.read_only:
+            raise RuntimeError(f"Cannot watch the corpus: the '{vector_db.backend}' backend is read-only")
+        self.vector_db = vector_db
+        self.document_dir = Path(document_dir)
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.use_inotify = use_inotify
+
+        # source -> (first event time, last event time); coalesces bursts of events per file
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+        self._snapshot: Dict[str, Tuple[float, int]] = {}
+
+    def _source(self, path: Path) -> str:
+        return path.name
+
+    def _watched(self, path: Path) -> bool:
+        return path.parent == self.document_dir and path.suffix.lower() in SUPPORTED_EXTS
+
+    def notify(self, path: str | Path) -> None:
+        """Record a change to ``path``; it is re-indexed once events stop for ``debounce_seconds``."""
+        path = Path(path)
+        if not self._watched(path):
+            return
+        now = time.monotonic()
+        with self._pending_lock:
+            first, _ = self._pending.get(self._source(path), (now, now))
+            self._pending[self._source(path)] = (first, now)
+            QUEUE_DEPTH.set(len(self._pending))
+        self._wakeup.set()
+
+    def start(self) -> "CorpusWatcher":
+        """Queue every existing file for a (hash-checked) sync and start watching."""
+        self.document_dir.mkdir(parents=True, exist_ok=True)
+        self._snapshot = self._scan()
+        for source in self._snapshot:
+            self.notify(self.document_dir / source)
+
+        if not (self.use_inotify and self._start_observer()):
+            self._spawn(self._poll_loop, "corpus-poller")
+            print(f"Watching {self.document_dir} by polling every {self.poll_interval_seconds}s")
+        self._spawn(self._worker_loop, "corpus-reindexer")
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Stop the observer and worker threads."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _spawn(self, target, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _start_observer(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print("watchdog not installed; falling back to polling (pip install watchdog)")
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                watcher.notify(event.src_path)
+                if getattr(event, "dest_path", None):
+                    watcher.notify(event.dest_path)
+
+        self._observer = Observer()
+        self._observer.schedule(_Handler(), str(self.document_dir), recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+        print(f"Watching {self.document_dir} with {type(self._observer).__name__}")
+        return True
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        snapshot = {}
+        for path in self.document_dir.iterdir():
+            if path.is_file() and self._watched(path):
+                stat = path.stat()
+                snapshot[self._source(path)] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval_seconds):
+            try:
+                current = self._scan()
+            except OSError as e:
+                print(f"[warn] Corpus scan failed: {e}")
+                continue
+            for source in set(current) | set(self._snapshot):
+                if current.get(source) != self._snapshot.get(source):
+                    self.notify(self.document_dir / source)
+            self._snapshot = current
+
+    def _due(self) -> Tuple[Optional[str], float, float]:
+        """Pop the next file whose debounce window has passed; also return seconds until the next one is due."""
+        now = time.monotonic()
+        with self._pending_lock:
+            wait = self.debounce_seconds
+            for source, (first, last) in self._pending.items():
+                remaining = last + self.debounce_seconds - now
+                if remaining <= 0:
+                    del self._pending[source]
+                    QUEUE_DEPTH.set(len(self._pending))
+                    return source, first, 0.0
+                wait = min(wait, remaining)
+        return None, 0.0, wait
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            source, first_event, wait = self._due()
+            if source is None:
+                self._wakeup.wait(wait if self._pending else None)
+                self._wakeup.clear()
+                continue
+            self.reindex(source, first_event)
+
+    def reindex(self, source: str, first_event: Optional[float] = None) -> None:
+        """
+        Parse, embed and swap one file into the collection (or remove it if deleted).
+
+        Args:
+            source: File name relative to the watched directory
+            first_event: Monotonic time of the first change, for the lag metric
+        """
+        path = self.document_dir / source
+        try:
+            with stage_timer("reindex"):
+                if not path.exists():
+                    self.vector_db.replace_document(source)
+                    print(f"Removed {source} from the index")
+                else:
+                    digest = file_content_hash(path)
+                    if self.vector_db.indexed_hash(source) == digest:
+                        return
+                    n_chunks = self.vector_db.replace_document(source, content_hash=digest, path=path)
+                    print(f"Re-indexed {source} ({n_chunks} chunks)")
+            REINDEXED_FILES.inc()
+            if first_event is not None:
+                REINDEX_LAG.set(time.monotonic() - first_event)
+        except Exception as e:
+            REINDEX_FAILURES.inc()
+            print(f"[warn] Failed to re-index {source}: {e}")
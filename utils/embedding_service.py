@@ -0,0 +1,354 @@
+"""
+Shared embedding server for multi-worker deployments.
+
+One process owns the embedding model and serves ``encode`` requests over a
+Unix socket. Requests from all connected workers are collected for up to
+``max_wait_ms`` (or until ``max_batch_size`` texts are queued) and encoded in a
+single model call, so concurrent searches share one batched forward pass
+instead of each worker running its own single-query encode. Workers keep only
+a small client (no torch, no model weights), which lowers per-worker RSS.
+
+Wire format: every message is a 4-byte big-endian header length, a JSON
+header and an optional binary payload of ``header["nbytes"]`` bytes (float32
+embeddings in responses).
+
+Usage:
+    python -m utils.embedding_service serve --model sentence-transformers/all-MiniLM-L6-v2
+    python -m utils.embedding_service ping
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+from utils.paths import EMBEDDING_SOCKET_PATH
+
+HEADER = struct.Struct(">I")
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+BATCH_TEXTS = REGISTRY.histogram("rag_embedding_batch_texts", "Texts per batched encode call", buckets=BATCH_SIZE_BUCKETS)
+BATCH_REQUESTS = REGISTRY.histogram(
+    "rag_embedding_batch_requests", "Client requests merged into one encode call", buckets=BATCH_SIZE_BUCKETS
+)
+QUEUE_SECONDS = REGISTRY.histogram("rag_embedding_queue_seconds", "Time a request waited for its batch to start")
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    chunks, remaining = [], n
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding service connection closed")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock: socket.socket, header: Dict[str, Any], payload: bytes = b"") -> None:
+    """Write one framed message."""
+    body = json.dumps({**header, "nbytes": len(payload)}).encode("utf-8")
+    sock.sendall(HEADER.pack(len(body)) + body + payload)
+
+
+def recv_message(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    """Read one framed message (raises ConnectionError on EOF)."""
+    (length,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    header = json.loads(_recv_exact(sock, length))
+    payload = _recv_exact(sock, header["nbytes"]) if header.get("nbytes") else b""
+    return header, payload
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _Request:
+    __slots__ = ("texts", "enqueued", "done", "result", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+
+
+class EmbeddingServer:
+    """Owns one embedding model and batches encode requests from every client."""
+
+    def __init__(
+        self,
+        model,
+        model_name: str,
+        socket_path: str = EMBEDDING_SOCKET_PATH,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        Args:
+            model: Loaded SentenceTransformer (anything with ``encode(list[str]) -> array``)
+            model_name: Model name reported to clients, which refuse to use a different model
+            socket_path: Unix socket to listen on
+            max_batch_size: Texts per encode call; a batch starts as soon as this many are queued
+            max_wait_ms: Longest a request waits for others to join its batch
+        """
+        self.model = model
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.dimension = int(np.asarray(model.encode(["warm-up"])).shape[1])
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._server: Optional[_UnixServer] = None
+        self._stopped = threading.Event()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Queue ``texts`` for the next batch and wait for their embeddings."""
+        request = _Request(texts)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def _next_batch(self) -> List[_Request]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        n_texts = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while n_texts < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_texts += len(request.texts)
+        return batch
+
+    def _batch_loop(self) -> None:
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            for request in batch:
+                QUEUE_SECONDS.observe(started - request.enqueued)
+            BATCH_TEXTS.observe(len(texts))
+            BATCH_REQUESTS.observe(len(batch))
+            try:
+                embeddings = np.asarray(
+                    self.model.encode(texts, batch_size=self.max_batch_size), dtype=np.float32
+                )
+            except Exception as e:
+                for request in batch:
+                    request.error = f"{type(e).__name__}: {e}"
+                    request.done.set()
+                continue
+            offset = 0
+            for request in batch:
+                request.result = embeddings[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        header, _ = recv_message(self.request)
+                    except (ConnectionError, OSError):
+                        return
+                    if header.get("op") == "info":
+                        send_message(self.request, {"model": server.model_name, "dim": server.dimension})
+                        continue
+                    try:
+                        embeddings = server.encode(list(header.get("texts", [])))
+                    except RuntimeError as e:
+                        send_message(self.request, {"error": str(e)})
+                        continue
+                    send_message(self.request, {"shape": list(embeddings.shape)}, embeddings.tobytes())
+
+        return Handler
+
+    def start(self) -> "EmbeddingServer":
+        """Bind the socket and serve from daemon threads."""
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise RuntimeError(f"An embedding service is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)  # stale socket from a previous run
+            finally:
+                probe.close()
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+
+        self._server = _UnixServer(self.socket_path, self._handler())
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+        threading.Thread(target=self._server.serve_forever, name="embedding-server", daemon=True).start()
+        print(f"Embedding service for {self.model_name} listening on {self.socket_path} "
+              f"(batch <= {self.max_batch_size} texts, wait <= {self.max_wait_seconds * 1000:.1f} ms)")
+        return self
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class EmbeddingClient:
+    """Stand-in for ``SentenceTransformer.encode`` backed by an EmbeddingServer."""
+
+    def __init__(self, socket_path: str = EMBEDDING_SOCKET_PATH, model_name: Optional[str] = None, timeout_seconds: float = 30.0):
+        """
+        Args:
+            socket_path: Unix socket of the server
+            model_name: Expected model; a server running another model is rejected (ValueError)
+            timeout_seconds: Socket timeout per request
+        """
+        self.socket_path = socket_path
+        self.timeout_seconds = timeout_seconds
+        self._local = threading.local()  # one connection per thread
+        info, _ = self._call({"op": "info"})
+        if model_name and info["model"] != model_name:
+            raise ValueError(f"Embedding service runs {info['model']}, not {model_name}")
+        self.model_name = info["model"]
+        self.dimension = info["dim"]
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_seconds)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _call(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        # Retry once on a fresh connection (e.g. after a server restart)
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                send_message(sock, header)
+                return recv_message(sock)
+            except OSError:
+                if sock is not None:
+                    sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+        raise ConnectionError("unreachable")
+
+    def encode(self, sentences: Union[str, Sequence[str]], **_: Any) -> np.ndarray:
+        """
+        Embed one text (1-D result) or a list of texts (2-D result), like SentenceTransformer.
+
+        Keyword arguments such as ``batch_size`` are accepted and ignored; the server batches.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        header, payload = self._call({"op": "encode", "texts": texts})
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        embeddings = np.frombuffer(payload, dtype=np.float32).reshape(header["shape"])
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+def load_embedding_model(model_name: str, socket_path: Optional[str] = None, timeout_seconds: float = 30.0):
+    """
+    Connect to the embedding service if ``socket_path`` is given, else load the model in-process.
+
+    Falls back to a local model (with a warning) when the service is unreachable
+    or runs a different model. sentence_transformers is only imported when a
+    local model is needed, so service clients never load torch.
+
+    Returns:
+        EmbeddingClient or SentenceTransformer
+    """
+    if socket_path:
+        try:
+            client = EmbeddingClient(socket_path, model_name=model_name, timeout_seconds=timeout_seconds)
+            print(f"Using embedding service at {socket_path} ({model_name})")
+            return client
+        except (OSError, ValueError) as e:
+            print(f"[warn] Embedding service unavailable ({e}); loading {model_name} locally")
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Loading embedding model: {model_name}")
+    return SentenceTransformer(model_name)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared embedding server over a Unix socket")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="Load the model and serve encode requests")
+    p_serve.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="Embedding model")
+    p_serve.add_argument("--socket", default=EMBEDDING_SOCKET_PATH, help="Unix socket path (default: data/embedding.sock)")
+    p_serve.add_argument("--max-batch-size", type=int, default=64, help="Texts per encode call (default: 64)")
+    p_serve.add_argument("--max-wait-ms", type=float, default=5.0, help="Batching window in ms (default: 5)")
+    p_serve.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    p_ping = sub.add_parser("ping", help="Check that a server is running and print its model")
+    p_ping.add_argument("--socket", default=EMBEDDING_SOCKET_PATH)
+    args = parser.parse_args()
+
+    if args.command == "ping":
+        client = EmbeddingClient(args.socket)
+        start = time.perf_counter()
+        client.encode(["ping"])
+        print(f"{client.model_name} (dim {client.dimension}) at {args.socket}: "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms round trip")
+        raise SystemExit(0)
+
+    from sentence_transformers import SentenceTransformer
+
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    service = EmbeddingServer(
+        SentenceTransformer(args.model),
+        model_name=args.model,
+        socket_path=args.socket,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    ).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
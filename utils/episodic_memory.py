@@ -0,0 +1,111 @@
+# episodic_memory.py
+"""
+Per-session episodic memory: past question/answer pairs and superseded running
+summaries, embedded with the retrieval model and searchable by the current
+question.
+
+The running summary is capped in size, so facts from early in a long session
+eventually drop out of it. Episodes keep them retrievable: only the top-k
+episodes relevant to the current question are added to the memory block, so
+the prompt stays the same size however long the conversation gets.
+"""
+
+from typing import Dict, List, Optional
+
+from utils.vector_backends import NumpyIndex
+
+
+class EpisodicMemory:
+    """Exact in-memory vector index over one session's past turns."""
+
+    def __init__(
+        self,
+        embedding_model,
+        top_k: int = 3,
+        max_distance: float = 0.6,
+        max_episodes: int = 5000,
+        max_chars: int = 500,
+    ):
+        """
+        Args:
+            embedding_model: SentenceTransformer shared with the VectorDB (no second model load)
+            top_k: Episodes returned per search
+            max_distance: Cosine distance above which an episode is not considered relevant
+            max_episodes: Oldest episodes are evicted beyond this many
+            max_chars: Episode text is truncated to this length when rendered
+        """
+        self.embedding_model = embedding_model
+        self.top_k = top_k
+        self.max_distance = max_distance
+        self.max_episodes = max_episodes
+        self.max_chars = max_chars
+
+        self.index = NumpyIndex(initial_capacity=256)
+        self._turns: Dict[str, int] = {}  # episode id -> user turn it was recorded at
+        self._pending: List[tuple] = []  # (id, text, turn) not embedded yet
+
+    def __len__(self) -> int:
+        return self.index.count() + len(self._pending)
+
+    def add(self, episode_id: str, text: str, turn: int) -> None:
+        """
+        Record an episode. Embedding is deferred to the next search, so appends are cheap
+        and episodes recorded between searches are embedded in one batch.
+
+        Args:
+            episode_id: Unique ID within the session (re-adding an ID is ignored)
+            text: Episode text
+            turn: User-turn number the episode belongs to
+        """
+        if text.strip():
+            self._pending.append((episode_id, text, turn))
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        ids, texts, turns = zip(*self._pending)
+        self._pending = []
+        self.index.add(list(ids), self.embedding_model.encode(list(texts)), list(texts))
+        self._turns.update(zip(ids, turns))
+
+        overflow = self.index.count() - self.max_episodes
+        if overflow > 0:
+            # Evict in blocks so the matrix is not compacted on every append
+            evicted = self.index.ids[:overflow + self.max_episodes // 10]
+            self.index.remove(evicted)
+            for episode_id in evicted:
+                self._turns.pop(episode_id, None)
+
+    def search(self, query: str, before_turn: Optional[int] = None, k: Optional[int] = None) -> List[str]:
+        """
+        Episodes most relevant to ``query``.
+
+        Args:
+            query: Current (standalone) question
+            before_turn: Only return episodes recorded before this user turn
+                (later ones are already in the prompt's recent turns)
+            k: Number of episodes (defaults to ``top_k``)
+
+        Returns:
+            Episode texts, most relevant first, truncated to ``max_chars``
+        """
+        k = self.top_k if k is None else k
+        self._flush()
+        if k <= 0 or self.index.count() == 0:
+            return []
+        # Over-fetch a little: the most recent episodes are usually filtered out
+        results = self.index.query(
+            query_embeddings=self.embedding_model.encode([query]),
+            n_results=k + 4,
+            include=["documents", "distances"],
+        )
+        episodes = []
+        for episode_id, text, distance in zip(results["ids"][0], results["documents"][0], results["distances"][0]):
+            if distance > self.max_distance:
+                break
+            if before_turn is not None and self._turns.get(episode_id, 0) >= before_turn:
+                continue
+            episodes.append(text[:self.max_chars])
+            if len(episodes) == k:
+                break
+        return episodes
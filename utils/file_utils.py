@@ -1,8 +1,10 @@
+import bisect
+import hashlib
 import os
 import yaml
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Union, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union, Optional
 
 from utils.paths import DOCUMENT_DIR
 
@@ -25,6 +27,143 @@ def _read_text(path: Path) -> str:
         return "\n".join((p.extract_text() or "") for p in r.pages).strip()
     raise ValueError(f"Unsupported extension: {ext}")
 
+class Segment(NamedTuple):
+    """A piece of a document as extracted, with its 1-based page number (None if the format has no pages)."""
+    text: str
+    page: Optional[int] = None
+
+
+def _docx_page_breaks(paragraph) -> int:
+    # Explicit page breaks plus the breaks Word recorded at its last layout
+    return len(paragraph._p.xpath('.//w:br[@w:type="page"] | .//w:lastRenderedPageBreak'))
+
+
+def iter_segments(path: Union[str, Path]) -> Iterator[Segment]:
+    """Yields a document lazily: PDF pages, DOCX paragraphs or text paragraphs.
+
+    Nothing is joined up front, so memory stays bounded by the largest segment
+    instead of the whole document.
+
+    Args:
+        path: Path to a supported document.
+
+    Yields:
+        Segment(text, page) in document order. DOCX page numbers follow the
+        page breaks stored in the file and are approximate.
+    """
+    path = Path(path)
+    ext = path.suffix.lower()
+    if ext in {".md", ".txt"}:
+        lines = []
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                if line.strip():
+                    lines.append(line)
+                elif lines:
+                    yield Segment("".join(lines))
+                    lines = []
+        if lines:
+            yield Segment("".join(lines))
+        return
+    if ext == ".docx":
+        from docx import Document
+        page = 1
+        for paragraph in Document(str(path)).paragraphs:
+            if paragraph.text:
+                yield Segment(paragraph.text, page)
+            page += _docx_page_breaks(paragraph)
+        return
+    if ext == ".pdf":
+        from PyPDF2 import PdfReader
+        # Pages are parsed on access; each page's text is dropped once yielded
+        for number, page in enumerate(PdfReader(str(path)).pages, start=1):
+            text = page.extract_text() or ""
+            if text.strip():
+                yield Segment(text, number)
+        return
+    raise ValueError(f"Unsupported extension: {ext}")
+
+
+def chunk_segments(
+    segments: Iterable[Segment],
+    split_text: Callable[[str], List[str]],
+    window: int = 8192,
+) -> Iterator[Tuple[str, Dict[str, int]]]:
+    """Chunks a stream of segments, tracking which pages each chunk spans.
+
+    Segments are appended to a buffer of about ``window`` characters that is
+    split with ``split_text``; every chunk but the last is emitted and the last
+    one is carried into the next window, so chunks still flow across segment
+    boundaries with the splitter's overlap.
+
+    Args:
+        segments: Output of iter_segments().
+        split_text: Chunker, e.g. VectorDB.chunk_text.
+        window: Characters buffered before splitting.
+
+    Yields:
+        (chunk, metadata) with "page_start"/"page_end" when pages are known.
+    """
+    buffer = ""
+    starts: List[int] = []  # buffer offset where each segment begins
+    pages: List[Optional[int]] = []
+
+    def page_at(offset: int) -> Optional[int]:
+        return pages[max(bisect.bisect_right(starts, offset) - 1, 0)]
+
+    def located(chunks: List[str]) -> Iterator[Tuple[int, str, Dict[str, int]]]:
+        cursor = 0
+        for chunk in chunks:
+            position = buffer.find(chunk, cursor)
+            position = cursor if position < 0 else position
+            cursor = position + 1
+            first, last = page_at(position), page_at(position + max(len(chunk) - 1, 0))
+            metadata = {"page_start": first, "page_end": last} if first is not None else {}
+            yield position, chunk, metadata
+
+    for segment in segments:
+        if buffer:
+            buffer += "\n"
+        starts.append(len(buffer))
+        pages.append(segment.page)
+        buffer += segment.text
+        if len(buffer) < window:
+            continue
+
+        chunks = split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        emitted = list(located(chunks))
+        for _, chunk, metadata in emitted[:-1]:
+            yield chunk, metadata
+        # Carry the last chunk (and the page spans it touches) into the next window
+        carry = emitted[-1][0]
+        keep = max(bisect.bisect_right(starts, carry) - 1, 0)
+        starts = [0] + [start - carry for start in starts[keep + 1:]]
+        pages = pages[keep:]
+        buffer = buffer[carry:]
+
+    if buffer.strip():
+        for _, chunk, metadata in located(split_text(buffer)):
+            yield chunk, metadata
+
+
+def file_content_hash(path: Union[str, Path], block_size: int = 1 << 20) -> str:
+    """sha256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_publication_files(publication_dir: str = DOCUMENT_DIR) -> List[Path]:
+    """Supported files in the publication directory, sorted by name."""
+    root = Path(publication_dir)
+    if not root.exists():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_file() and p.suffix.lower() in SUPPORTED_EXTS)
+
 def load_all_publications(publication_dir: str = DOCUMENT_DIR) -> list[str]:
     root = Path(publication_dir)
     if not root.exists():
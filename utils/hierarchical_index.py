@@ -0,0 +1,172 @@
+"""
+Coarse-to-fine retrieval over document-level vectors.
+
+Next to the chunk collection, a small companion collection holds one vector
+per source document: the normalized mean of its chunk embeddings. A search
+first picks the ``n_docs`` documents closest to the query, then runs the
+chunk query restricted to those sources with a metadata filter, so the chunk
+search scales with the size of a few documents instead of the whole corpus.
+
+Only chunks with ``source`` metadata (file-based ingestion) take part.
+
+Usage:
+    python -m utils.hierarchical_index rebuild --collection publications
+"""
+
+import hashlib
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+DOC_COLLECTION_SUFFIX = "__docs"
+MAX_COLLECTION_NAME = 63  # ChromaDB limit
+
+
+def doc_collection_name(chunk_collection_name: str) -> str:
+    """Name of the document-vector collection that belongs to a chunk collection."""
+    name = f"{chunk_collection_name}{DOC_COLLECTION_SUFFIX}"
+    if len(name) <= MAX_COLLECTION_NAME:
+        return name
+    digest = hashlib.sha1(chunk_collection_name.encode("utf-8")).hexdigest()[:8]
+    keep = MAX_COLLECTION_NAME - len(DOC_COLLECTION_SUFFIX) - len(digest) - 1
+    return f"{chunk_collection_name[:keep]}_{digest}{DOC_COLLECTION_SUFFIX}"
+
+
+def document_centroid(embeddings: Sequence) -> np.ndarray:
+    """Normalized mean of a document's normalized chunk embeddings."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    centroid = matrix.mean(axis=0)
+    return centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+
+
+class DocumentIndex:
+    """One vector per source document, stored in its own Chroma collection."""
+
+    def __init__(self, collection):
+        """
+        Args:
+            collection: Chroma collection for the document vectors (see doc_collection_name())
+        """
+        self.collection = collection
+
+    def count(self) -> int:
+        """Number of indexed documents."""
+        return self.collection.count()
+
+    def upsert(self, source: str, embeddings: Sequence) -> None:
+        """Store or refresh the vector of ``source`` from its chunk embeddings."""
+        self.collection.upsert(
+            ids=[source],
+            embeddings=[document_centroid(embeddings).tolist()],
+            metadatas=[{"source": source, "chunks": len(embeddings)}],
+        )
+
+    def delete(self, source: str) -> None:
+        self.collection.delete(ids=[source])
+
+    def rebuild(self, chunk_collection, page_size: int = 5000) -> int:
+        """
+        Recompute every document vector from a chunk collection.
+
+        Args:
+            chunk_collection: Chroma collection of chunks with "source" metadata
+            page_size: Chunks fetched per ``get`` call
+
+        Returns:
+            Number of documents indexed
+        """
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = {}
+        total = chunk_collection.count()
+        for offset in range(0, total, page_size):
+            page = chunk_collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            for vector, metadata in zip(vectors, page["metadatas"]):
+                source = (metadata or {}).get("source")
+                if source is None:
+                    continue
+                sums[source] = sums[source] + vector if source in sums else vector.copy()
+                counts[source] = counts.get(source, 0) + 1
+
+        existing = self.collection.get(include=[])["ids"]
+        if existing:
+            self.collection.delete(ids=existing)
+        sources = sorted(sums)
+        for start in range(0, len(sources), page_size):
+            batch = sources[start:start + page_size]
+            centroids = [sums[s] / max(float(np.linalg.norm(sums[s])), 1e-12) for s in batch]
+            self.collection.upsert(
+                ids=batch,
+                embeddings=[c.tolist() for c in centroids],
+                metadatas=[{"source": s, "chunks": counts[s]} for s in batch],
+            )
+        return len(sources)
+
+    def query(
+        self,
+        chunk_collection,
+        query_embeddings: Sequence,
+        n_results: int,
+        include: Sequence[str] = ("documents", "distances"),
+        n_docs: int = 5,
+    ) -> Dict[str, Any]:
+        """
+        Two-stage search, returning results shaped like ``Collection.query``.
+
+        Args:
+            chunk_collection: Chroma collection of chunks
+            query_embeddings: One or more query vectors
+            n_results: Chunks per query
+            include: Fields to return, as for ``Collection.query``
+            n_docs: Documents selected by the first stage
+
+        Returns:
+            Dictionary of nested lists (one inner list per query)
+        """
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        results: Dict[str, List] = {"ids": [], **{key: [] for key in include}}
+        n_docs = min(n_docs, self.count())
+        if n_docs == 0:
+            for _ in query_embeddings:
+                for values in results.values():
+                    values.append([])
+            return results
+
+        top_sources = self.collection.query(query_embeddings=query_embeddings.tolist(), n_results=n_docs, include=[])
+        for query_embedding, sources in zip(query_embeddings, top_sources["ids"]):
+            where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": list(sources)}}
+            found = chunk_collection.query(
+                query_embeddings=[query_embedding.tolist()], n_results=n_results, where=where, include=list(include)
+            )
+            for key in results:
+                results[key].append(found[key][0] if found.get(key) is not None else [])
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    # Disable ChromaDB telemetry BEFORE importing chromadb
+    os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+    import chromadb
+
+    from utils.collection_versions import resolve_alias
+    from utils.paths import DATA_DIR
+    from utils.vectordb import COLLECTION_METADATA
+
+    parser = argparse.ArgumentParser(description="Maintain the document-level index used for two-stage retrieval")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="Recompute every document vector from the chunk collection")
+    p_rebuild.add_argument("--collection", default="publications", help="Collection name or alias (default: publications)")
+    args = parser.parse_args()
+
+    version = resolve_alias(args.collection)
+    name = version["collection"] if version else args.collection
+    client = chromadb.PersistentClient(path=DATA_DIR)
+    index = DocumentIndex(client.get_or_create_collection(name=doc_collection_name(name), metadata=COLLECTION_METADATA))
+    n_documents = index.rebuild(client.get_collection(name=name))
+    print(f"Indexed {n_documents} documents of '{name}' into '{doc_collection_name(name)}'")
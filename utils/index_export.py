@@ -0,0 +1,168 @@
+"""
+Export a ChromaDB collection to a compact, memory-mappable snapshot.
+
+The snapshot is a directory with:
+- embeddings.npy: (n, dim) L2-normalized float16/float32 matrix
+- ids.bin / documents.bin: UTF-8 blobs of concatenated chunk IDs and texts
+- offsets.npy: (n + 1, 2) int64 byte offsets into ids.bin and documents.bin
+- manifest.json: counts, dtype and provenance
+
+Read it back with utils.vector_backends.MmapIndex (or VectorDB(backend="mmap")).
+
+Usage:
+    python -m utils.index_export --collection publications --dtype float16
+"""
+
+import os
+
+# Disable ChromaDB telemetry BEFORE importing chromadb
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import json
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from utils.paths import DATA_DIR, EXPORT_DIR
+from utils.vector_backends import (
+    MANIFEST_FILE,
+    EMBEDDINGS_FILE,
+    OFFSETS_FILE,
+    IDS_FILE,
+    DOCUMENTS_FILE,
+    normalize_rows,
+)
+
+SUPPORTED_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+
+def export_collection(
+    collection,
+    out_dir: str | Path,
+    dtype: str = "float16",
+    page_size: int = 5000,
+    embedding_model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Snapshot a collection's embeddings, IDs and documents to ``out_dir``.
+
+    Rows are streamed page by page, so memory stays bounded by ``page_size``.
+    The snapshot is written to a temporary directory and swapped in at the end;
+    processes that already mapped the previous snapshot keep reading it.
+
+    Args:
+        collection: ChromaDB collection to export
+        out_dir: Destination directory
+        dtype: "float16" or "float32" for the embedding matrix
+        page_size: Number of rows fetched per ``collection.get`` call
+        embedding_model: Optional model name recorded in the manifest
+
+    Returns:
+        The manifest dictionary
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype} (expected one of {sorted(SUPPORTED_DTYPES)})")
+
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(f"{out_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    total = collection.count()
+    matrix = None
+    offsets = np.zeros((total + 1, 2), dtype=np.int64)
+    row = 0
+
+    with open(tmp_dir / IDS_FILE, "wb") as ids_f, open(tmp_dir / DOCUMENTS_FILE, "wb") as docs_f:
+        for offset in range(0, total, page_size):
+            page = collection.get(include=["embeddings", "documents"], limit=page_size, offset=offset)
+            embeddings = normalize_rows(page["embeddings"])
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    tmp_dir / EMBEDDINGS_FILE, mode="w+",
+                    dtype=SUPPORTED_DTYPES[dtype], shape=(total, embeddings.shape[1]),
+                )
+            matrix[row:row + len(embeddings)] = embeddings
+
+            for chunk_id, document in zip(page["ids"], page["documents"]):
+                id_bytes = chunk_id.encode("utf-8")
+                doc_bytes = (document or "").encode("utf-8")
+                ids_f.write(id_bytes)
+                docs_f.write(doc_bytes)
+                offsets[row + 1] = (offsets[row, 0] + len(id_bytes), offsets[row, 1] + len(doc_bytes))
+                row += 1
+
+    if matrix is None:
+        matrix = np.lib.format.open_memmap(
+            tmp_dir / EMBEDDINGS_FILE, mode="w+", dtype=SUPPORTED_DTYPES[dtype], shape=(0, 0)
+        )
+    matrix.flush()
+    dim = int(matrix.shape[1])
+    del matrix
+    np.save(tmp_dir / OFFSETS_FILE, offsets[:row + 1])
+
+    manifest = {
+        "format_version": 1,
+        "collection": collection.name,
+        "embedding_model": embedding_model,
+        "count": row,
+        "dim": dim,
+        "dtype": dtype,
+        "normalized": True,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    # Swap the new snapshot into place
+    if out_dir.exists():
+        old_dir = out_dir.with_name(f"{out_dir.name}.old-{os.getpid()}")
+        os.replace(out_dir, old_dir)
+        os.replace(tmp_dir, out_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.replace(tmp_dir, out_dir)
+
+    return manifest
+
+
+def main(collection_name: str, out_dir: Optional[str] = None, dtype: str = "float16") -> Dict[str, Any]:
+    """
+    Export a persisted collection from DATA_DIR.
+
+    Args:
+        collection_name: Name (or alias) of the ChromaDB collection
+        out_dir: Destination directory (defaults to EXPORT_DIR/<collection_name>)
+        dtype: "float16" or "float32"
+    """
+    import chromadb
+
+    from utils.collection_versions import resolve_alias
+
+    client = chromadb.PersistentClient(path=DATA_DIR)
+    out_dir = out_dir or os.path.join(EXPORT_DIR, collection_name)
+    version = resolve_alias(collection_name)
+    embedding_model = None
+    if version:
+        # Export whatever version the alias currently points to
+        collection_name, embedding_model = version["collection"], version.get("embedding_model")
+    collection = client.get_collection(name=collection_name)
+
+    print(f"Exporting collection '{collection_name}' ({collection.count()} chunks) to {out_dir}...")
+    manifest = export_collection(collection, out_dir, dtype=dtype, embedding_model=embedding_model)
+    print(f"Exported {manifest['count']} chunks (dim={manifest['dim']}, dtype={manifest['dtype']})")
+    return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a ChromaDB collection to a memory-mapped index")
+    parser.add_argument("--collection", default="publications", help="Collection name (default: publications)")
+    parser.add_argument("--out", default=None, help="Output directory (default: data/export/<collection>)")
+    parser.add_argument("--dtype", default="float16", choices=sorted(SUPPORTED_DTYPES), help="Embedding storage dtype")
+    args = parser.parse_args()
+
+    main(args.collection, out_dir=args.out, dtype=args.dtype)
@@ -0,0 +1,329 @@
+"""
+Parallel, resumable ingestion of the documents directory.
+
+The file list is sharded across a process pool; every worker loads its own
+embedding model and parses, chunks and embeds whole files. Results stream back
+to the parent, the single writer, which batches ``collection.upsert`` calls.
+Completed files are appended to a manifest (after their chunks are written),
+so an interrupted run resumes where it stopped and unchanged files are skipped
+on the next run. Chunks use the same IDs and source metadata as the corpus
+watcher, so both can maintain the same collection. With ``--hierarchical`` the
+per-document vectors used by two-stage search (utils/hierarchical_index.py)
+are written alongside.
+
+Usage:
+    python -m utils.ingest --workers 8
+    python -m utils.ingest --collection publications --batch-size 1024 --restart
+    python -m utils.ingest --hierarchical
+"""
+
+import os
+
+# Disable ChromaDB telemetry BEFORE importing chromadb
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import json
+import multiprocessing as mp
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+from utils.file_utils import chunk_segments, file_content_hash, iter_segments, list_publication_files
+from utils.paths import DATA_DIR, DOCUMENT_DIR
+from utils.retrieval_utils import source_chunk_ids
+
+MANIFEST_DIR = os.path.join(DATA_DIR, "ingest_manifests")
+PROGRESS_EVERY_SECONDS = 5.0
+
+# Per-process state set up by _init_worker
+_WORKER: Dict[str, Any] = {}
+
+
+def _file_key(path: Path) -> List[float]:
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime]
+
+
+def list_files(document_dir: str | Path = DOCUMENT_DIR) -> List[Path]:
+    """Supported files in the corpus directory, largest first for better load balancing."""
+    return sorted(list_publication_files(document_dir), key=lambda p: p.stat().st_size, reverse=True)
+
+
+def read_manifest(path: str | Path) -> Dict[str, Dict[str, Any]]:
+    """Latest manifest record per source (later lines win)."""
+    records = {}
+    path = Path(path)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    records[record["source"]] = record
+    return records
+
+
+def _init_worker(embedding_model: str, chunk_size: int, chunk_overlap: int, threads: int) -> None:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from sentence_transformers import SentenceTransformer
+
+    try:
+        import torch
+
+        # One pool of cores shared by N workers: avoid N x all-cores thread oversubscription
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _WORKER["model"] = SentenceTransformer(embedding_model, device="cpu")
+    _WORKER["splitter"] = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _process_file(path: str) -> Dict[str, Any]:
+    """Parse, chunk and embed one file inside a worker."""
+    path = Path(path)
+    source = path.name
+    start = time.perf_counter()
+    try:
+        digest = file_content_hash(path)
+        chunks, metadatas = [], []
+        # Pages are extracted lazily and chunked as they stream in
+        for chunk, page_metadata in chunk_segments(iter_segments(path), _WORKER["splitter"].split_text):
+            chunks.append(chunk)
+            metadatas.append({"source": source, "content_hash": digest, **page_metadata})
+        embeddings = _WORKER["model"].encode(chunks, batch_size=64) if chunks else []
+        return {
+            "source": source,
+            "key": _file_key(path),
+            "content_hash": digest,
+            "ids": source_chunk_ids(source, len(chunks)),
+            "documents": chunks,
+            "metadatas": metadatas,
+            "embeddings": embeddings,
+            "seconds": time.perf_counter() - start,
+        }
+    except Exception as e:
+        return {"source": source, "key": _file_key(path), "error": f"{type(e).__name__}: {e}"}
+
+
+class IngestWriter:
+    """Single writer: buffers chunks from many files and upserts them in batches."""
+
+    def __init__(
+        self,
+        collection,
+        manifest_path: str | Path,
+        batch_size: int,
+        doc_index=None,
+    ):
+        self.collection = collection
+        self.doc_index = doc_index
+        self.manifest_path = Path(manifest_path)
+        self.batch_size = batch_size
+        self._files: List[Dict[str, Any]] = []
+        self._buffered_chunks = 0
+        self.chunks_written = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self._files.append(result)
+        self._buffered_chunks += len(result["ids"])
+        if self._buffered_chunks >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._files:
+            return
+        for result in self._files:
+            # A changed file may now have fewer chunks; drop the old ones first. Always, like
+            # VectorDB.replace_document: the file may have been indexed outside this manifest
+            # (add_documents, the corpus watcher, or before a --restart)
+            self.collection.delete(where={"source": result["source"]})
+
+        ids, documents, embeddings, metadatas = [], [], [], []
+        for result in self._files:
+            ids.extend(result["ids"])
+            documents.extend(result["documents"])
+            embeddings.extend(result["embeddings"])
+            metadatas.extend(result["metadatas"])
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            self.collection.upsert(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end],
+            )
+        self.chunks_written += len(ids)
+        if self.doc_index is not None:
+            for result in self._files:
+                if result["ids"]:
+                    self.doc_index.upsert(result["source"], result["embeddings"])
+                else:
+                    self.doc_index.delete(result["source"])
+
+        # Only now are these files durable; record them for resume
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            for result in self._files:
+                f.write(json.dumps({
+                    "source": result["source"],
+                    "key": result["key"],
+                    "content_hash": result["content_hash"],
+                    "chunks": len(result["ids"]),
+                    "status": "done",
+                }) + "\n")
+        self._files = []
+        self._buffered_chunks = 0
+
+    def record_failure(self, result: Dict[str, Any]) -> None:
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"source": result["source"], "key": result["key"], "status": "failed",
+                                "error": result["error"]}) + "\n")
+
+
+def _results(files: List[Path], workers: int, init_args: tuple) -> Iterator[Dict[str, Any]]:
+    if workers <= 1:
+        _init_worker(*init_args)
+        yield from map(_process_file, map(str, files))
+        return
+    # spawn: workers must not inherit the parent's torch/Chroma state
+    with mp.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+        yield from pool.imap_unordered(_process_file, map(str, files), chunksize=1)
+
+
+def ingest(
+    collection_name: str = "publications",
+    document_dir: str | Path = DOCUMENT_DIR,
+    workers: Optional[int] = None,
+    batch_size: int = 1024,
+    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+    chunk_size: int = 400,
+    chunk_overlap: int = 100,
+    restart: bool = False,
+    hierarchical: bool = False,
+) -> Dict[str, Any]:
+    """
+    Ingest every supported file in ``document_dir`` into a collection.
+
+    Args:
+        collection_name: Collection name or alias (a promoted alias resolves to its version)
+        document_dir: Corpus directory
+        workers: Worker processes (default: all cores)
+        batch_size: Chunks per upsert call
+        embedding_model: Embedding model name (a promoted version's model takes precedence)
+        chunk_size: Chunker size in characters (a promoted version's setting takes precedence)
+        chunk_overlap: Chunker overlap in characters (a promoted version's setting takes precedence)
+        restart: Ignore the manifest and re-ingest everything
+        hierarchical: Also maintain the document-level index used by two-stage search
+
+    Returns:
+        Run summary (files, chunks, failures, throughput)
+    """
+    import chromadb
+
+    from utils.collection_versions import resolve_alias
+    from utils.hierarchical_index import DocumentIndex, doc_collection_name
+    from utils.vectordb import COLLECTION_METADATA
+
+    version = resolve_alias(collection_name)
+    if version:
+        collection_name = version["collection"]
+        embedding_model = version.get("embedding_model", embedding_model)
+        chunk_size = version.get("chunk_size", chunk_size)
+        chunk_overlap = version.get("chunk_overlap", chunk_overlap)
+
+    client = chromadb.PersistentClient(path=DATA_DIR)
+    collection = client.get_or_create_collection(name=collection_name, metadata=COLLECTION_METADATA)
+    max_batch = getattr(client, "get_max_batch_size", lambda: batch_size)()
+    batch_size = max(1, min(batch_size, max_batch))
+
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    manifest_path = Path(MANIFEST_DIR) / f"{collection_name}.jsonl"
+    if restart and manifest_path.exists():
+        manifest_path.unlink()
+    previous = read_manifest(manifest_path)
+
+    files = list_files(document_dir)
+    pending = [
+        p for p in files
+        if not (previous.get(p.name, {}).get("status") == "done" and previous[p.name]["key"] == _file_key(p))
+    ]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending) or 1))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Ingesting {len(pending)}/{len(files)} files into '{collection_name}' "
+          f"with {workers} worker(s), batch size {batch_size} ({len(files) - len(pending)} unchanged, skipped)")
+
+    doc_index = backfill_docs = None
+    if hierarchical:
+        doc_index = DocumentIndex(client.get_or_create_collection(
+            name=doc_collection_name(collection_name), metadata=COLLECTION_METADATA
+        ))
+        # Skipped files would be missing from a new document index; recompute it at the end
+        backfill_docs = doc_index.count() == 0 and collection.count() > 0
+
+    writer = IngestWriter(collection, manifest_path, batch_size, doc_index=doc_index)
+    failures: List[Dict[str, str]] = []
+    done = chunks = 0
+    start = last_report = time.perf_counter()
+    for result in _results(pending, workers, (embedding_model, chunk_size, chunk_overlap, threads)):
+        done += 1
+        if "error" in result:
+            failures.append({"source": result["source"], "error": result["error"]})
+            writer.record_failure(result)
+            print(f"[warn] Failed {result['source']}: {result['error']}")
+        else:
+            chunks += len(result["ids"])
+            writer.add(result)
+
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_EVERY_SECONDS or done == len(pending):
+            rate = chunks / (now - start) if now > start else 0.0
+            print(f"[{done}/{len(pending)} files] {chunks} chunks | {rate:.1f} chunks/s | {len(failures)} failed")
+            last_report = now
+    writer.flush()
+    if backfill_docs:
+        print(f"Indexed {doc_index.rebuild(collection)} documents for two-stage search")
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "collection": collection_name,
+        "files_total": len(files),
+        "files_skipped": len(files) - len(pending),
+        "files_ingested": done - len(failures),
+        "files_failed": len(failures),
+        "chunks": writer.chunks_written,
+        "seconds": round(elapsed, 2),
+        "chunks_per_second": round(writer.chunks_written / elapsed, 1) if elapsed > 0 else None,
+        "workers": workers,
+        "failures": failures,
+    }
+    print(f"Done: {summary['chunks']} chunks from {summary['files_ingested']} files in {summary['seconds']}s "
+          f"({summary['chunks_per_second']} chunks/s), {summary['files_failed']} failed")
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parallel, resumable ingestion of documents/ into ChromaDB")
+    parser.add_argument("--collection", default="publications", help="Collection name or alias (default: publications)")
+    parser.add_argument("--documents", default=DOCUMENT_DIR, help="Corpus directory (default: documents/)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Chunks per upsert call (default: 1024)")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="Embedding model")
+    parser.add_argument("--chunk-size", type=int, default=400)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--restart", action="store_true", help="Ignore the manifest and re-ingest everything")
+    parser.add_argument("--hierarchical", action="store_true", help="Also write per-document vectors for two-stage search")
+    args = parser.parse_args()
+
+    summary = ingest(
+        collection_name=args.collection,
+        document_dir=args.documents,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        embedding_model=args.model,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        restart=args.restart,
+        hierarchical=args.hierarchical,
+    )
+    raise SystemExit(1 if summary["files_failed"] else 0)
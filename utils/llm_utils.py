@@ -0,0 +1,243 @@
+# llm_utils.py
+"""
+Process-wide registry of LLM chat clients.
+
+Every RAGAssistant used to build its own provider client, so each Streamlit
+session (and each evaluator run) opened new connections and paid a TCP + TLS
+handshake on its first request. The registry builds each (provider, model,
+temperature) client once per process and gives every client the same httpx
+connection pool, with configurable pool limits, keep-alive, timeouts and
+optional HTTP/2. A warm-up ping (``GET <base_url>/models``) opens a pooled
+connection at startup so the first user request does not pay the handshake.
+
+Providers: "openai", "groq", "google" and "local" (any OpenAI-compatible
+endpoint, e.g. a local server or the fake provider used by
+evaluation/benchmark_llm_clients.py). Gemini clients use Google's own
+transport; they are reused but not pooled or warmed.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from utils.metrics import REGISTRY
+
+DEFAULT_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "groq": "https://api.groq.com/openai/v1",
+}
+FALLBACK_ORDER = ["openai", "groq", "google"]
+
+CLIENTS_CREATED = REGISTRY.counter("rag_llm_clients_created_total", "LLM chat clients built by the registry")
+WARMUP_SECONDS = REGISTRY.gauge("rag_llm_warmup_seconds", "Duration of the last warm-up ping per provider")
+
+
+def provider_order(preference: str) -> List[str]:
+    """Providers to try, preferred first ("local" is only tried when preferred)."""
+    preference = (preference or "openai").lower()
+    if preference == "local":
+        return ["local", *FALLBACK_ORDER]
+    if preference not in FALLBACK_ORDER:
+        preference = "openai"
+    return [preference, *(p for p in FALLBACK_ORDER if p != preference)]
+
+
+def http_timeout(http_config: Dict[str, Any]) -> httpx.Timeout:
+    """Request timeout from ``llm.http`` (overall and connect)."""
+    return httpx.Timeout(
+        http_config.get("timeout_seconds", 60.0),
+        connect=http_config.get("connect_timeout_seconds", 5.0),
+    )
+
+
+def build_http_client(http_config: Dict[str, Any]) -> httpx.Client:
+    """
+    Shared httpx client (one connection pool) for every OpenAI-compatible LLM client.
+
+    Args:
+        http_config: The ``llm.http`` section of app_config.yaml
+
+    Returns:
+        Configured httpx.Client
+    """
+    http2 = http_config.get("http2", False)
+    if http2:
+        try:
+            import h2  # noqa: F401 (httpx needs it for HTTP/2)
+        except ImportError:
+            print("[warn] llm.http.http2 needs the 'h2' package (pip install httpx[http2]); using HTTP/1.1")
+            http2 = False
+    return httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=http_config.get("max_connections", 20),
+            max_keepalive_connections=http_config.get("max_keepalive_connections", 10),
+            keepalive_expiry=http_config.get("keepalive_expiry_seconds", 60.0),
+        ),
+        timeout=http_timeout(http_config),
+    )
+
+
+class LLMClientRegistry:
+    """Builds each chat client once per process; all of them share one HTTP connection pool."""
+
+    def __init__(self):
+        self._clients: Dict[Tuple, Any] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+    def _shared_http_client(self, http_config: Dict[str, Any]) -> httpx.Client:
+        # The first configuration wins; later differing configs would otherwise split the pool
+        if self._http_client is None:
+            self._http_client = build_http_client(http_config)
+        return self._http_client
+
+    def get(self, llm_config: Dict[str, Any], model_override: Optional[str] = None, warm_up: Optional[bool] = None):
+        """
+        Return the chat client for the first available provider, building it on first use.
+
+        Args:
+            llm_config: The ``llm`` section of app_config.yaml
+            model_override: Model name to use instead of the configured one (e.g. a cheaper model for rewrites)
+            warm_up: Ping the provider when the client is first built (default: ``llm.http.warm_up``)
+
+        Returns:
+            A LangChain chat model
+
+        Raises:
+            ValueError: If no provider has credentials (or, for "local", a base URL)
+        """
+        http_config = llm_config.get("http", {})
+        temperature = llm_config.get("temperature", 0.0)
+        for provider in provider_order(llm_config.get("provider_preference", "openai")):
+            settings = self._provider_settings(provider, llm_config, model_override)
+            if settings is None:
+                continue
+            key = (provider, settings["model"], temperature, settings.get("base_url"))
+            with self._lock:
+                client = self._clients.get(key)
+                created = client is None
+                if created:
+                    print(f"Using {settings['label']} model: {settings['model']}")
+                    client = self._build(provider, settings, temperature, http_config)
+                    self._clients[key] = client
+                    CLIENTS_CREATED.inc(labels={"provider": provider})
+            # Ping outside the lock so other sessions are not held up by a slow provider
+            if created and (http_config.get("warm_up", True) if warm_up is None else warm_up) and provider != "google":
+                self.warm_up(provider, settings)
+            return client
+
+        raise ValueError(
+            "No valid API key found. Please set one of: OPENAI_API_KEY, GROQ_API_KEY, or GOOGLE_API_KEY in your .env file"
+        )
+
+    @staticmethod
+    def _provider_settings(provider: str, llm_config: Dict[str, Any], model_override: Optional[str]) -> Optional[Dict[str, Any]]:
+        if provider == "openai" and os.getenv("OPENAI_API_KEY"):
+            return {
+                "label": "OpenAI",
+                "api_key": os.getenv("OPENAI_API_KEY"),
+                "model": model_override or os.getenv("OPENAI_MODEL") or llm_config.get("openai_model", "gpt-4o-mini"),
+                "base_url": os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URLS["openai"],
+            }
+        if provider == "groq" and os.getenv("GROQ_API_KEY"):
+            return {
+                "label": "Groq",
+                "api_key": os.getenv("GROQ_API_KEY"),
+                "model": model_override or os.getenv("GROQ_MODEL") or llm_config.get("groq_model", "llama-3.1-8b-instant"),
+                "base_url": DEFAULT_BASE_URLS["groq"],
+            }
+        if provider == "google" and os.getenv("GOOGLE_API_KEY"):
+            return {
+                "label": "Google Gemini",
+                "api_key": os.getenv("GOOGLE_API_KEY"),
+                "model": model_override or os.getenv("GOOGLE_MODEL") or llm_config.get("google_model", "gemini-2.0-flash"),
+            }
+        base_url = os.getenv("LOCAL_LLM_BASE_URL") or llm_config.get("local_base_url")
+        if provider == "local" and base_url:
+            return {
+                "label": "local",
+                "api_key": os.getenv("LOCAL_LLM_API_KEY", "not-needed"),
+                "model": model_override or os.getenv("LOCAL_LLM_MODEL") or llm_config.get("local_model", "local-model"),
+                "base_url": base_url.rstrip("/"),
+            }
+        return None
+
+    def _build(self, provider: str, settings: Dict[str, Any], temperature: float, http_config: Dict[str, Any]):
+        max_retries = http_config.get("max_retries", 2)
+        if provider == "google":
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            return ChatGoogleGenerativeAI(
+                google_api_key=settings["api_key"],
+                model=settings["model"],
+                temperature=temperature,
+                max_retries=max_retries,
+                timeout=http_config.get("timeout_seconds", 60.0),
+            )
+        http_client = self._shared_http_client(http_config)
+        # The SDKs send their own per-request timeout, which would override the pool's
+        timeout = http_timeout(http_config)
+        if provider == "groq":
+            from langchain_groq import ChatGroq
+
+            return ChatGroq(
+                api_key=settings["api_key"],
+                model=settings["model"],
+                temperature=temperature,
+                max_retries=max_retries,
+                timeout=timeout,
+                http_client=http_client,
+            )
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            api_key=settings["api_key"],
+            model=settings["model"],
+            temperature=temperature,
+            base_url=settings["base_url"],
+            max_retries=max_retries,
+            timeout=timeout,
+            http_client=http_client,
+        )
+
+    def warm_up(self, provider: str, settings: Dict[str, Any]) -> Optional[float]:
+        """
+        Open a pooled connection to the provider with a ``GET /models`` request (no tokens spent).
+
+        Returns:
+            Seconds taken, or None if the ping failed (the failure is only logged)
+        """
+        start = time.perf_counter()
+        try:
+            response = self._http_client.get(
+                f"{settings['base_url']}/models",
+                headers={"Authorization": f"Bearer {settings['api_key']}"},
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"[warn] Warm-up ping to {provider} failed: {e}")
+            return None
+        elapsed = time.perf_counter() - start
+        WARMUP_SECONDS.set(elapsed, labels={"provider": provider})
+        print(f"Warmed up {provider} connection in {elapsed * 1000:.0f} ms")
+        return elapsed
+
+    def close(self) -> None:
+        """Drop every client and close the shared connection pool."""
+        with self._lock:
+            self._clients.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+
+LLM_CLIENTS = LLMClientRegistry()
+
+
+def get_llm(llm_config: Dict[str, Any], model_override: Optional[str] = None, warm_up: Optional[bool] = None):
+    """Chat client from the process-wide registry (see LLMClientRegistry.get)."""
+    return LLM_CLIENTS.get(llm_config, model_override=model_override, warm_up=warm_up)
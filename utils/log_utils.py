@@ -6,6 +6,7 @@ from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from utils.paths import OUTPUTS_DIR
+from utils.metrics import stage_timer
 
 DEFAULT_OUTPUTS_DIR = "outputs"
 
@@ -44,26 +45,63 @@ def get_logger(
 
 
 class TimingContext:
-    """Context manager for measuring execution time."""
+    """Context manager for measuring execution time (monotonic clock)."""
     def __init__(self):
         self.start_time = None
         self.elapsed = None
     
     def __enter__(self):
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.elapsed = time.time() - self.start_time
+        self.elapsed = time.perf_counter() - self.start_time
         return False
     
     def get_elapsed(self) -> float:
         """Get elapsed time in seconds."""
         if self.elapsed is None:
-            return time.time() - self.start_time
+            return time.perf_counter() - self.start_time
         return self.elapsed
 
 
+def extract_prompt_cache_usage(message: Any) -> Optional[Dict[str, Any]]:
+    """
+    Extract provider-side prompt-cache usage from an LLM response message.
+
+    Reads LangChain's standardized ``usage_metadata`` first and falls back to the
+    OpenAI-style ``token_usage.prompt_tokens_details`` in ``response_metadata``.
+
+    Args:
+        message: AIMessage returned by a chat model
+
+    Returns:
+        Dict with input_tokens, cached_tokens and cache_hit_ratio, or None when the
+        provider does not report cache usage.
+    """
+    input_tokens = None
+    cached_tokens = None
+
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage:
+        input_tokens = usage.get("input_tokens")
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read")
+
+    if cached_tokens is None:
+        token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+        input_tokens = input_tokens if input_tokens is not None else token_usage.get("prompt_tokens")
+        cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+    if cached_tokens is None:
+        return None
+
+    return {
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_hit_ratio": round(cached_tokens / input_tokens, 4) if input_tokens else None,
+    }
+
+
 class JsonlTrace:
     """Append-only JSONL event stream for structured traces with enhanced observability."""
     def __init__(self, path: str | Path, log_config: Optional[Dict[str, Any]] = None):
@@ -94,8 +132,9 @@ class JsonlTrace:
 
     def write(self, record: Dict[str, Any]) -> None:
         """Write a trace record to the JSONL file."""
-        with self.path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        with stage_timer("trace_write"):
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
     
     def write_enhanced_invoke(
         self,
@@ -111,6 +150,7 @@ class JsonlTrace:
         total_latency: Optional[float] = None,
         memory_excerpt: Optional[str] = None,
         eval_flags: Optional[Dict[str, Any]] = None,
+        stage_latencies: Optional[Dict[str, float]] = None,
         **extra_fields
     ) -> None:
         """
@@ -129,6 +169,7 @@ class JsonlTrace:
             total_latency: Optional total request time in seconds
             memory_excerpt: Optional memory context excerpt
             eval_flags: Optional evaluation flags/metrics dict
+            stage_latencies: Optional per-stage times in seconds, logged as "<stage>_ms"
             **extra_fields: Additional fields to include in the trace
         """
         from datetime import datetime, timezone
@@ -160,6 +201,8 @@ class JsonlTrace:
                 latency_info["llm_ms"] = round(llm_latency * 1000, 2)
             if total_latency is not None:
                 latency_info["total_ms"] = round(total_latency * 1000, 2)
+            for stage, seconds in (stage_latencies or {}).items():
+                latency_info.setdefault(f"{stage}_ms", round(seconds * 1000, 2))
             if latency_info:
                 record["latency"] = latency_info
         
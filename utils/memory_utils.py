@@ -1,13 +1,17 @@
 # memory_utils.py
 import json
 import uuid
+from collections import deque
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Deque, List, Dict, Any, Optional
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from utils.metrics import stage_timer
+
 SUMMARY_PROMPT = ChatPromptTemplate.from_template("""
 You compress conversation history into a concise, factual running brief.
 
@@ -26,30 +30,74 @@ Guidelines:
 # Updated Running Summary:
 """)
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), cheap enough to run on every turn."""
+    return max(1, len(text) // 4)
+
+
+class Turn:
+    """One conversation turn; ``__slots__`` keeps long sessions compact."""
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+    def __repr__(self) -> str:
+        return f"Turn({self.role!r}, {self.content[:40]!r})"
+
+
 class MemoryManager:
     """
     Maintains a rolling running_summary plus a small recent window.
-    Periodically summarizes (using the provided LLM) to bound token growth.
+    Turns live in a bounded ring buffer; once the turns added since the last
+    summary exceed a token budget they are summarized (using the provided LLM)
+    and the buffer is trimmed to the recent window, bounding token growth.
     """
     def __init__(
         self,
         llm,
         memory_dir: str | Path,
         session_id: Optional[str] = None,
-        summarize_every_n: int = 6,
+        summarize_after_tokens: int = 1500,
         recent_window_n: int = 8,
+        max_turns: int = 64,
+        context_turns: int = 4,
         summary_file: str = "memory_summary.json",
+        episodic=None,
     ):
+        """
+        Args:
+            llm: Chat model used for summarization
+            memory_dir: Directory for the persisted summary
+            session_id: Optional session identifier stored with the summary
+            summarize_after_tokens: Summarize once unsummarized turns reach this many (estimated) tokens
+            recent_window_n: Turns kept verbatim after a summary
+            max_turns: Ring buffer capacity; a summary is forced before unsummarized turns would fall out
+            context_turns: Recent turns rendered into the memory block
+            summary_file: Summary file name inside ``memory_dir``
+            episodic: Optional EpisodicMemory; past turns and summaries are recalled by relevance
+        """
         self.llm = llm
         self.memory_dir = Path(memory_dir)
         self.memory_dir.mkdir(parents=True, exist_ok=True)
         self.session_id = session_id 
-        self.summarize_every_n = summarize_every_n
+        self.summarize_after_tokens = summarize_after_tokens
         self.recent_window_n = recent_window_n
+        self.max_turns = max(max_turns, recent_window_n + 2)
+        self.context_turns = context_turns
         self.summary_path = self.memory_dir / summary_file
+        self.episodic = episodic
 
         self.running_summary: str = ""
-        self.turns: List[Dict[str, str]] = []  # [{role: "user"/"assistant", "content": "..."}]
+        self.turns: Deque[Turn] = deque(maxlen=self.max_turns)
+        self.user_turns = 0  # monotonic, survives compaction
+        self._pending_turns = 0  # turns added since the last summary
+        self._pending_tokens = 0
+        self._context: Optional[str] = None  # rendered memory block, dropped on every change
+        self._sections: Dict[str, str] = {}  # its rendered "summary"/"recent" sections
+        self._summaries = 0
         self._load_summary()
 
         self.summarize_chain = SUMMARY_PROMPT | self.llm | StrOutputParser()
@@ -73,38 +121,80 @@ class MemoryManager:
         }
         self.summary_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
 
+    def _append(self, role: str, text: str) -> None:
+        turn = Turn(role, text)
+        self.turns.append(turn)
+        self._pending_turns = min(self._pending_turns + 1, len(self.turns))
+        self._pending_tokens += turn.tokens
+        self._context = None
+
+    def _should_summarize(self) -> bool:
+        # Token budget, or the next two turns would push unsummarized ones out of the ring buffer
+        return self._pending_tokens >= self.summarize_after_tokens or self._pending_turns >= self.max_turns - 2
+
     def _summarize_and_compact(self) -> None:
-        recent = self.turns[-self.recent_window_n:]
+        new_turns = self.recent_turns(self._pending_turns)
         new_turns_text = "\n".join(
-            f"- {t['role']}: {t['content'][:800]}" for t in reversed(recent)
+            f"- {t.role}: {t.content[:800]}" for t in reversed(new_turns)
         )
-        updated_summary = self.summarize_chain.invoke({
-            "existing_summary": self.running_summary or "(none yet)",
-            "new_turns": new_turns_text or "(no new turns)",
-        })
+        with stage_timer("summarize"):
+            updated_summary = self.summarize_chain.invoke({
+                "existing_summary": self.running_summary or "(none yet)",
+                "new_turns": new_turns_text or "(no new turns)",
+            })
+        if self.episodic is not None and self.running_summary:
+            # The old brief is about to be rewritten; keep it recallable
+            self._summaries += 1
+            self.episodic.add(f"summary_{self._summaries}", f"[earlier summary]\n{self.running_summary}", self.user_turns)
         self.running_summary = updated_summary.strip()
-        self.turns = recent[:]  # retain only small window
+        while len(self.turns) > self.recent_window_n:  # retain only small window
+            self.turns.popleft()
+        self._pending_turns = 0
+        self._pending_tokens = 0
+        self._context = None
         self._persist_summary()
 
     # ---------------- public ----------------
     def add_user_turn(self, text: str) -> None:
-        self.turns.append({"role": "user", "content": text})
+        self._append("user", text)
+        self.user_turns += 1
 
     def add_assistant_turn(self, text: str) -> None:
-        self.turns.append({"role": "assistant", "content": text})
-        if len(self.turns) % self.summarize_every_n == 0:
+        self._append("assistant", text)
+        if self.episodic is not None:
+            question = self.turns[-2].content if len(self.turns) > 1 and self.turns[-2].role == "user" else ""
+            self.episodic.add(f"turn_{self.user_turns}", f"user: {question}\nassistant: {text}", self.user_turns)
+        if self._should_summarize():
             self._summarize_and_compact()
 
-    def get_memory_context(self) -> str:
+    def recent_turns(self, n: int) -> List[Turn]:
+        """Last ``n`` turns, oldest first."""
+        if n <= 0:
+            return []
+        return list(islice(self.turns, max(len(self.turns) - n, 0), None))
+
+    def get_memory_context(self, query: Optional[str] = None) -> str:
         """
         Returns concise memory block for prompts:
         - Running summary (compact, always available)
+        - Earlier turns relevant to ``query`` (when episodic memory is enabled)
         - Last few turns (to preserve immediate local coherence)
+        The summary and recent turns are rendered once per change and reused until the next turn or summary.
         """
-        recent_lines = "\n".join(f"{t['role']}: {t['content']}" for t in self.turns[-4:])
-        memory = []
-        if self.running_summary:
-            memory.append(f"[Running Summary]\n{self.running_summary}")
-        if recent_lines:
-            memory.append(f"[Recent Turns]\n{recent_lines}")
-        return "\n\n".join(memory).strip()
+        if self._context is None:
+            recent_lines = "\n".join(f"{t.role}: {t.content}" for t in self.recent_turns(self.context_turns))
+            self._sections = {
+                "summary": f"[Running Summary]\n{self.running_summary}" if self.running_summary else "",
+                "recent": f"[Recent Turns]\n{recent_lines}" if recent_lines else "",
+            }
+            self._context = "\n\n".join(s for s in self._sections.values() if s).strip()
+        if self.episodic is None or not query:
+            return self._context
+
+        # Episodes from turns still shown verbatim are skipped
+        episodes = self.episodic.search(query, before_turn=self.user_turns - self.context_turns // 2 + 1)
+        if not episodes:
+            return self._context
+        recalled = "[Relevant Earlier Turns]\n" + "\n---\n".join(episodes)
+        parts = (self._sections["summary"], recalled, self._sections["recent"])
+        return "\n\n".join(s for s in parts if s).strip()
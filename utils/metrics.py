@@ -0,0 +1,314 @@
+# metrics.py
+"""
+In-process metrics with a Prometheus text surface, plus an opt-in profiler for slow requests.
+
+Stages are timed with time.perf_counter (monotonic) via ``stage_timer`` and
+recorded into a process-wide registry. The registry can be scraped over HTTP
+(``start_metrics_server``) or written to a text file (``MetricsRegistry.dump``).
+"""
+
+import cProfile
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond index lookups to slow LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, labels: Optional[Dict[str, str]] = None) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (queue depth, lag)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        self.inc(-amount, labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (seconds by convention)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, labels: Optional[Dict[str, str]] = None) -> int:
+        series = self._series.get(_label_key(labels))
+        return int(series[-2]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {int(count)}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {int(series[-2])}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]!r}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {int(series[-2])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of counters, gauges and histograms."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} already registered as {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str | Path) -> None:
+        """Write the Prometheus text rendering to ``path``."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.render_prometheus(), encoding="utf-8")
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("rag_stage_duration_seconds", "Duration of pipeline stages")
+STAGE_ERRORS = REGISTRY.counter("rag_stage_errors_total", "Stage executions that raised")
+REQUESTS = REGISTRY.counter("rag_requests_total", "Completed assistant requests")
+EMPTY_RETRIEVALS = REGISTRY.counter("rag_empty_retrievals_total", "Requests whose retrieval returned no chunks")
+
+
+class StageTimer:
+    """Handle yielded by ``stage_timer``; ``elapsed`` is set on exit (seconds)."""
+
+    __slots__ = ("stage", "start", "elapsed")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.start = time.perf_counter()
+        self.elapsed: Optional[float] = None
+
+
+@contextmanager
+def stage_timer(stage: str, registry_histogram: Histogram = STAGE_SECONDS) -> Iterator[StageTimer]:
+    """
+    Time a block with a monotonic clock and record it under ``stage``.
+
+    Args:
+        stage: Stage label (e.g. "embed", "index_query", "llm")
+        registry_histogram: Histogram to record into
+
+    Yields:
+        StageTimer whose ``elapsed`` is populated when the block exits
+    """
+    timer = StageTimer(stage)
+    try:
+        yield timer
+    except Exception:
+        STAGE_ERRORS.inc(labels={"stage": stage})
+        raise
+    finally:
+        timer.elapsed = time.perf_counter() - timer.start
+        registry_histogram.observe(timer.elapsed, labels={"stage": stage})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):  # noqa: N802 (http.server API)
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # keep scrapes out of stderr
+        return
+
+
+_SERVERS: Dict[Tuple[str, int], ThreadingHTTPServer] = {}
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serve ``registry`` at http://<host>:<port>/metrics from a daemon thread.
+
+    Calling it again for the same address returns the running server, so module
+    re-imports (e.g. Streamlit reruns) do not fail on the bound port.
+    """
+    address = (host, port)
+    if address in _SERVERS:
+        return _SERVERS[address]
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer(address, handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    _SERVERS[address] = server
+    return server
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in profiler that keeps profiles only for slow requests.
+
+    A ``sample_rate`` fraction of requests run under cProfile (or pyinstrument,
+    if selected and installed); when a request exceeds ``slow_request_ms`` its
+    profile is written to ``output_dir``. Only one request is profiled at a time.
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        enabled: bool = False,
+        sample_rate: float = 1.0,
+        slow_request_ms: float = 2000.0,
+        engine: str = "cprofile",
+    ):
+        self.output_dir = Path(output_dir)
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+        self.engine = engine
+        self._busy = threading.Lock()
+
+    @contextmanager
+    def profile(self, request_id: str) -> Iterator[None]:
+        """Profile the enclosed block if sampled; keep the result if it was slow."""
+        if not self.enabled or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+
+        try:
+            profiler = self._start()
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self._stop(profiler, request_id, elapsed_ms)
+        finally:
+            self._busy.release()
+
+    def _start(self):
+        if self.engine == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self.engine = "cprofile"
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop(self, profiler, request_id: str, elapsed_ms: float) -> None:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if elapsed_ms < self.slow_request_ms:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.output_dir / f"{int(time.time())}_{request_id}_{elapsed_ms:.0f}ms"
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(f"{stem}.prof")
+        else:
+            Path(f"{stem}.html").write_text(profiler.output_html(), encoding="utf-8")
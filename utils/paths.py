@@ -10,6 +10,15 @@ OUTPUTS_DIR = os.path.join(ROOT_DIR, "outputs")
 
 DATA_DIR = os.path.join(ROOT_DIR, "data")
 
+# Memory-mapped collection snapshots (see utils/index_export.py)
+EXPORT_DIR = os.path.join(DATA_DIR, "export")
+
+# Alias -> versioned collection pointers (see utils/collection_versions.py)
+COLLECTION_ALIASES_FPATH = os.path.join(DATA_DIR, "collection_aliases.json")
+
+# Unix socket of the shared embedding server (see utils/embedding_service.py)
+EMBEDDING_SOCKET_PATH = os.path.join(DATA_DIR, "embedding.sock")
+
 DOCUMENT_DIR = os.path.join(ROOT_DIR, "documents")
 
 # Evaluation paths
@@ -0,0 +1,289 @@
+# pipeline.py
+"""
+Query pipeline shared by the CLI, the Streamlit UI and the evaluator.
+
+A request flows through an ordered list of named stages that read and write a
+per-request ``QueryState``. Each stage is timed (and recorded in the metrics
+registry); the pipeline then logs, traces and returns a ``PipelineResult``.
+New behaviour (caching, rewriting, routing, ...) is added by inserting stages
+rather than by editing each front end.
+"""
+
+import uuid
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from utils.log_utils import extract_prompt_cache_usage
+from utils.metrics import REQUESTS, EMPTY_RETRIEVALS, STAGE_SECONDS, stage_timer
+
+
+@dataclass
+class QueryState:
+    """Mutable state for one request, passed to every stage."""
+    request_id: str
+    session_id: str
+    question: str
+    n_results: int
+    threshold: float
+    documents: List[str] = field(default_factory=list)
+    doc_ids: List[str] = field(default_factory=list)
+    distances: List[float] = field(default_factory=list)
+    context: str = ""
+    memory_block: str = ""
+    search_query: Optional[str] = None  # set by a rewrite stage; defaults to the question
+    question_embedding: Any = None  # normalized question vector from a router; reused by retrieval
+    prompt_value: Any = None
+    answer: Optional[str] = None
+    short_circuit: bool = False  # set by a stage that produced the final answer early
+    skip_stages: Set[str] = field(default_factory=set)  # stages a router decided this request does not need
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per stage
+    trace_fields: Dict[str, Any] = field(default_factory=dict)  # extra fields for the invoke trace
+
+
+@dataclass
+class PipelineResult:
+    """Structured outcome of a request, consumed by every front end."""
+    request_id: str
+    question: str
+    answer: str
+    documents: List[str]
+    doc_ids: List[str]
+    distances: List[float]
+    memory_block: str
+    n_results: int
+    threshold: float
+    timings: Dict[str, float]
+    trace_fields: Dict[str, Any]
+
+    @property
+    def retrieval_latency(self) -> float:
+        return self.timings.get("retrieval", 0.0)
+
+    @property
+    def llm_latency(self) -> float:
+        return self.timings.get("llm", 0.0)
+
+    @property
+    def total_latency(self) -> float:
+        return self.timings.get("total", 0.0)
+
+
+@dataclass
+class PipelineStage:
+    """A named step; ``always`` stages still run after a short circuit."""
+    name: str
+    fn: Callable[[QueryState], None]
+    always: bool = False
+
+
+class QueryPipeline:
+    """Runs a request through ordered stages, then logs and traces the result."""
+
+    def __init__(self, stages: List[PipelineStage], logger=None, profiler=None, scheduler=None):
+        """
+        Args:
+            stages: Ordered pipeline stages
+            logger: Optional logger for the per-request summary line
+            profiler: Optional SlowRequestProfiler wrapped around each request
+            scheduler: Optional QueryScheduler every request must be admitted by (utils/scheduler.py)
+        """
+        self.stages = list(stages)
+        self.logger = logger
+        self.profiler = profiler
+        self.scheduler = scheduler
+
+    def _index(self, name: str) -> int:
+        for i, stage in enumerate(self.stages):
+            if stage.name == name:
+                return i
+        raise KeyError(f"No pipeline stage named '{name}'")
+
+    def add_stage(self, stage: PipelineStage, before: Optional[str] = None, after: Optional[str] = None) -> None:
+        """Insert a stage before/after an existing one (or append)."""
+        if before is not None:
+            self.stages.insert(self._index(before), stage)
+        elif after is not None:
+            self.stages.insert(self._index(after) + 1, stage)
+        else:
+            self.stages.append(stage)
+
+    def replace_stage(self, stage: PipelineStage) -> None:
+        """Replace the stage with the same name."""
+        self.stages[self._index(stage.name)] = stage
+
+    def run(
+        self,
+        question: str,
+        session_id: str,
+        n_results: int,
+        threshold: float,
+        trace=None,
+        request_id: Optional[str] = None,
+        priority: Optional[str] = None,
+        deadline_seconds: Optional[float] = None,
+    ) -> PipelineResult:
+        """
+        Execute every stage for one question.
+
+        Args:
+            question: User's input
+            session_id: Trace/session identifier
+            n_results: Number of chunks to retrieve
+            threshold: Cosine distance threshold
+            trace: Optional JsonlTrace to write the invoke record to
+            request_id: Optional request ID (generated if omitted)
+            priority: Scheduler priority class (default: the highest)
+            deadline_seconds: Longest to wait for a scheduler slot (default: the scheduler's)
+
+        Returns:
+            PipelineResult with answer, contexts, distances and per-stage timings
+
+        Raises:
+            Overloaded: If the scheduler does not admit the request
+        """
+        state = QueryState(
+            request_id=request_id or uuid.uuid4().hex,
+            session_id=session_id,
+            question=question,
+            n_results=n_results,
+            threshold=threshold,
+        )
+
+        admission = self.scheduler.admit(session_id, priority, deadline_seconds) if self.scheduler else nullcontext()
+        with admission as ticket:
+            if ticket is not None:
+                state.timings["queue_wait"] = ticket.wait_seconds
+                STAGE_SECONDS.observe(ticket.wait_seconds, labels={"stage": "queue_wait"})
+            profile = self.profiler.profile(state.request_id) if self.profiler else None
+            with stage_timer("total") as total_timer:
+                if profile:
+                    profile.__enter__()
+                try:
+                    for stage in self.stages:
+                        if (state.short_circuit and not stage.always) or stage.name in state.skip_stages:
+                            continue
+                        with stage_timer(stage.name) as timer:
+                            stage.fn(state)
+                        state.timings[stage.name] = state.timings.get(stage.name, 0.0) + timer.elapsed
+                finally:
+                    if profile:
+                        profile.__exit__(None, None, None)
+        # End-to-end latency as the caller sees it, queueing included
+        state.timings["total"] = total_timer.elapsed + state.timings.get("queue_wait", 0.0)
+
+        REQUESTS.inc()
+        if "retrieval" in state.timings and not state.documents:
+            EMPTY_RETRIEVALS.inc()
+
+        result = PipelineResult(
+            request_id=state.request_id,
+            question=state.question,
+            answer=state.answer or "",
+            documents=state.documents,
+            doc_ids=state.doc_ids,
+            distances=state.distances,
+            memory_block=state.memory_block,
+            n_results=state.n_results,
+            threshold=state.threshold,
+            timings=state.timings,
+            trace_fields=state.trace_fields,
+        )
+        self._log(result, trace)
+        if trace is not None:
+            self._trace(result, state.session_id, trace)
+        return result
+
+    def _log(self, result: PipelineResult, trace) -> None:
+        if self.logger is None:
+            return
+        latency_info = ""
+        if trace is None or trace.log_latency:
+            latency_info = (
+                f" | retrieval={result.retrieval_latency*1000:.1f}ms | llm={result.llm_latency*1000:.1f}ms"
+                f" | total={result.total_latency*1000:.1f}ms"
+            )
+        self.logger.info(
+            f"[request_id={result.request_id}] Q len={len(result.question)} | ctx_docs={len(result.documents)}"
+            f" | A len={len(result.answer)}{latency_info}"
+        )
+
+    @staticmethod
+    def _trace(result: PipelineResult, session_id: str, trace) -> None:
+        trace.write_enhanced_invoke(
+            session_id=session_id,
+            request_id=result.request_id,
+            question=result.question,
+            answer=result.answer,
+            retrieved_docs=result.documents,
+            doc_ids=result.doc_ids if result.doc_ids else None,
+            distances=result.distances if result.distances else None,
+            retrieval_latency=result.timings.get("retrieval"),
+            llm_latency=result.timings.get("llm"),
+            total_latency=result.timings.get("total"),
+            memory_excerpt=result.memory_block,
+            stage_latencies=result.timings,
+            **result.trace_fields,
+        )
+
+
+def build_default_stages(vector_db, memory, prompt_template, llm, output_parser) -> List[PipelineStage]:
+    """
+    Standard RAG stages: record the user turn, retrieve, build memory, render, call the LLM, record the answer.
+
+    Args:
+        vector_db: VectorDB used for retrieval
+        memory: MemoryManager holding the conversation
+        prompt_template: Compiled RAG ChatPromptTemplate
+        llm: LangChain chat model
+        output_parser: Parser turning the LLM message into a string
+
+    Returns:
+        Ordered list of PipelineStage
+    """
+
+    def add_user_turn(state: QueryState) -> None:
+        memory.add_user_turn(state.question.strip())
+
+    def retrieve(state: QueryState) -> None:
+        query = state.search_query or state.question
+        # The router already embedded the question; only a rewritten query needs a new forward pass
+        embedding = state.question_embedding if query == state.question else None
+        retrieved = vector_db.search(
+            query=query, n_results=state.n_results, threshold=state.threshold, query_embedding=embedding
+        )
+        state.documents = retrieved.get("documents", []) if isinstance(retrieved, dict) else []
+        state.doc_ids = retrieved.get("ids", []) if isinstance(retrieved, dict) else []
+        state.distances = retrieved.get("distances", []) if isinstance(retrieved, dict) else []
+        # Empty context lets the prompt trigger "I don't know."
+        state.context = "\n\n".join(f"[{i+1}] {d}" for i, d in enumerate(state.documents))
+
+    def build_memory(state: QueryState) -> None:
+        state.memory_block = memory.get_memory_context(query=state.search_query or state.question)
+
+    def render_prompt(state: QueryState) -> None:
+        state.prompt_value = prompt_template.invoke({
+            "memory": state.memory_block,
+            "context": state.context,
+            "question": state.question,
+        })
+
+    def call_llm(state: QueryState) -> None:
+        message = llm.invoke(state.prompt_value)
+        state.answer = output_parser.invoke(message)
+        prompt_cache = extract_prompt_cache_usage(message)
+        if prompt_cache:
+            state.trace_fields["prompt_cache"] = prompt_cache
+
+    def add_assistant_turn(state: QueryState) -> None:
+        # Record assistant turn and maybe summarize/compact
+        memory.add_assistant_turn(state.answer or "")
+
+    return [
+        PipelineStage("add_user_turn", add_user_turn),
+        PipelineStage("retrieval", retrieve),
+        PipelineStage("memory_build", build_memory),
+        PipelineStage("prompt_render", render_prompt),
+        PipelineStage("llm", call_llm),
+        PipelineStage("add_assistant_turn", add_assistant_turn, always=True),
+    ]
@@ -2,7 +2,36 @@
 Prompt template construction functions for building modular prompts.
 """
 
-from typing import Union, List, Optional, Dict, Any
+import hashlib
+from pathlib import Path
+from typing import Union, List, Optional, Dict, Any, Tuple
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+# Static RAG policy appended to the configured system instructions. Together they
+# form the system message, which is byte-identical across requests so providers
+# can serve it from their prompt cache.
+RAG_POLICY = (
+    "You are a precise assistant. Use ONLY the provided Context and Memory when relevant.\n"
+    "If the answer is not in Context, and Memory doesn't contain the needed conversational detail, "
+    'say "I don\'t know."'
+)
+
+# Variable part of the prompt, rendered per request after the cached prefix.
+RAG_QUESTION_TEMPLATE = """# Memory (running summary + recent turns; use only if relevant)
+{memory}
+
+# Context
+{context}
+
+# Question
+{question}
+
+# Answer (concise and specific):"""
+
+# Compiled templates, keyed by (config-file sha256, prompt name)
+_COMPILED_TEMPLATES: Dict[Tuple[str, str], ChatPromptTemplate] = {}
 
 
 def lowercase_first_char(text: str) -> str:
@@ -92,6 +121,53 @@ def build_prompt_from_config(
     return "\n\n".join(prompt_parts)
 
 
+def file_sha256(file_path: Union[str, Path]) -> str:
+    """Returns the SHA-256 hex digest of a file's bytes.
+
+    Args:
+        file_path: Path to the file.
+
+    Returns:
+        Hex digest string.
+    """
+    return hashlib.sha256(Path(file_path).read_bytes()).hexdigest()
+
+
+def get_rag_prompt_template(
+    config_path: Union[str, Path],
+    prompt_name: str,
+) -> ChatPromptTemplate:
+    """Returns the compiled RAG prompt template, building it once per process.
+
+    The template is a static system message (configured instructions plus the
+    RAG policy) followed by a human message holding memory, context and question.
+    Compiled templates are cached by the hash of the config file, so edits to the
+    YAML are picked up while unchanged configs are never re-parsed.
+
+    Args:
+        config_path: Path to the prompt YAML config.
+        prompt_name: Top-level key of the prompt in the config.
+
+    Returns:
+        A ChatPromptTemplate expecting 'memory', 'context' and 'question'.
+    """
+    from utils.file_utils import load_yaml_config
+
+    cache_key = (file_sha256(config_path), prompt_name)
+    template = _COMPILED_TEMPLATES.get(cache_key)
+    if template is None:
+        prompt_config = load_yaml_config(config_path)[prompt_name]
+        system_prefix = f"{build_prompt_from_config(prompt_config)}\n\n{RAG_POLICY}"
+        # SystemMessage content is not treated as a template, so braces in the
+        # YAML cannot break formatting and the prefix is emitted verbatim.
+        template = ChatPromptTemplate.from_messages([
+            SystemMessage(content=system_prefix),
+            ("human", RAG_QUESTION_TEMPLATE),
+        ])
+        _COMPILED_TEMPLATES[cache_key] = template
+    return template
+
+
 def print_prompt_preview(prompt: str, max_length: int = 500) -> None:
     """Prints a preview of the constructed prompt for debugging purposes.
 
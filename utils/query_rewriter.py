@@ -0,0 +1,149 @@
+# query_rewriter.py
+"""
+Condenses conversational follow-ups into standalone search queries.
+
+"What about the Roth version?" embeds poorly on its own; rewritten with the
+recent turns ("Roth IRA contribution limits") it retrieves the right chunks.
+Self-contained questions are detected heuristically and passed through
+untouched, so most requests pay nothing. Rewrites are cached per session,
+normalized question and the history shown to the model, so asking the same
+follow-up against the same recent turns (e.g. a Streamlit rerun) does not call
+the model again.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from utils.memory_utils import Turn
+from utils.metrics import REGISTRY
+from utils.pipeline import PipelineStage, QueryState
+
+REWRITE_PROMPT = ChatPromptTemplate.from_template("""
+Rewrite the follow-up question as a standalone search query using the conversation.
+Resolve pronouns and references ("it", "that one", "the Roth version") to the entities they mean.
+Keep the user's wording where possible. Return only the rewritten query, nothing else.
+
+# Conversation (oldest first)
+{history}
+
+# Follow-up question
+{question}
+
+# Standalone query:
+""")
+
+# Words that usually point back at earlier turns
+REFERENCE_WORDS = frozenset(
+    "it its it's they them their theirs this that these those he him his she her there one ones former latter "
+    "same other another above previous earlier".split()
+)
+FOLLOW_UP_PREFIXES = ("what about", "how about", "and ", "also", "what else", "why not", "then ", "so ", "but ")
+WORD_PATTERN = re.compile(r"[a-z']+")
+
+REWRITES = REGISTRY.counter("rag_query_rewrites_total", "Query condensation outcomes")
+
+
+def looks_self_contained(question: str, short_question_words: int = 4) -> bool:
+    """
+    Heuristic: True if the question can be searched as is.
+
+    Follow-ups are short, start with a connector ("what about ...") or refer
+    back with pronouns/demonstratives.
+    """
+    text = question.strip().lower()
+    words = WORD_PATTERN.findall(text)
+    if len(words) <= short_question_words:
+        return False
+    if text.startswith(FOLLOW_UP_PREFIXES):
+        return False
+    return not any(word in REFERENCE_WORDS for word in words)
+
+
+class QueryRewriter:
+    """Optional query-condensation stage placed before retrieval."""
+
+    def __init__(
+        self,
+        llm=None,
+        mode: str = "llm",
+        max_history_turns: int = 4,
+        cache_size: int = 1024,
+    ):
+        """
+        Args:
+            llm: Chat model used for rewrites (a cheap one is enough); required for mode="llm"
+            mode: "llm" (model rewrite) or "heuristic" (prefix the previous user question)
+            max_history_turns: Recent turns shown to the model
+            cache_size: Rewrites kept in the LRU cache
+        """
+        if mode not in ("llm", "heuristic"):
+            raise ValueError(f"Unsupported rewrite mode: {mode}")
+        if mode == "llm" and llm is None:
+            raise ValueError("mode='llm' requires an llm")
+        self.mode = mode
+        self.max_history_turns = max_history_turns
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self.chain = REWRITE_PROMPT | llm | StrOutputParser() if llm is not None else None
+
+    @staticmethod
+    def _history_text(history: List[Turn]) -> str:
+        return "\n".join(f"{t.role}: {t.content[:500]}" for t in history)
+
+    def _rewrite(self, question: str, history: List[Turn]) -> str:
+        if self.mode == "heuristic":
+            previous = next((t.content for t in reversed(history) if t.role == "user"), "")
+            return f"{previous} {question}".strip()
+        history_text = self._history_text(history)
+        rewritten = self.chain.invoke({"history": history_text, "question": question}).strip()
+        # Guard against chatty outputs: keep the first line, fall back to the original
+        return rewritten.splitlines()[0].strip().strip('"') if rewritten else question
+
+    def rewrite(self, question: str, history: List[Turn], session_id: str) -> Dict[str, object]:
+        """
+        Standalone query for ``question``.
+
+        Args:
+            question: Current user question
+            history: Prior turns, oldest first (without the current question)
+            session_id: Session identifier (cache key)
+
+        Returns:
+            {"query": str, "rewritten": bool, "cached": bool, "reason": str}
+        """
+        if not history:
+            return {"query": question, "rewritten": False, "cached": False, "reason": "first_turn"}
+        if looks_self_contained(question):
+            return {"query": question, "rewritten": False, "cached": False, "reason": "self_contained"}
+
+        history = history[-self.max_history_turns:]
+        # Key on what the model sees, not on the turn counter (which changes every request)
+        history_hash = hashlib.sha1(self._history_text(history).encode("utf-8")).hexdigest()
+        key = (session_id, " ".join(question.lower().split()), history_hash)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return {"query": self._cache[key], "rewritten": True, "cached": True, "reason": "follow_up"}
+
+        query = self._rewrite(question, history) or question
+        self._cache[key] = query
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return {"query": query, "rewritten": True, "cached": False, "reason": "follow_up"}
+
+    def stage(self, memory) -> PipelineStage:
+        """Pipeline stage that sets ``state.search_query`` (insert it before "retrieval")."""
+
+        def rewrite(state: QueryState) -> None:
+            # The current question is already the last recorded turn
+            history = memory.recent_turns(self.max_history_turns + 1)[:-1]
+            outcome = self.rewrite(state.question, history, state.session_id)
+            state.search_query = outcome["query"]
+            REWRITES.inc(labels={"outcome": "cached" if outcome["cached"] else outcome["reason"]})
+            state.trace_fields["rewrite"] = outcome
+
+        return PipelineStage("rewrite", rewrite)
@@ -0,0 +1,110 @@
+# retrieval_cache.py
+"""
+LRU cache of search results, invalidated by a collection generation counter.
+
+Entries map (normalized query, search settings) to the result's IDs and
+distances; the texts live once in a shared, reference-counted chunk store, so
+a chunk returned for many queries is held once. VectorDB bumps its generation
+on every write (add_documents, replace_document, alias switch) and calls
+invalidate(); entries from another generation never match, so a cached result
+is always exactly what the current collection would return.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from utils.metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter("rag_retrieval_cache_lookups_total", "Retrieval cache lookups by result (hit/miss)")
+CACHE_CHUNKS = REGISTRY.gauge("rag_retrieval_cache_chunks", "Distinct chunk texts held by the retrieval cache")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as the cache key."""
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+def _document_keys(result: Dict[str, Any]) -> List[str]:
+    # A merged span's text differs from its first chunk's, so it is stored under all its chunk IDs
+    if "merged_ids" in result:
+        return ["|".join(chunk_ids) for chunk_ids in result["merged_ids"]]
+    return list(result["ids"])
+
+
+class RetrievalCache:
+    """Bounded, thread-safe LRU of search results tagged with the collection generation."""
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: Cached results kept before the least recently used is evicted
+        """
+        self.max_entries = max(1, max_entries)
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, Dict[str, Any], List[str]]]" = OrderedDict()
+        self._texts: Dict[str, str] = {}
+        self._refs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, generation: int) -> Optional[Dict[str, Any]]:
+        """
+        Cached result for ``key`` if it was stored for ``generation``.
+
+        Returns:
+            A fresh result dictionary (safe to mutate), or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                CACHE_LOOKUPS.inc(labels={"result": "miss"})
+                return None
+            self._entries.move_to_end(key)
+            _, fields, doc_keys = entry
+            result = {name: list(values) for name, values in fields.items()}
+            result["documents"] = [self._texts[doc_key] for doc_key in doc_keys]
+        CACHE_LOOKUPS.inc(labels={"result": "hit"})
+        return result
+
+    def put(self, key: Hashable, generation: int, result: Dict[str, Any]) -> None:
+        """
+        Store a search result computed against ``generation``.
+
+        Results from an older generation (a write happened meanwhile) are dropped.
+        """
+        doc_keys = _document_keys(result)
+        fields = {name: list(values) for name, values in result.items() if name != "documents"}
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._release(self._entries.pop(key)[2])
+            for doc_key, text in zip(doc_keys, result["documents"]):
+                self._texts.setdefault(doc_key, text)
+                self._refs[doc_key] = self._refs.get(doc_key, 0) + 1
+            self._entries[key] = (generation, fields, doc_keys)
+            while len(self._entries) > self.max_entries:
+                self._release(self._entries.popitem(last=False)[1][2])
+            CACHE_CHUNKS.set(len(self._texts))
+
+    def _release(self, doc_keys: List[str]) -> None:
+        for doc_key in doc_keys:
+            self._refs[doc_key] -= 1
+            if self._refs[doc_key] == 0:
+                del self._refs[doc_key]
+                del self._texts[doc_key]
+
+    def invalidate(self, generation: int) -> None:
+        """Drop every entry and accept only results computed against ``generation`` from now on."""
+        with self._lock:
+            self.generation = generation
+            self._entries.clear()
+            self._texts.clear()
+            self._refs.clear()
+            CACHE_CHUNKS.set(0)
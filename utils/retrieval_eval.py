@@ -0,0 +1,136 @@
+"""
+Helpers for offline retrieval benchmarks: evaluation questions, recall and latency summaries.
+"""
+
+import json
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.paths import EVALUATION_CASES_PATH
+
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were with".split()
+)
+
+
+def load_evaluation_cases(
+    path: Union[str, Path] = EVALUATION_CASES_PATH,
+    max_cases: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """Loads the evaluation cases (dicts with "Question" and "Answer").
+
+    Args:
+        path: Path to rag_evaluation_cases.json.
+        max_cases: Optional limit on the number of cases.
+
+    Returns:
+        List of case dictionaries.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    if max_cases is not None and max_cases > 0:
+        cases = cases[:max_cases]
+    return cases
+
+
+def load_evaluation_questions(
+    path: Union[str, Path] = EVALUATION_CASES_PATH,
+    max_cases: Optional[int] = None,
+) -> List[str]:
+    """Loads the questions from the evaluation cases file.
+
+    Args:
+        path: Path to rag_evaluation_cases.json.
+        max_cases: Optional limit on the number of questions.
+
+    Returns:
+        List of question strings.
+    """
+    return [case["Question"] for case in load_evaluation_cases(path, max_cases)]
+
+
+def answer_coverage(answer: str, contexts: Sequence[str]) -> float:
+    """Fraction of the reference answer's content words that appear in the retrieved contexts.
+
+    A label-free proxy for context recall, used to compare two indexes on the
+    same questions (e.g. before switching embedding model or chunker).
+
+    Args:
+        answer: Reference answer.
+        contexts: Retrieved chunk texts.
+
+    Returns:
+        Coverage in [0, 1] (1.0 if the answer has no content words).
+    """
+    answer_words = set(WORD_PATTERN.findall(answer.lower())) - STOPWORDS
+    if not answer_words:
+        return 1.0
+    context_words = set(WORD_PATTERN.findall(" ".join(contexts).lower()))
+    return len(answer_words & context_words) / len(answer_words)
+
+
+def recall_at_k(reference_ids: Sequence[Sequence[str]], candidate_ids: Sequence[Sequence[str]]) -> float:
+    """Mean fraction of the reference top-k IDs that the candidate also returned.
+
+    Args:
+        reference_ids: Per-query ground-truth IDs (e.g. from exact search).
+        candidate_ids: Per-query IDs returned by the method under test.
+
+    Returns:
+        Recall in [0, 1], averaged over queries with a non-empty reference.
+    """
+    recalls = [
+        len(set(ref) & set(cand)) / len(ref)
+        for ref, cand in zip(reference_ids, candidate_ids)
+        if len(ref) > 0
+    ]
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, float]:
+    """Summarizes latency samples (seconds) as milliseconds.
+
+    Args:
+        samples: Latency samples in seconds.
+
+    Returns:
+        Dictionary with mean, p50, p95 and p99 in milliseconds.
+    """
+    if len(samples) == 0:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+    }
+
+
+def time_calls(fn: Callable, items: Sequence, repeat: int = 1) -> Tuple[List[float], List]:
+    """Calls ``fn`` on every item ``repeat`` times, timing each call.
+
+    Args:
+        fn: Callable taking one item.
+        items: Inputs to call ``fn`` with.
+        repeat: Number of passes over ``items``.
+
+    Returns:
+        (latencies in seconds, outputs of the last pass).
+    """
+    latencies: List[float] = []
+    outputs: List = []
+    for _ in range(repeat):
+        outputs = []
+        for item in items:
+            start = time.perf_counter()
+            outputs.append(fn(item))
+            latencies.append(time.perf_counter() - start)
+    return latencies, outputs
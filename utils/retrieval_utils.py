@@ -0,0 +1,237 @@
+"""
+Post-retrieval helpers for deduplicating and diversifying search results.
+
+These operate on results that were already returned by the vector store
+(ids, documents, distances and embeddings), so they add no extra round trips.
+"""
+
+import hashlib
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHUNK_ID_SEPARATOR = "_chunk_"
+
+
+def source_chunk_ids(source: str, n_chunks: int) -> List[str]:
+    """Stable chunk IDs for a source file: "doc_<sha1(source)[:16]>_chunk_<i>".
+
+    Args:
+        source: Source path or file name.
+        n_chunks: Number of chunks.
+
+    Returns:
+        Chunk IDs in chunk order.
+    """
+    doc_id = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    return [f"doc_{doc_id}{CHUNK_ID_SEPARATOR}{i}" for i in range(n_chunks)]
+
+
+def parse_chunk_id(chunk_id: str) -> Tuple[str, Optional[int]]:
+    """Splits a chunk ID such as "doc_3_chunk_4" into its source key and index.
+
+    Args:
+        chunk_id: Chunk identifier.
+
+    Returns:
+        A (source_key, chunk_index) tuple. The index is None when the ID does
+        not follow the "<source>_chunk_<n>" convention.
+    """
+    source, sep, index = chunk_id.rpartition(CHUNK_ID_SEPARATOR)
+    if not sep or not index.isdigit():
+        return chunk_id, None
+    return source, int(index)
+
+
+def merge_overlapping_text(left: str, right: str, max_overlap: int = 200) -> str:
+    """Joins two consecutive chunks, dropping the text they share.
+
+    Args:
+        left: Earlier chunk.
+        right: Later chunk.
+        max_overlap: Largest overlap (in characters) to look for.
+
+    Returns:
+        The merged span. Chunks without a textual overlap are joined with a newline.
+    """
+    limit = min(max_overlap, len(left), len(right))
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def merge_adjacent_chunks(
+    ids: List[str],
+    documents: List[str],
+    distances: List[float],
+    embeddings: Optional[np.ndarray] = None,
+    max_overlap: int = 200,
+) -> Dict[str, Any]:
+    """Merges adjacent chunks from the same source into a single span.
+
+    Chunks are grouped when they share a source key and their chunk indices are
+    consecutive. Each span keeps the best (lowest) distance of its members and,
+    when embeddings are given, the re-normalized mean of their embeddings.
+
+    Args:
+        ids: Chunk IDs as returned by the vector store.
+        documents: Chunk texts, aligned with ``ids``.
+        distances: Cosine distances, aligned with ``ids``.
+        embeddings: Optional (n, dim) array of chunk embeddings.
+        max_overlap: Largest textual overlap to strip when joining chunks.
+
+    Returns:
+        Dictionary with keys 'ids', 'documents', 'distances', 'embeddings' and
+        'merged_ids', ordered by ascending distance. 'ids' holds the first chunk
+        of each span and 'merged_ids' lists every chunk the span covers.
+    """
+    n = len(ids)
+    if n == 0:
+        return {"ids": [], "documents": [], "distances": [], "embeddings": embeddings, "merged_ids": []}
+
+    parsed = [parse_chunk_id(chunk_id) for chunk_id in ids]
+    _, source_codes = np.unique([source for source, _ in parsed], return_inverse=True)
+    chunk_index = np.array([index if index is not None else -1 for _, index in parsed], dtype=np.int64)
+    has_index = np.array([index is not None for _, index in parsed])
+    dist = np.asarray(distances, dtype=np.float64)
+
+    order = np.lexsort((chunk_index, source_codes))
+    sorted_sources = source_codes[order]
+    sorted_index = chunk_index[order]
+    sorted_has_index = has_index[order]
+    # A new span starts wherever the source changes or the chunk index is not consecutive.
+    # Chunks whose ID carries no index never merge.
+    breaks = np.ones(n, dtype=bool)
+    breaks[1:] = (
+        (sorted_sources[1:] != sorted_sources[:-1])
+        | (sorted_index[1:] - sorted_index[:-1] != 1)
+        | ~sorted_has_index[1:]
+        | ~sorted_has_index[:-1]
+    )
+    span_of_sorted = np.cumsum(breaks) - 1
+    n_spans = int(span_of_sorted[-1]) + 1
+
+    span_distance = np.full(n_spans, np.inf)
+    np.minimum.at(span_distance, span_of_sorted, dist[order])
+
+    span_embeddings = None
+    if embeddings is not None and len(embeddings) == n:
+        normed = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        summed = np.zeros((n_spans, normed.shape[1]), dtype=np.float32)
+        np.add.at(summed, span_of_sorted, normed[order])
+        span_embeddings = _normalize_rows(summed)
+
+    span_ids: List[List[str]] = [[] for _ in range(n_spans)]
+    span_texts: List[Optional[str]] = [None] * n_spans
+    for pos, original in enumerate(order):
+        span = span_of_sorted[pos]
+        span_ids[span].append(ids[original])
+        text = documents[original]
+        span_texts[span] = text if span_texts[span] is None else merge_overlapping_text(
+            span_texts[span], text, max_overlap
+        )
+
+    ranked = np.argsort(span_distance, kind="stable")
+    return {
+        "ids": [span_ids[s][0] for s in ranked],
+        "documents": [span_texts[s] for s in ranked],
+        "distances": [float(span_distance[s]) for s in ranked],
+        "embeddings": span_embeddings[ranked] if span_embeddings is not None else None,
+        "merged_ids": [span_ids[s] for s in ranked],
+    }
+
+
+def mmr_select(
+    query_embedding: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """Selects k diverse candidates with Maximal Marginal Relevance.
+
+    Args:
+        query_embedding: Query vector of shape (dim,).
+        embeddings: Candidate vectors of shape (n, dim).
+        k: Number of candidates to select.
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0).
+
+    Returns:
+        Indices into ``embeddings`` in selection order.
+    """
+    n = len(embeddings)
+    if n == 0 or k <= 0:
+        return []
+
+    candidates = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+
+    return selected
+
+
+def adaptive_k(
+    distances: Sequence[float],
+    min_k: int = 1,
+    max_k: int = 8,
+    method: str = "gap",
+    min_gap: float = 0.05,
+    min_relative_score: float = 0.85,
+) -> int:
+    """Picks how many results to keep from the shape of the distance curve.
+
+    "gap" cuts at the largest jump between consecutive distances (if it is at
+    least ``min_gap``; a flat curve keeps everything). "relative" keeps results
+    whose similarity (1 - distance) is at least ``min_relative_score`` of the
+    best one. A narrow question with one clear match keeps few chunks; a broad
+    question with many similar matches keeps more.
+
+    Args:
+        distances: Cosine distances sorted ascending.
+        min_k: Fewest results to keep (when available).
+        max_k: Most results to keep.
+        method: "gap" or "relative".
+        min_gap: Smallest distance jump treated as a cliff ("gap").
+        min_relative_score: Similarity ratio to the best result ("relative").
+
+    Returns:
+        Number of leading results to keep.
+    """
+    d = np.asarray(distances, dtype=np.float64)[:max_k]
+    if len(d) <= min_k:
+        return len(d)
+    if method == "gap":
+        gaps = np.diff(d)[min_k - 1:] if min_k > 0 else np.diff(d)
+        if len(gaps) == 0:
+            return len(d)
+        cut = int(np.argmax(gaps))
+        return cut + max(min_k, 1) if gaps[cut] >= min_gap else len(d)
+    if method == "relative":
+        similarity = 1.0 - d
+        if similarity[0] <= 0:
+            return min_k
+        keep = int(np.count_nonzero(similarity >= min_relative_score * similarity[0]))
+        return max(min_k, keep)
+    raise ValueError(f"Unsupported adaptive_k method: {method}")
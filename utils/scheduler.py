@@ -0,0 +1,182 @@
+# scheduler.py
+"""
+Admission control in front of the query pipeline.
+
+At most ``max_concurrency`` requests run at once; the rest wait in per-session
+FIFO queues. When a slot frees up, the next request is taken from the highest
+priority class that has waiters, round-robin across that class's sessions, so
+one client sending a burst cannot starve the others. A request is rejected
+up front (``Overloaded``) when the queue is full or when its estimated queue
+wait alone would exceed its deadline, and it gives up if the deadline passes
+while it is still queued; under overload, failing fast keeps latency bounded
+for the requests that are admitted.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Sequence
+
+from utils.metrics import REGISTRY
+
+QUEUE_DEPTH = REGISTRY.gauge("rag_scheduler_queue_depth", "Requests waiting for a slot")
+ACTIVE = REGISTRY.gauge("rag_scheduler_active", "Requests currently running")
+REJECTED = REGISTRY.counter("rag_scheduler_rejected_total", "Requests rejected by admission control, by reason")
+QUEUE_WAIT = REGISTRY.histogram("rag_scheduler_queue_wait_seconds", "Time admitted requests waited for a slot")
+
+DEFAULT_PRIORITIES = ("interactive", "batch")
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, reason: str, estimated_wait: Optional[float] = None):
+        self.reason = reason
+        self.estimated_wait = estimated_wait
+        detail = f" (estimated wait {estimated_wait:.2f}s)" if estimated_wait is not None else ""
+        super().__init__(f"Request rejected: {reason}{detail}")
+
+
+class _Ticket:
+    __slots__ = ("session_id", "priority", "enqueued", "granted", "wait_seconds")
+
+    def __init__(self, session_id: str, priority: str):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+        self.granted = threading.Event()
+        self.wait_seconds = 0.0
+
+
+class QueryScheduler:
+    """Global concurrency limit with per-session round-robin queues and priority classes."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 64,
+        default_deadline_seconds: Optional[float] = None,
+        priorities: Sequence[str] = DEFAULT_PRIORITIES,
+        service_time_seconds: float = 2.0,
+    ):
+        """
+        Args:
+            max_concurrency: Requests allowed to run at once
+            max_queue: Waiting requests allowed before new ones are rejected
+            default_deadline_seconds: Longest a request may wait for a slot (None = no limit)
+            priorities: Priority classes, highest first
+            service_time_seconds: Initial estimate of one request's duration (then learned as a moving average)
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.default_deadline_seconds = default_deadline_seconds
+        self.priorities = list(priorities)
+        self.service_time = service_time_seconds
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in self.priorities}
+        self._queued = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _estimated_wait(self, priority: str) -> float:
+        # Requests at this or a higher priority are served first; slots free up max_concurrency at a time
+        rank = self.priorities.index(priority)
+        ahead = sum(
+            len(tickets) for p in self.priorities[:rank + 1] for tickets in self._queues[p].values()
+        )
+        return (ahead // self.max_concurrency + 1) * self.service_time
+
+    def _dispatch(self) -> None:
+        # Caller holds the lock
+        while self._active < self.max_concurrency and self._queued:
+            for priority in self.priorities:
+                sessions = self._queues[priority]
+                if sessions:
+                    session_id, tickets = next(iter(sessions.items()))
+                    ticket = tickets.popleft()
+                    if tickets:
+                        sessions.move_to_end(session_id)  # next session's turn
+                    else:
+                        del sessions[session_id]
+                    break
+            self._queued -= 1
+            self._active += 1
+            ticket.wait_seconds = time.perf_counter() - ticket.enqueued
+            ticket.granted.set()
+        QUEUE_DEPTH.set(self._queued)
+        ACTIVE.set(self._active)
+
+    def _remove(self, ticket: _Ticket) -> bool:
+        # Caller holds the lock; False if the ticket was already dispatched
+        tickets = self._queues[ticket.priority].get(ticket.session_id)
+        if tickets is None or ticket not in tickets:
+            return False
+        tickets.remove(ticket)
+        if not tickets:
+            del self._queues[ticket.priority][ticket.session_id]
+        self._queued -= 1
+        QUEUE_DEPTH.set(self._queued)
+        return True
+
+    def _reject(self, reason: str, estimated_wait: Optional[float] = None) -> None:
+        REJECTED.inc(labels={"reason": reason})
+        raise Overloaded(reason, estimated_wait)
+
+    @contextmanager
+    def admit(
+        self,
+        session_id: str,
+        priority: Optional[str] = None,
+        deadline_seconds: Optional[float] = None,
+    ) -> Iterator[_Ticket]:
+        """
+        Hold a slot for the duration of the ``with`` block.
+
+        Args:
+            session_id: Fairness key (requests of one session run in order, sessions take turns)
+            priority: One of ``priorities`` (default: the highest)
+            deadline_seconds: Longest to wait for a slot (default: ``default_deadline_seconds``; ``math.inf`` = no limit)
+
+        Yields:
+            The ticket; ``ticket.wait_seconds`` is the time spent queued
+
+        Raises:
+            Overloaded: Queue full, estimated wait over the deadline, or deadline reached while queued
+        """
+        priority = priority or self.priorities[0]
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority '{priority}' (expected one of {self.priorities})")
+        deadline = self.default_deadline_seconds if deadline_seconds is None else deadline_seconds
+        if deadline is not None and math.isinf(deadline):
+            deadline = None
+        ticket = _Ticket(session_id, priority)
+
+        with self._lock:
+            if self._active >= self.max_concurrency:
+                if self._queued >= self.max_queue:
+                    self._reject("queue_full")
+                if deadline is not None:
+                    estimate = self._estimated_wait(priority)
+                    if estimate > deadline:
+                        self._reject("deadline", estimate)
+            self._queues[priority].setdefault(session_id, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+
+        if not ticket.granted.wait(timeout=deadline):
+            with self._lock:
+                if self._remove(ticket):
+                    self._reject("timeout")
+            # Granted just as the deadline passed: run it
+
+        QUEUE_WAIT.observe(ticket.wait_seconds)
+        started = time.perf_counter()
+        try:
+            yield ticket
+        finally:
+            with self._lock:
+                self._active -= 1
+                # Moving average of request duration for wait estimates
+                self.service_time = 0.8 * self.service_time + 0.2 * (time.perf_counter() - started)
+                self._dispatch()
@@ -0,0 +1,388 @@
+"""
+Streaming analyzer for the JSONL invoke traces written by JsonlTrace.
+
+Reads one line at a time and keeps only fixed-size summaries, so memory stays
+bounded no matter how large the trace file is:
+- latency percentiles from a log-bucketed quantile sketch (~1% relative error)
+- a fixed-bin histogram of retrieval distances
+- approximate most-retrieved chunk IDs via the Space-Saving algorithm
+- at most ``max_sessions`` per-session and ``max_hours`` per-hour groups; the
+  least recently active sessions and the oldest hours are merged into
+  "(other sessions)" and "(earlier)"
+
+Usage:
+    python -m utils.trace_analytics outputs/rag_assistant_traces.jsonl
+    python -m utils.trace_analytics outputs/*.jsonl --out summary.json --parquet summary.parquet
+"""
+
+import heapq
+import json
+import math
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from utils.paths import OUTPUTS_DIR
+
+LATENCY_FIELDS = ("retrieval_ms", "llm_ms", "total_ms", "rewrite_ms", "queue_wait_ms")
+DISTANCE_BINS = 20
+DISTANCE_MAX = 2.0  # cosine distance range is [0, 2]
+OTHER_SESSIONS = "(other sessions)"
+# route.action values (utils/intent_router.py) for which the retrieval stage ran
+RETRIEVAL_ACTIONS = frozenset({"retrieve", "no_context_answer"})
+EARLIER_HOURS = "(earlier)"
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch with bounded relative error.
+
+    Values are counted in buckets whose bounds grow by ``gamma = (1 + a) / (1 - a)``,
+    so any reported quantile is within ``relative_accuracy`` of the true value and
+    the number of buckets depends only on the value range, not the sample count.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if value < self.min_value:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Fold another sketch with the same accuracy into this one."""
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(k-1), gamma^k] in relative terms
+                return min(2 * self.gamma ** key / (1 + self.gamma), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean": rounded(self.total / self.count) if self.count else None,
+            "p50": rounded(self.quantile(0.50)),
+            "p95": rounded(self.quantile(0.95)),
+            "p99": rounded(self.quantile(0.99)),
+            "max": rounded(self.max) if self.count else None,
+        }
+
+
+class SpaceSaving:
+    """Approximate top-k frequent items in O(capacity) memory (Metwally et al.)."""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []  # lazy min-heap; stale entries are skipped
+
+    def add(self, item: str) -> None:
+        if item in self.counts:
+            self.counts[item] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            heapq.heappush(self._heap, (1, item))
+        else:
+            # Replace the current minimum; its count is an upper bound for the newcomer
+            while True:
+                count, victim = heapq.heappop(self._heap)
+                if self.counts.get(victim) == count:
+                    break
+                if victim in self.counts:
+                    heapq.heappush(self._heap, (self.counts[victim], victim))
+            self.counts[item] = self.counts.pop(victim) + 1
+            heapq.heappush(self._heap, (self.counts[item], item))
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+
+class GroupStats:
+    """Latency sketches, empty-retrieval and routing counts for one session or hour."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retrievals = 0
+        self.empty_retrievals = 0
+        self.routed: Dict[str, int] = {}  # route.action -> requests that skipped retrieval
+        self.latency = {field: QuantileSketch() for field in LATENCY_FIELDS}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.requests += 1
+        # Requests the intent router sent past retrieval have no documents by design
+        action = (record.get("route") or {}).get("action")
+        if action is None or action in RETRIEVAL_ACTIONS:
+            self.retrievals += 1
+            if record.get("retrieved_doc_count", 0) == 0:
+                self.empty_retrievals += 1
+        else:
+            self.routed[action] = self.routed.get(action, 0) + 1
+        latency = record.get("latency") or {}
+        for field in LATENCY_FIELDS:
+            if latency.get(field) is not None:
+                self.latency[field].add(float(latency[field]))
+
+    def merge(self, other: "GroupStats") -> None:
+        self.requests += other.requests
+        self.retrievals += other.retrievals
+        self.empty_retrievals += other.empty_retrievals
+        for action, count in other.routed.items():
+            self.routed[action] = self.routed.get(action, 0) + count
+        for field, sketch in other.latency.items():
+            self.latency[field].merge(sketch)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retrieval_requests": self.retrievals,
+            "empty_retrieval_rate": round(self.empty_retrievals / self.retrievals, 4) if self.retrievals else None,
+            "routed_requests": dict(sorted(self.routed.items())),
+            "latency_ms": {field: sketch.summary() for field, sketch in self.latency.items()},
+        }
+
+
+class TraceAnalyzer:
+    """Accumulates invoke trace records into bounded-size summaries."""
+
+    def __init__(self, top_k_capacity: int = 1000, max_sessions: int = 1000, max_hours: int = 24 * 31):
+        """
+        Args:
+            top_k_capacity: Chunk IDs tracked by the Space-Saving counter
+            max_sessions: Sessions reported individually (least recently active ones are merged)
+            max_hours: Hours reported individually (the oldest ones are merged)
+        """
+        self.overall = GroupStats()
+        self.max_sessions = max(1, max_sessions)
+        self.max_hours = max(1, max_hours)
+        self.sessions: "OrderedDict[str, GroupStats]" = OrderedDict()
+        self.hours: Dict[str, GroupStats] = {}
+        self.distance_bins = [0] * DISTANCE_BINS
+        self.top1_distance = QuantileSketch(min_value=1e-4)
+        self.chunk_ids = SpaceSaving(capacity=top_k_capacity)
+        self.lines = 0
+        self.skipped = 0
+
+    def add(self, record: Dict[str, Any]) -> None:
+        if record.get("event") != "invoke":
+            return
+        self.overall.add(record)
+        self._session_stats(record.get("session", "unknown")).add(record)
+        self._hour_stats(str(record.get("ts", "unknown"))[:13]).add(record)
+
+        distances = record.get("retrieval_distances") or []
+        for distance in distances:
+            bin_index = min(int(distance / DISTANCE_MAX * DISTANCE_BINS), DISTANCE_BINS - 1)
+            self.distance_bins[max(bin_index, 0)] += 1
+        if distances:
+            self.top1_distance.add(float(min(distances)))
+
+        for chunk_id in record.get("retrieved_doc_ids") or []:
+            self.chunk_ids.add(chunk_id)
+
+    def _session_stats(self, session: str) -> GroupStats:
+        stats = self.sessions.get(session)
+        if stats is not None:
+            if session != OTHER_SESSIONS:
+                self.sessions.move_to_end(session)
+            return stats
+        if len(self.sessions) >= self.max_sessions + (OTHER_SESSIONS in self.sessions):
+            # Fold the least recently active session into the overflow group
+            victim = next(s for s in self.sessions if s != OTHER_SESSIONS)
+            evicted = self.sessions.pop(victim)
+            self.sessions.setdefault(OTHER_SESSIONS, GroupStats()).merge(evicted)
+        stats = self.sessions[session] = GroupStats()
+        return stats
+
+    def _hour_stats(self, hour: str) -> GroupStats:
+        stats = self.hours.get(hour)
+        if stats is not None:
+            return stats
+        stats = self.hours[hour] = GroupStats()
+        if len(self.hours) > self.max_hours + (EARLIER_HOURS in self.hours):
+            # Hour keys ("YYYY-MM-DDTHH") sort chronologically; fold the oldest into "(earlier)"
+            victim = min(h for h in self.hours if h != EARLIER_HOURS)
+            evicted = self.hours.pop(victim)
+            self.hours.setdefault(EARLIER_HOURS, GroupStats()).merge(evicted)
+            if victim == hour:
+                return self.hours[EARLIER_HOURS]
+        return stats
+
+    def consume(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            self.lines += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self.add(json.loads(line))
+            except (json.JSONDecodeError, TypeError, ValueError):
+                self.skipped += 1
+
+    def summary(self, top_chunks: int = 20) -> Dict[str, Any]:
+        width = DISTANCE_MAX / DISTANCE_BINS
+        return {
+            "lines": self.lines,
+            "skipped_lines": self.skipped,
+            "overall": self.overall.summary(),
+            "top1_distance": {k: v for k, v in self.top1_distance.summary().items() if k != "mean"},
+            "distance_histogram": [
+                {"from": round(i * width, 2), "to": round((i + 1) * width, 2), "count": count}
+                for i, count in enumerate(self.distance_bins)
+                if count
+            ],
+            "top_chunk_ids": [{"id": chunk_id, "count": count} for chunk_id, count in self.chunk_ids.top(top_chunks)],
+            "per_hour": {hour: stats.summary() for hour, stats in sorted(self.hours.items())},
+            "per_session": {session: stats.summary() for session, stats in self.sessions.items()},
+        }
+
+
+def iter_lines(paths: Iterable[str | Path]) -> Iterator[str]:
+    """Yield lines from each file in turn without loading any file fully."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def summary_rows(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten per-group latency summaries into rows (one per group and field)."""
+    rows = []
+    groups = [("overall", "all", summary["overall"])]
+    groups += [("hour", hour, stats) for hour, stats in summary["per_hour"].items()]
+    groups += [("session", session, stats) for session, stats in summary["per_session"].items()]
+    for group_type, group, stats in groups:
+        for field, latency in stats["latency_ms"].items():
+            rows.append({
+                "group_type": group_type,
+                "group": group,
+                "field": field,
+                "requests": stats["requests"],
+                "empty_retrieval_rate": stats["empty_retrieval_rate"],
+                **latency,
+            })
+    return rows
+
+
+def write_parquet(summary: Dict[str, Any], path: str | Path) -> None:
+    """Write the flattened latency rows to Parquet (requires pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+    pq.write_table(pa.Table.from_pylist(summary_rows(summary)), str(path))
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    """Print the overall and per-hour latency table."""
+    overall = summary["overall"]
+    print(f"\n{'='*72}")
+    print(f"Trace summary: {overall['requests']} requests ({summary['skipped_lines']} unparseable lines)")
+    if overall["empty_retrieval_rate"] is not None:
+        print(f"Empty retrieval rate: {overall['empty_retrieval_rate']:.1%} of {overall['retrieval_requests']} retrievals")
+    if overall["routed_requests"]:
+        routed = ", ".join(f"{action}={count}" for action, count in overall["routed_requests"].items())
+        print(f"Routed past retrieval: {routed}")
+    print(f"{'='*72}")
+    print(f"{'group':<18}{'field':<14}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = [r for r in summary_rows(summary) if r["group_type"] in ("overall", "hour")]
+    for row in rows:
+        if row["count"]:
+            print(f"{row['group']:<18}{row['field']:<14}{row['count']:>8}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}")
+    if summary["top_chunk_ids"]:
+        print("\nMost retrieved chunks:")
+        for item in summary["top_chunk_ids"][:10]:
+            print(f"  {item['count']:>6}  {item['id']}")
+    print(f"{'='*72}\n")
+
+
+def main(
+    paths: List[str],
+    out_path: Optional[str] = None,
+    parquet_path: Optional[str] = None,
+    top_chunks: int = 20,
+    max_sessions: int = 1000,
+    max_hours: int = 24 * 31,
+) -> Dict[str, Any]:
+    """
+    Analyze trace files and emit a compact summary.
+
+    Args:
+        paths: JSONL trace files
+        out_path: Optional JSON summary destination
+        parquet_path: Optional Parquet destination for the flattened latency rows
+        top_chunks: Number of most-retrieved chunk IDs to report
+        max_sessions: Sessions reported individually (the rest are merged into "(other sessions)")
+        max_hours: Most recent hours reported individually (older ones are merged into "(earlier)")
+    """
+    analyzer = TraceAnalyzer(max_sessions=max_sessions, max_hours=max_hours)
+    analyzer.consume(iter_lines(paths))
+    summary = analyzer.summary(top_chunks=top_chunks)
+
+    print_summary(summary)
+    if out_path:
+        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary saved to: {out_path}")
+    if parquet_path:
+        write_parquet(summary, parquet_path)
+        print(f"Parquet saved to: {parquet_path}")
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize RAG assistant JSONL traces in bounded memory")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[str(Path(OUTPUTS_DIR) / "rag_assistant_traces.jsonl")],
+        help="Trace files (default: outputs/rag_assistant_traces.jsonl)",
+    )
+    parser.add_argument("--out", default=None, help="Write the JSON summary to this path")
+    parser.add_argument("--parquet", default=None, help="Write flattened latency rows to this Parquet file")
+    parser.add_argument("--top-chunks", type=int, default=20, help="Number of most-retrieved chunk IDs to report")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="Sessions reported individually (default: 1000)")
+    parser.add_argument("--max-hours", type=int, default=24 * 31, help="Recent hours reported individually (default: 744)")
+    args = parser.parse_args()
+
+    main(
+        args.paths,
+        out_path=args.out,
+        parquet_path=args.parquet,
+        top_chunks=args.top_chunks,
+        max_sessions=args.max_sessions,
+        max_hours=args.max_hours,
+    )
@@ -0,0 +1,544 @@
+"""
+Alternative search backends for VectorDB.
+
+Each backend exposes the subset of the ChromaDB collection interface that
+VectorDB uses (``query`` and ``count``) and returns results in the same nested
+shape, so VectorDB.search can use them interchangeably with a Chroma collection.
+"""
+
+import json
+import mmap
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+# File layout of an exported index directory (see utils/index_export.py)
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.bin"
+DOCUMENTS_FILE = "documents.bin"
+
+# Rows converted to float32 at a time when scoring a float16 matrix
+SCORE_BLOCK_ROWS = 65536
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Returns a float32 copy of ``matrix`` with unit-length rows."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def exact_topk(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the indices of the k highest scores per row, best first.
+
+    Uses argpartition so the cost is linear in the number of candidates; only
+    the k selected entries are sorted.
+
+    Args:
+        scores: Array of shape (n,) or (batch, n).
+        k: Number of entries to select.
+
+    Returns:
+        Index array of shape (k,) or (batch, k).
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        top = np.broadcast_to(np.arange(n), scores.shape).copy()
+    top_scores = np.take_along_axis(scores, top, axis=-1)
+    order = np.argsort(-top_scores, axis=-1, kind="stable")
+    return np.take_along_axis(top, order, axis=-1)
+
+
+def score_matrix(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Computes cosine similarities between normalized rows and queries.
+
+    float32 matrices go straight to BLAS; float16 matrices are scored in blocks
+    so only one block is ever up-cast in memory.
+
+    Args:
+        matrix: (n, dim) normalized embeddings (float32 or float16, may be a memmap).
+        queries: (batch, dim) normalized float32 queries.
+
+    Returns:
+        (batch, n) float32 similarity matrix.
+    """
+    if matrix.dtype == np.float32:
+        return np.asarray(queries @ matrix.T, dtype=np.float32)
+    scores = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        scores[:, start:start + len(block)] = queries @ block.T
+    return scores
+
+
+def to_query_results(
+    top: np.ndarray,
+    scores: np.ndarray,
+    ids: Sequence[str],
+    include: Sequence[str],
+    get_document,
+    get_embedding,
+) -> Dict[str, Any]:
+    """Shapes top-k indices into a Chroma-style nested query result."""
+    results: Dict[str, Any] = {"ids": []}
+    if "documents" in include:
+        results["documents"] = []
+    if "distances" in include:
+        results["distances"] = []
+    if "embeddings" in include:
+        results["embeddings"] = []
+
+    for row, indices in enumerate(top):
+        results["ids"].append([ids[i] for i in indices])
+        if "documents" in include:
+            results["documents"].append([get_document(i) for i in indices])
+        if "distances" in include:
+            # Chroma's cosine space reports distance = 1 - cosine similarity
+            results["distances"].append((1.0 - scores[row, indices]).tolist())
+        if "embeddings" in include:
+            results["embeddings"].append(np.stack([get_embedding(i) for i in indices]) if len(indices) else [])
+    return results
+
+
+def reserve_rows(buffer: Optional[np.ndarray], size: int, needed: int, row_shape: tuple, dtype) -> np.ndarray:
+    """Returns ``buffer`` (or a doubled copy of it) with room for ``needed`` rows.
+
+    Args:
+        buffer: Existing row buffer, or None.
+        size: Number of populated rows in ``buffer``.
+        needed: Number of rows required.
+        row_shape: Shape of a single row.
+        dtype: Buffer dtype.
+
+    Returns:
+        A buffer with capacity >= needed whose first ``size`` rows match the input.
+    """
+    if buffer is not None and needed <= buffer.shape[0]:
+        return buffer
+    capacity = buffer.shape[0] if buffer is not None else 0
+    capacity = max(capacity, 1)
+    while capacity < needed:
+        capacity *= 2
+    grown = np.empty((capacity,) + tuple(row_shape), dtype=dtype)
+    if buffer is not None:
+        grown[:size] = buffer[:size]
+    return grown
+
+
+def keep_rows(rows: Dict[str, int], size: int, ids: Sequence[str]) -> Optional[np.ndarray]:
+    """Row indices that survive removing ``ids``, or None if none of them are indexed."""
+    drop = np.zeros(size, dtype=bool)
+    for chunk_id in ids:
+        row = rows.get(chunk_id)
+        if row is not None:
+            drop[row] = True
+    if not drop.any():
+        return None
+    return np.flatnonzero(~drop)
+
+
+def empty_query_results(n_queries: int, include: Sequence[str]) -> Dict[str, Any]:
+    """Chroma-style query result with no hits for each of ``n_queries`` queries."""
+    return {key: [[] for _ in range(n_queries)] for key in ["ids", *include]}
+
+
+class MmapIndex:
+    """
+    Read-only index over a collection snapshot written by utils/index_export.py.
+
+    Embeddings, IDs and chunk text are memory-mapped rather than loaded, so every
+    process on a host shares one page-cached copy and opening the index costs
+    only an mmap. Search is an exact scan over the normalized matrix.
+    """
+
+    def __init__(self, export_dir: str | Path):
+        """
+        Open an exported index.
+
+        Args:
+            export_dir: Directory containing manifest.json and the data files
+        """
+        self.export_dir = Path(export_dir)
+        manifest_path = self.export_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No exported index found at {self.export_dir}")
+
+        self.manifest: Dict[str, Any] = json.loads(manifest_path.read_text(encoding="utf-8"))
+        self.embeddings = np.load(self.export_dir / EMBEDDINGS_FILE, mmap_mode="r")
+        self.offsets = np.load(self.export_dir / OFFSETS_FILE, mmap_mode="r")
+        self._ids_blob = self._map(self.export_dir / IDS_FILE)
+        self._documents_blob = self._map(self.export_dir / DOCUMENTS_FILE)
+        self._ids: Optional[List[str]] = None
+
+    @staticmethod
+    def _map(path: Path):
+        with open(path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _slice(self, blob, column: int, i: int) -> str:
+        start, end = int(self.offsets[i, column]), int(self.offsets[i + 1, column])
+        return blob[start:end].decode("utf-8")
+
+    @property
+    def ids(self) -> List[str]:
+        # IDs are small and needed for every result row, so decode them once lazily
+        if self._ids is None:
+            self._ids = [self._slice(self._ids_blob, 0, i) for i in range(self.count())]
+        return self._ids
+
+    def count(self) -> int:
+        """Number of indexed chunks."""
+        return int(self.embeddings.shape[0])
+
+    def get_document(self, i: int) -> str:
+        """Decode the chunk text at row ``i``."""
+        return self._slice(self._documents_blob, 1, i)
+
+    def query(
+        self,
+        query_embeddings: Sequence,
+        n_results: int = 10,
+        include: Sequence[str] = ("documents", "distances"),
+        **_: Any,
+    ) -> Dict[str, Any]:
+        """
+        Exact cosine search, returning results shaped like ``Collection.query``.
+
+        Args:
+            query_embeddings: One or more query vectors
+            n_results: Number of results per query
+            include: Any of "documents", "distances", "embeddings"
+
+        Returns:
+            Dictionary of nested lists (one inner list per query)
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        if self.count() == 0:
+            return empty_query_results(len(queries), include)
+        scores = score_matrix(self.embeddings, queries)
+        top = exact_topk(scores, n_results)
+        return to_query_results(
+            top, scores, self.ids, include,
+            get_document=self.get_document,
+            get_embedding=lambda i: np.asarray(self.embeddings[i], dtype=np.float32),
+        )
+
+
+class NumpyIndex:
+    """
+    Exact in-memory index: a contiguous float32 matrix of normalized embeddings.
+
+    For corpora of a few thousand chunks a single matrix-vector product is
+    faster than an HNSW query plus the SQLite document fetch, and recall is
+    exact. Multiple query vectors are scored with one matrix-matrix product.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        """
+        Create an empty index.
+
+        Args:
+            initial_capacity: Number of rows to preallocate (grows by doubling)
+        """
+        self._matrix: Optional[np.ndarray] = None
+        self._initial_capacity = max(1, initial_capacity)
+        self._size = 0
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000) -> "NumpyIndex":
+        """
+        Load every embedding and document from a ChromaDB collection.
+
+        Args:
+            collection: Source ChromaDB collection
+            page_size: Number of rows fetched per ``collection.get`` call
+
+        Returns:
+            A populated NumpyIndex
+        """
+        total = collection.count()
+        index = cls(initial_capacity=total or 1024)
+        for offset in range(0, total, page_size):
+            page = collection.get(include=["embeddings", "documents"], limit=page_size, offset=offset)
+            index.add(page["ids"], page["embeddings"], page["documents"])
+        return index
+
+    def count(self) -> int:
+        """Number of indexed chunks."""
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the populated rows."""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def add(self, ids: Sequence[str], embeddings: Sequence, documents: Sequence[str]) -> None:
+        """
+        Append chunks, ignoring IDs that are already indexed (like ``Collection.add``).
+
+        Args:
+            ids: Chunk IDs
+            embeddings: Chunk embeddings, aligned with ``ids``
+            documents: Chunk texts, aligned with ``ids``
+        """
+        new_rows = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._rows]
+        if not new_rows:
+            return
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32)[new_rows])
+
+        needed = self._size + len(new_rows)
+        self._matrix = reserve_rows(
+            self._matrix, self._size, max(needed, self._initial_capacity), vectors.shape[1:], np.float32
+        )
+        self._matrix[self._size:needed] = vectors
+        for i in new_rows:
+            self._rows[ids[i]] = len(self.ids)
+            self.ids.append(ids[i])
+            self.documents.append(documents[i])
+        self._size = needed
+
+    def remove(self, ids: Sequence[str]) -> None:
+        """
+        Drop chunks by ID, compacting the matrix in place.
+
+        Args:
+            ids: Chunk IDs to remove (unknown IDs are ignored)
+        """
+        keep = keep_rows(self._rows, self._size, ids)
+        if keep is None:
+            return
+        self._matrix[:len(keep)] = self._matrix[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self.documents = [self.documents[i] for i in keep]
+        self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._size = len(keep)
+
+    def query(
+        self,
+        query_embeddings: Sequence,
+        n_results: int = 10,
+        include: Sequence[str] = ("documents", "distances"),
+        **_: Any,
+    ) -> Dict[str, Any]:
+        """
+        Exact cosine search, returning results shaped like ``Collection.query``.
+
+        Args:
+            query_embeddings: One or more query vectors (scored as one batch)
+            n_results: Number of results per query
+            include: Any of "documents", "distances", "embeddings"
+
+        Returns:
+            Dictionary of nested lists (one inner list per query)
+        """
+        matrix = self.matrix
+        queries = normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        if matrix.shape[0] == 0:
+            return empty_query_results(len(queries), include)
+        scores = queries @ matrix.T
+        top = exact_topk(scores, n_results)
+        return to_query_results(
+            top, scores, self.ids, include,
+            get_document=self.documents.__getitem__,
+            get_embedding=matrix.__getitem__,
+        )
+
+
+class QuantizedIndex:
+    """
+    Compact in-memory index storing embeddings as float16 or int8 codes.
+
+    int8 codes use a per-vector scale (max |x| / 127). Search scores every row on
+    the compact codes, then rescores the best ``n_results * rescore_multiplier``
+    candidates with full-precision vectors fetched from the backing Chroma
+    collection, which also supplies the chunk text. The index itself holds only
+    IDs, codes and scales; the Chroma collection it rescores from stays loaded, so
+    ``memory_bytes`` is the size of the search codes, not of the process.
+    """
+
+    def __init__(self, collection, dtype: str = "int8", rescore_multiplier: int = 4, initial_capacity: int = 1024):
+        """
+        Create an empty quantized index.
+
+        Args:
+            collection: ChromaDB collection holding full-precision vectors and documents
+            dtype: "int8" or "float16"
+            rescore_multiplier: Candidates rescored per requested result (1 = no extra candidates)
+            initial_capacity: Number of rows to preallocate (grows by doubling)
+        """
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported quantization dtype: {dtype}")
+        self.collection = collection
+        self.dtype = dtype
+        self.rescore_multiplier = max(1, rescore_multiplier)
+        self._initial_capacity = max(1, initial_capacity)
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._size = 0
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    @classmethod
+    def from_collection(
+        cls,
+        collection,
+        dtype: str = "int8",
+        rescore_multiplier: int = 4,
+        page_size: int = 5000,
+    ) -> "QuantizedIndex":
+        """
+        Quantize every embedding of a ChromaDB collection.
+
+        Args:
+            collection: Source (and rescoring) ChromaDB collection
+            dtype: "int8" or "float16"
+            rescore_multiplier: Candidates rescored per requested result
+            page_size: Number of rows fetched per ``collection.get`` call
+
+        Returns:
+            A populated QuantizedIndex
+        """
+        total = collection.count()
+        index = cls(collection, dtype=dtype, rescore_multiplier=rescore_multiplier, initial_capacity=total or 1024)
+        for offset in range(0, total, page_size):
+            page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+            index.add(page["ids"], page["embeddings"])
+        return index
+
+    def count(self) -> int:
+        """Number of indexed chunks."""
+        return self._size
+
+    def memory_bytes(self) -> int:
+        """Bytes used by the populated codes and scales (excludes the backing collection)."""
+        if self._codes is None:
+            return 0
+        scale_bytes = self._size * self._scales.itemsize if self.dtype == "int8" else 0
+        return self._size * self._codes.shape[1] * self._codes.itemsize + scale_bytes
+
+    def full_precision_bytes(self) -> int:
+        """Bytes the same rows would need as a float32 matrix."""
+        return 0 if self._codes is None else self._size * self._codes.shape[1] * 4
+
+    def add(self, ids: Sequence[str], embeddings: Sequence, documents: Optional[Sequence[str]] = None) -> None:
+        """
+        Quantize and append chunks, ignoring IDs that are already indexed.
+
+        Args:
+            ids: Chunk IDs
+            embeddings: Chunk embeddings, aligned with ``ids``
+            documents: Ignored; text is read from the collection at query time
+        """
+        new_rows = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._rows]
+        if not new_rows:
+            return
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32)[new_rows])
+
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        else:
+            scales = np.ones(len(vectors), dtype=np.float32)
+            codes = vectors.astype(np.float16)
+
+        needed = self._size + len(new_rows)
+        capacity = max(needed, self._initial_capacity)
+        self._codes = reserve_rows(self._codes, self._size, capacity, codes.shape[1:], codes.dtype)
+        self._scales = reserve_rows(self._scales, self._size, capacity, (), np.float32)
+        self._codes[self._size:needed] = codes
+        self._scales[self._size:needed] = scales
+        for i in new_rows:
+            self._rows[ids[i]] = len(self.ids)
+            self.ids.append(ids[i])
+        self._size = needed
+
+    def remove(self, ids: Sequence[str]) -> None:
+        """
+        Drop chunks by ID, compacting the codes in place.
+
+        Args:
+            ids: Chunk IDs to remove (unknown IDs are ignored)
+        """
+        keep = keep_rows(self._rows, self._size, ids)
+        if keep is None:
+            return
+        self._codes[:len(keep)] = self._codes[keep]
+        self._scales[:len(keep)] = self._scales[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._size = len(keep)
+
+    def approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarities computed on the compact codes, shape (batch, n)."""
+        codes = self._codes[:self._size]
+        if self.dtype == "float16":
+            return score_matrix(codes, queries)
+        return self._score_int8(codes, queries)
+
+    def _score_int8(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        scores = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores * self._scales[:self._size]
+
+    def query(
+        self,
+        query_embeddings: Sequence,
+        n_results: int = 10,
+        include: Sequence[str] = ("documents", "distances"),
+        **_: Any,
+    ) -> Dict[str, Any]:
+        """
+        Approximate search on the codes, rescored at full precision.
+
+        Args:
+            query_embeddings: One or more query vectors (scored as one batch)
+            n_results: Number of results per query
+            include: Any of "documents", "distances", "embeddings"
+
+        Returns:
+            Dictionary of nested lists (one inner list per query), like ``Collection.query``
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        if self._size == 0:
+            return empty_query_results(len(queries), include)
+
+        candidates = exact_topk(self.approximate_scores(queries), n_results * self.rescore_multiplier)
+
+        # One round trip for the union of all candidates across the batch
+        candidate_ids = sorted({self.ids[i] for row in candidates for i in row})
+        fetched = self.collection.get(ids=candidate_ids, include=["embeddings", "documents"])
+        position = {chunk_id: p for p, chunk_id in enumerate(fetched["ids"])}
+        full = normalize_rows(fetched["embeddings"])
+
+        results: Dict[str, Any] = {key: [] for key in ["ids", *include]}
+        for row, indices in enumerate(candidates):
+            rows = [position[self.ids[i]] for i in indices if self.ids[i] in position]
+            exact = full[rows] @ queries[row]
+            best = [rows[j] for j in exact_topk(exact, n_results)]
+            results["ids"].append([fetched["ids"][p] for p in best])
+            if "documents" in include:
+                results["documents"].append([fetched["documents"][p] for p in best])
+            if "distances" in include:
+                results["distances"].append((1.0 - full[best] @ queries[row]).tolist())
+            if "embeddings" in include:
+                results["embeddings"].append(full[best])
+        return results
@@ -3,21 +3,103 @@ import os
 # Disable ChromaDB telemetry BEFORE importing chromadb to avoid "capture() takes 1 positional argument but 3 were given" warnings
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
+import threading
+import time
+from contextlib import contextmanager
+
 import chromadb
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import numpy as np
+from pathlib import Path
+from typing import Iterator, List, Dict, Any, Optional, Sequence, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
-from utils.paths import DATA_DIR
+from utils.paths import DATA_DIR, EXPORT_DIR
+from utils.file_utils import chunk_segments, file_content_hash, iter_segments
+from utils.retrieval_utils import adaptive_k, merge_adjacent_chunks, mmr_select, source_chunk_ids
+from utils.vector_backends import MmapIndex, NumpyIndex, QuantizedIndex
+from utils.metrics import stage_timer
+from utils.collection_versions import aliases_mtime, resolve_alias
+from utils.hierarchical_index import DocumentIndex, doc_collection_name
+from utils.embedding_service import load_embedding_model
+from utils.retrieval_cache import RetrievalCache, normalize_query
 
 load_dotenv()
 
+COLLECTION_METADATA = {"description": "RAG document collection", "hnsw:space": "cosine", "hnsw:batch_size": 10000}
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
 class VectorDB:
     """
     A simple vector database wrapper using ChromaDB with HuggingFace embeddings.
     """
 
-    def __init__(self, collection_name: str = None, embedding_model: str = None, default_threshold: float = 0.5):
+    def __init__(
+        self,
+        collection_name: str = None,
+        embedding_model: str = None,
+        default_threshold: float = 0.5,
+        merge_adjacent: bool = False,
+        mmr_lambda: Optional[float] = None,
+        fetch_multiplier: int = 2,
+        backend: str = "chroma",
+        export_dir: Optional[str] = None,
+        exact_max_chunks: int = 50000,
+        quantization: str = "int8",
+        rescore_multiplier: int = 4,
+        chunk_size: int = 400,
+        chunk_overlap: int = 100,
+        alias_check_seconds: float = 5.0,
+        adaptive_k: bool = False,
+        adaptive_method: str = "gap",
+        min_k: int = 1,
+        max_k: int = 8,
+        min_gap: float = 0.05,
+        min_relative_score: float = 0.85,
+        hierarchical: bool = False,
+        hierarchical_docs: int = 5,
+        embedding_service: Optional[str] = None,
+        embedding_timeout: float = 30.0,
+        result_cache_size: int = 0,
+    ):
         """
         Initialize the vector database.
 
@@ -25,44 +107,188 @@ class VectorDB:
             collection_name: Name of the ChromaDB collection
             embedding_model: HuggingFace model name for embeddings
             default_threshold: Default similarity threshold for search (can be overridden per query)
+            merge_adjacent: Merge adjacent/overlapping chunks of the same document after retrieval
+            mmr_lambda: If set, re-rank results with MMR (1.0 = relevance only, 0.0 = diversity only)
+            fetch_multiplier: How many candidates to over-fetch per result when post-processing is enabled
+            backend: "chroma" (HNSW), "numpy" (exact in-memory search over the Chroma data),
+                "quantized" (compact in-memory codes rescored from Chroma) or "mmap" (read-only exported snapshot)
+            export_dir: Snapshot directory for the mmap backend (defaults to EXPORT_DIR/<collection_name>)
+            exact_max_chunks: Above this many chunks the numpy backend falls back to Chroma's HNSW index
+            quantization: Code type for the quantized backend ("int8" or "float16")
+            rescore_multiplier: Candidates rescored at full precision per requested result (quantized backend)
+            chunk_size: Chunker size in characters used by add_documents()
+            chunk_overlap: Chunker overlap in characters used by add_documents()
+            alias_check_seconds: How often searches check whether the alias was promoted to a new version
+            adaptive_k: Choose the number of results per query from the distance curve instead of n_results
+            adaptive_method: "gap" (cut at the largest distance jump) or "relative" (similarity ratio to the best hit)
+            min_k: Fewest results adaptive mode keeps
+            max_k: Most results adaptive mode keeps (and the number of candidates it fetches)
+            min_gap: Smallest distance jump the "gap" method cuts at
+            min_relative_score: Similarity ratio to the best hit the "relative" method keeps
+            hierarchical: Two-stage search (chroma backend): pick the closest documents first,
+                then search only their chunks (see utils/hierarchical_index.py)
+            hierarchical_docs: Documents the first stage keeps
+            embedding_service: Unix socket of a shared embedding server (utils/embedding_service.py) to
+                embed through instead of loading the model in this process; falls back to a local model
+            embedding_timeout: Seconds to wait for the embedding server per request
+            result_cache_size: Cache this many search results (0 = off); invalidated on every write
         """
+        # collection_name may be an alias (see utils/collection_versions.py); the
+        # promoted version then decides the collection, model and chunker
+        self.alias = collection_name
+        version = resolve_alias(collection_name)
+        self._alias_mtime = aliases_mtime()
+        self._alias_checked_at = time.monotonic()
+        self._alias_switch = threading.Lock()
+        self.alias_check_seconds = alias_check_seconds
+        if version:
+            collection_name = version["collection"]
+            embedding_model = version.get("embedding_model") or embedding_model
+            chunk_size = version.get("chunk_size", chunk_size)
+            chunk_overlap = version.get("chunk_overlap", chunk_overlap)
+
         self.collection_name = collection_name
         self.embedding_model_name = embedding_model
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
         self.default_threshold = default_threshold
+        self.merge_adjacent = merge_adjacent
+        self.mmr_lambda = mmr_lambda
+        self.fetch_multiplier = max(1, fetch_multiplier)
+        self.backend = backend
+        self.exact_max_chunks = exact_max_chunks
+        self.adaptive = adaptive_k
+        self.adaptive_options = {
+            "method": adaptive_method, "min_k": min_k, "max_k": max_k,
+            "min_gap": min_gap, "min_relative_score": min_relative_score,
+        }
+        self.hierarchical = hierarchical
+        self.hierarchical_docs = hierarchical_docs
+        self.local_index = None
+        self.doc_index = None
+        # Bumped on every write; cached results from another generation never match
+        self.generation = 0
+        self.cache = RetrievalCache(result_cache_size) if result_cache_size > 0 else None
+        # Searches take the read side; document swaps take the write side
+        self._lock = ReadWriteLock()
+
+        # Load embedding model (or connect to the shared embedding service)
+        self.embedding_model = load_embedding_model(self.embedding_model_name, embedding_service, embedding_timeout)
+
+        if backend == "mmap":
+            # Read-only replica: search a shared, memory-mapped snapshot instead of Chroma
+            self.client = None
+            self.export_dir = export_dir or os.path.join(EXPORT_DIR, self.alias)
+            self.collection = MmapIndex(self.export_dir)
+            print(f"Vector database opened read-only snapshot: {self.export_dir} ({self.collection.count()} chunks)")
+            return
+        if backend not in ("chroma", "numpy", "quantized"):
+            raise ValueError(f"Unsupported vector DB backend: {backend}")
 
         # Initialize ChromaDB client
         os.makedirs(DATA_DIR, exist_ok=True)
         self.client = chromadb.PersistentClient(path=DATA_DIR)
 
-        # Load embedding model
-        print(f"Loading embedding model: {self.embedding_model_name}")
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
-
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name=self.collection_name,
-            metadata={"description": "RAG document collection","hnsw:space": "cosine",
-                "hnsw:batch_size": 10000},
+            metadata=COLLECTION_METADATA,
         )
 
+        self.local_index = self._build_local_index(self.collection)
+        self.doc_index = self._build_doc_index(self.collection)
+
         print(f"Vector database initialized with collection: {self.collection_name}")
 
-    def chunk_text(self, text: str, chunk_size: int = 400, chunk_overlap: int = 100) -> List[str]:
+    def _build_local_index(self, collection):
+        """In-memory copy queried by the numpy/quantized backends (None for plain Chroma)."""
+        # Chroma stays the persistent store; these backends query an in-memory copy
+        if self.backend == "numpy":
+            return NumpyIndex.from_collection(collection)
+        if self.backend == "quantized":
+            local_index = QuantizedIndex.from_collection(
+                collection, dtype=self.quantization, rescore_multiplier=self.rescore_multiplier
+            )
+            # Search codes only: rescoring still reads float32 vectors and text from Chroma, which stays loaded
+            print(f"Quantized index ({self.quantization}): {local_index.memory_bytes() / 1e6:.1f} MB of search codes "
+                  f"(float32 would be {local_index.full_precision_bytes() / 1e6:.1f} MB; "
+                  f"the Chroma store stays resident for rescoring)")
+            return local_index
+        return None
+
+    def _build_doc_index(self, collection) -> Optional[DocumentIndex]:
+        """Document-level index for two-stage search (None unless hierarchical on the chroma backend)."""
+        if not self.hierarchical:
+            return None
+        if self.backend != "chroma":
+            print(f"[warn] Hierarchical search needs the chroma backend, not '{self.backend}'; using flat search")
+            return None
+        doc_index = DocumentIndex(self.client.get_or_create_collection(
+            name=doc_collection_name(collection.name),
+            metadata=COLLECTION_METADATA,
+        ))
+        if doc_index.count() == 0 and collection.count() > 0:
+            print(f"Building document index for {collection.name}...")
+            doc_index.rebuild(collection)
+        return doc_index
+
+    def _maybe_switch_version(self) -> None:
+        """Follow an alias promotion/rollback: load the new version, then swap it in under the write lock."""
+        if self.client is None or time.monotonic() - self._alias_checked_at < self.alias_check_seconds:
+            return
+        if not self._alias_switch.acquire(blocking=False):
+            return
+        try:
+            self._alias_checked_at = time.monotonic()
+            mtime = aliases_mtime()
+            if mtime == self._alias_mtime:
+                return
+            self._alias_mtime = mtime
+            version = resolve_alias(self.alias)
+            if not version or version["collection"] == self.collection_name:
+                return
+            if version.get("embedding_model", self.embedding_model_name) != self.embedding_model_name:
+                print(f"[warn] '{self.alias}' now uses {version['embedding_model']}; restart to switch models")
+                return
+
+            collection = self.client.get_collection(name=version["collection"])
+            local_index = self._build_local_index(collection)
+            doc_index = self._build_doc_index(collection)
+            with self._lock.write():
+                self.collection = collection
+                self.local_index = local_index
+                self.doc_index = doc_index
+                self._bump_generation()
+                self.collection_name = version["collection"]
+                self.chunk_size = version.get("chunk_size", self.chunk_size)
+                self.chunk_overlap = version.get("chunk_overlap", self.chunk_overlap)
+            print(f"Switched '{self.alias}' to collection {self.collection_name}")
+        finally:
+            self._alias_switch.release()
+
+    @property
+    def read_only(self) -> bool:
+        """True when the backend cannot accept new documents."""
+        return self.backend == "mmap"
+
+    def chunk_text(self, text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[str]:
         """
         Simple text chunking by splitting on spaces and grouping into chunks.
 
         Args:
             text: Input text to chunk
-            chunk_size: Approximate number of characters per chunk
-            chunk_overlap: The number of characters overlapped between chunks
+            chunk_size: Approximate number of characters per chunk (defaults to the instance setting)
+            chunk_overlap: The number of characters overlapped between chunks (defaults to the instance setting)
 
         Returns:
             List of text chunks
         """
         
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
+            chunk_size=chunk_size or self.chunk_size,
+            chunk_overlap=self.chunk_overlap if chunk_overlap is None else chunk_overlap,
         )   
 
         return text_splitter.split_text(text)
@@ -75,9 +301,11 @@ class VectorDB:
         - Create unique IDs for each chunk (e.g., "doc_0_chunk_0")
         - Store the embeddings, documents and IDs in your vector database
         Args:
-            documents: List of documents
+            documents: List of documents (text, or file paths to stream page by page)
         """
- 
+        if self.read_only:
+            raise RuntimeError(f"Cannot add documents: the '{self.backend}' backend is read-only")
+
         model = self.embedding_model
 
         doc_id = 0
@@ -86,19 +314,127 @@ class VectorDB:
 
             print(f'Processing Document {doc_id+1}/{len(documents)}')
 
+            if isinstance(document, Path):
+                # Files get stable IDs and source/page metadata; unchanged files are skipped
+                digest = file_content_hash(document)
+                if self.indexed_hash(document.name) != digest:
+                    self.replace_document(document.name, path=document, content_hash=digest)
+                doc_id += 1
+                continue
+
             chunked_publication = self.chunk_text(document)
             embeddings = model.encode(chunked_publication)
             chunk_ids = list(range(len(chunked_publication)))
             ids = [f"doc_{doc_id}_chunk_{id}" for id in chunk_ids]
-            self.collection.add(
-                embeddings=embeddings,
-                ids=ids,
-                documents=chunked_publication,
-            )
+            with self._lock.write():
+                self.collection.add(
+                    embeddings=embeddings,
+                    ids=ids,
+                    documents=chunked_publication,
+                )
+                if self.local_index is not None:
+                    self.local_index.add(ids, embeddings, chunked_publication)
+                self._bump_generation()
             doc_id += 1
 
+    def indexed_hash(self, source: str) -> Optional[str]:
+        """
+        Content hash stored with the chunks of ``source``.
+
+        Args:
+            source: Source path as passed to replace_document()
 
-    def search(self, query: str, n_results: int = 3, threshold: float = 0.5,) -> Dict[str, Any]:
+        Returns:
+            The hash, or None if the source is not indexed
+        """
+        found = self.collection.get(where={"source": source}, limit=1, include=["metadatas"])
+        metadatas = found.get("metadatas") or []
+        return metadatas[0].get("content_hash") if metadatas and metadatas[0] else None
+
+    def replace_document(
+        self,
+        source: str,
+        text: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        path: Optional[Path] = None,
+    ) -> int:
+        """
+        Replace every chunk of one source document, or remove it when neither ``text`` nor ``path`` is given.
+
+        Chunking and embedding happen before the write lock is taken; the delete
+        and add then run under it, so concurrent searches see either the old or
+        the new version of the document, never a mix.
+
+        Args:
+            source: Source path, stored as chunk metadata
+            text: New document text
+            content_hash: Hash of the content, stored to skip unchanged files later
+            path: File to stream segment by segment instead of ``text``; chunks get page metadata
+
+        Returns:
+            Number of chunks now indexed for the source
+        """
+        if self.read_only:
+            raise RuntimeError(f"Cannot replace documents: the '{self.backend}' backend is read-only")
+
+        metadata = {"source": source, "content_hash": content_hash or ""}
+        chunks, metadatas = [], []
+        if path is not None:
+            for chunk, page_metadata in chunk_segments(iter_segments(path), self.chunk_text):
+                chunks.append(chunk)
+                metadatas.append({**metadata, **page_metadata})
+        elif text:
+            chunks = self.chunk_text(text)
+            metadatas = [metadata] * len(chunks)
+        embeddings = self.embedding_model.encode(chunks) if chunks else None
+        ids = source_chunk_ids(source, len(chunks))
+
+        with self._lock.write():
+            old_ids = self.collection.get(where={"source": source}, include=[])["ids"]
+            if old_ids:
+                self.collection.delete(ids=old_ids)
+                if self.local_index is not None:
+                    self.local_index.remove(old_ids)
+            if chunks:
+                self.collection.add(
+                    embeddings=embeddings,
+                    ids=ids,
+                    documents=chunks,
+                    metadatas=metadatas,
+                )
+                if self.local_index is not None:
+                    self.local_index.add(ids, embeddings, chunks)
+            self._bump_generation()
+            if self.doc_index is not None:
+                if chunks:
+                    self.doc_index.upsert(source, embeddings)
+                elif old_ids:
+                    self.doc_index.delete(source)
+        return len(chunks)
+
+    def _bump_generation(self) -> None:
+        """Mark the collection as changed (call under the write lock)."""
+        self.generation += 1
+        if self.cache is not None:
+            self.cache.invalidate(self.generation)
+
+    def _search_index(self):
+        """Pick the index to query: the in-memory index if any (numpy only while small), else Chroma."""
+        if isinstance(self.local_index, NumpyIndex) and self.local_index.count() > self.exact_max_chunks:
+            return self.collection
+        return self.local_index if self.local_index is not None else self.collection
+
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 3,
+        threshold: float = 0.5,
+        merge_adjacent: Optional[bool] = None,
+        mmr_lambda: Optional[float] = None,
+        adaptive: Optional[bool] = None,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
         """
         Search for similar documents in the vector database.
 
@@ -106,43 +442,174 @@ class VectorDB:
             query: Search query
             n_results: Number of results to return
             threshold (float): Threshold for the cosine distance
+            merge_adjacent: Override the instance setting for merging adjacent chunks
+            mmr_lambda: Override the instance MMR setting (None = use instance setting)
+            adaptive: Override the instance adaptive setting (n_results is ignored when adaptive)
+            query_embedding: Embedding of ``query`` from the same model, if already computed (skips encoding)
         Returns:
-            Dictionary containing search results with keys: 'documents', 'metadatas', 'distances', 'ids'
+            Dictionary containing search results with keys: 'documents', 'distances', 'ids'
+            (plus 'merged_ids' when adjacent chunks were merged)
         """
+        return self.search_batch(
+            [query],
+            n_results=n_results,
+            threshold=threshold,
+            merge_adjacent=merge_adjacent,
+            mmr_lambda=mmr_lambda,
+            adaptive=adaptive,
+            query_embeddings=None if query_embedding is None else [query_embedding],
+        )[0]
 
-        relevant_results = {
-            "ids": [],
-            "documents": [],
-            "distances": []
-        }
+    def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        threshold: float = 0.5,
+        merge_adjacent: Optional[bool] = None,
+        mmr_lambda: Optional[float] = None,
+        adaptive: Optional[bool] = None,
+        query_embeddings: Optional[Sequence[np.ndarray]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for several queries at once: one encode call and one index query.
 
-        query_embedding = self.embedding_model.encode([query])[0] 
+        Args:
+            queries: Search queries
+            n_results: Number of results to return per query
+            threshold (float): Threshold for the cosine distance
+            merge_adjacent: Override the instance setting for merging adjacent chunks
+            mmr_lambda: Override the instance MMR setting (None = use instance setting)
+            adaptive: Override the instance adaptive setting (n_results is ignored when adaptive)
+            query_embeddings: One embedding per query from the same model, if already computed (skips encoding)
+        Returns:
+            One result dictionary per query, as returned by search()
+        """
+        self._maybe_switch_version()
+        merge_adjacent = self.merge_adjacent if merge_adjacent is None else merge_adjacent
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        adaptive = self.adaptive if adaptive is None else adaptive
+        if adaptive:
+            # Fetch the upper bound; the cut happens per query in _filter_results
+            n_results = self.adaptive_options["max_k"]
+        if self.cache is None:
+            return self._search_uncached(
+                queries, n_results, threshold, merge_adjacent, mmr_lambda, adaptive, query_embeddings
+            )[0]
 
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=["documents", "distances"],
+        # Everything besides the query text that shapes the result
+        settings = (
+            n_results, threshold, merge_adjacent, mmr_lambda,
+            adaptive and tuple(sorted(self.adaptive_options.items())),
+            self.doc_index is not None and self.hierarchical_docs,
         )
+        keys = [(normalize_query(query), settings) for query in queries]
+        generation = self.generation
+        results = [self.cache.get(key, generation) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh, generation = self._search_uncached(
+                [queries[i] for i in missing], n_results, threshold, merge_adjacent, mmr_lambda, adaptive,
+                None if query_embeddings is None else [query_embeddings[i] for i in missing],
+            )
+            for i, result in zip(missing, fresh):
+                self.cache.put(keys[i], generation, result)
+                results[i] = result
+        return results
+
+    def _search_uncached(
+        self,
+        queries: List[str],
+        n_results: int,
+        threshold: float,
+        merge_adjacent: bool,
+        mmr_lambda: Optional[float],
+        adaptive: bool,
+        query_embeddings: Optional[Sequence[np.ndarray]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Embed and query the index; returns the results and the generation they were computed against."""
+        postprocess = merge_adjacent or mmr_lambda is not None
+
+        if query_embeddings is None:
+            with stage_timer("embed"):
+                query_embeddings = self.embedding_model.encode(queries)
+        else:
+            query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+
+        include = ["documents", "distances"]
+        if postprocess:
+            include.append("embeddings")
+
+        fetch = n_results * self.fetch_multiplier if postprocess else n_results
+        with stage_timer("index_query"), self._lock.read():
+            generation = self.generation
+            if self.doc_index is not None:
+                results = self.doc_index.query(
+                    self.collection, query_embeddings, n_results=fetch, include=include, n_docs=self.hierarchical_docs
+                )
+            else:
+                results = self._search_index().query(
+                    query_embeddings=query_embeddings,
+                    n_results=fetch,
+                    include=include,
+                )
 
         if len(results) == 0:
             print('Cannot find relevant documents.')
             
-            return {
-                "documents": [],
-                "distances": [],
-                "ids": [],
-            }
-
-        keep_item = [False] * len(results["ids"][0])
-        for i, distance in enumerate(results["distances"][0]):
-            if distance < threshold:
-                keep_item[i] = True
-
-        for i, keep in enumerate(keep_item):
-            if keep:
-                relevant_results["ids"].append(results["ids"][0][i])
-                relevant_results["documents"].append(results["documents"][0][i])
-                relevant_results["distances"].append(results["distances"][0][i])
-    
-        return relevant_results
+            return [{"documents": [], "distances": [], "ids": []} for _ in queries], generation
+
+        with stage_timer("filter"):
+            return [
+                self._filter_results(
+                    results, row, query_embeddings[row], n_results, threshold, merge_adjacent, mmr_lambda, adaptive
+                )
+                for row in range(len(queries))
+            ], generation
+
+    def _filter_results(
+        self,
+        results: Dict[str, Any],
+        row: int,
+        query_embedding: np.ndarray,
+        n_results: int,
+        threshold: float,
+        merge_adjacent: bool,
+        mmr_lambda: Optional[float],
+        adaptive: bool = False,
+    ) -> Dict[str, Any]:
+        """Apply the distance threshold, the optional adaptive cut and optional merging/MMR to one query's raw results."""
+        distances = np.asarray(results["distances"][row], dtype=np.float64)
+        keep = np.flatnonzero(distances < threshold)
+        if adaptive:
+            n_results = adaptive_k(distances[keep], **self.adaptive_options)
+            keep = keep[:n_results]
+
+        relevant_results = {
+            "ids": [results["ids"][row][i] for i in keep],
+            "documents": [results["documents"][row][i] for i in keep],
+            "distances": [float(distances[i]) for i in keep],
+        }
+
+        if not (merge_adjacent or mmr_lambda is not None):
+            return relevant_results
+
+        embeddings = None
+        if results.get("embeddings") is not None and len(keep) > 0:
+            embeddings = np.asarray(results["embeddings"][row], dtype=np.float32)[keep]
+
+        if merge_adjacent:
+            merged = merge_adjacent_chunks(
+                relevant_results["ids"],
+                relevant_results["documents"],
+                relevant_results["distances"],
+                embeddings=embeddings,
+            )
+            embeddings = merged.pop("embeddings")
+            relevant_results = merged
+
+        if mmr_lambda is not None and embeddings is not None and len(embeddings) > 0:
+            order = mmr_select(query_embedding, embeddings, k=n_results, lambda_mult=mmr_lambda)
+        else:
+            order = list(range(min(n_results, len(relevant_results["ids"]))))
 
+        return {key: [values[i] for i in order] for key, values in relevant_results.items()}